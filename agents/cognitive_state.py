@@ -1,16 +1,20 @@
 # agents/cognitive_state.py
 
-from config.llm_config import chat_with_llm, LLMProvider
+from config.llm_config import chat_json, exceeds_budget, LLMProvider
 from config.personas import persona_traits
+from agents.prompts import cognitive_system
+from agents.schemas import COGNITIVE_SCHEMA, COGNITIVE_REQUIRED
+from utils.structured_output import StructuredOutputError
+from agents.conversation_context import ConversationContext, context_from_history, compact_context, cognitive_view
 from typing import List, Dict, Optional
-import json
 
 def generate_cognitive_state(
     persona: str,
     provider: LLMProvider = "gemini",
     model: str = "gemini-2.0-flash", 
     conversation_history: Optional[List[Dict]] = None,
-    final_understanding: Optional[str] = None
+    final_understanding: Optional[str] = None,
+    context: Optional[ConversationContext] = None
 ) -> dict:
     """
     Generate a cognitive state assessment based on the student's learning journey.
@@ -21,89 +25,36 @@ def generate_cognitive_state(
         model: Model name
         conversation_history: Full conversation between student and teacher
         final_understanding: Final understanding level assessed by dean
+        context: Incrementally maintained conversation views (preferred over conversation_history)
     """
     
     traits = persona_traits[persona]
     
     # Analyze conversation progression if available
-    learning_journey = ""
-    if conversation_history:
-        student_responses = [entry for entry in conversation_history if entry["role"] == "student"]
-        learning_journey = "\n\nLearning Journey:\n"
-        for i, response in enumerate(student_responses, 1):
-            content = response['content'][:150] + "..." if len(response['content']) > 150 else response['content']
-            learning_journey += f"Round {i}: {content}\n"
+    ctx = context if context is not None else context_from_history(conversation_history)
     
-    prompt = f"""
-You are a cognitive scientist analyzing a student's learning state and mental model development.
-
-Student Profile:
-- Persona: {persona}
-- Problem Understanding: {traits['Problem Understanding']}
-- Instruction Understanding: {traits['Instruction Understanding']}  
-- Calculation: {traits['Calculation']}
-- Knowledge Mastery: {traits['Knowledge Mastery']}
-- Thirst for Learning: {traits['Thirst for Learning']}
-
+    def render(learning_journey: str) -> str:
+        return f"""
 Final Understanding Level: {final_understanding or 'Not assessed'}
 
 {learning_journey}
-
-Based on this information, generate a comprehensive cognitive state assessment. Return as JSON:
-
-{{
-  "mental_model_development": {{
-    "initial_state": "Description of student's starting knowledge state",
-    "final_state": "Description of student's ending knowledge state", 
-    "key_breakthroughs": ["Moments where understanding clicked"],
-    "persistent_misconceptions": ["Concepts still unclear or incorrect"]
-  }},
-  "learning_patterns": {{
-    "preferred_learning_style": "How this student learns best",
-    "response_to_guidance": "How well they respond to Socratic questioning",
-    "question_asking_behavior": "What types of questions they ask",
-    "confidence_progression": "How their confidence changed"
-  }},
-  "cognitive_skills_demonstrated": {{
-    "analytical_thinking": "poor/developing/good/excellent",
-    "conceptual_connections": "poor/developing/good/excellent", 
-    "self_reflection": "poor/developing/good/excellent",
-    "knowledge_application": "poor/developing/good/excellent"
-  }},
-  "persona_consistency": {{
-    "trait_alignment": "How well responses matched expected persona",
-    "authentic_behaviors": ["Behaviors that matched the persona"],
-    "persona_development": "How the persona evolved during learning"
-  }},
-  "recommendations": {{
-    "next_learning_steps": ["What should this student study next"],
-    "teaching_strategies": ["What teaching methods work best for this student"],
-    "knowledge_gaps": ["Specific areas needing more work"]
-  }},
-  "overall_assessment": {{
-    "learning_effectiveness": "poor/fair/good/excellent",
-    "engagement_level": "low/medium/high", 
-    "readiness_for_advanced_topics": "yes/no/partial",
-    "summary": "2-3 sentence overall assessment"
-  }}
-}}
-
-Focus on:
-- How the student's thinking evolved throughout the dialogue
-- Whether their responses were consistent with their persona
-- What cognitive strategies they used
-- How effectively they learned from Socratic questioning
 """
     
-    response = chat_with_llm(prompt, provider=provider, model=model)
+    system = cognitive_system(persona)
+    prompt = render(cognitive_view(ctx))
+    if exceeds_budget("cognitive", system, prompt):
+        prompt = render(cognitive_view(compact_context(ctx)))
     
     try:
-        cognitive_state = json.loads(response)
+        cognitive_state = chat_json(
+            prompt, system=system, provider=provider, model=model, agent="cognitive",
+            schema=COGNITIVE_SCHEMA, required=COGNITIVE_REQUIRED
+        )
         return cognitive_state
         
-    except json.JSONDecodeError as e:
+    except StructuredOutputError as e:
         print(f"Cognitive state JSON parsing error: {e}")
-        print(f"Raw response: {response}")
+        print(f"Raw response: {e.response}")
         
         # Fallback cognitive state
         return {
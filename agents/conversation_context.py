@@ -0,0 +1,158 @@
+# agents/conversation_context.py
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, TypedDict, Union
+
+# How much of the dialogue each agent sees (unchanged from the original per-agent formatting)
+STUDENT_RECENT_ENTRIES = 4
+STUDENT_CHARS = 200
+TRANSCRIPT_CHARS = 150
+JOURNEY_CHARS = 150
+JOURNEY_MAX_ROUNDS = 10  # first round plus the most recent ones
+DEAN_ROUNDS = 2
+
+# Teacher transcript keeps this many recent entries verbatim; older rounds fold into a short summary
+TRANSCRIPT_WINDOW = 8
+SUMMARY_SNIPPET_CHARS = 80
+SUMMARY_MAX_CHARS = 600
+
+class Turn(NamedTuple):
+    """
+    One conversation_history entry. A tuple is a fraction of a dict's size and immutable, so histories
+    can share turns; entry["role"] still works, so code written for dict entries (and histories
+    restored from older checkpoints, which hold dicts) reads both the same way.
+    """
+    role: str
+    content: str
+    iteration: int
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+HistoryEntry = Union[Turn, Dict]
+
+def history_as_dicts(history: Optional[Iterable[HistoryEntry]]) -> List[Dict]:
+    """Plain dicts for JSON (a Turn would serialize as a list)"""
+    return [entry._asdict() if isinstance(entry, Turn) else dict(entry) for entry in history or []]
+
+class ConversationContext(TypedDict):
+    """
+    Pre-formatted views of the conversation, updated once per new turn and carried in TeachingState
+    so agents never re-walk the full history. Every view is bounded regardless of dialogue length.
+    """
+    turns: int
+    recent: List[str]             # student view: last few entries, any role
+    transcript: List[str]         # teacher view: recent entries with round numbers
+    summary: str                  # rolling summary of rounds dropped from the transcript window
+    rounds: List[Dict]            # dean view: last rounds as {"iteration", "student", "teacher"}
+    latest_student: str
+    journey: List[str]            # cognitive view: first and recent student replies, truncated
+
+def _truncate(content: str, limit: int) -> str:
+    return content[:limit] + "..." if len(content) > limit else content
+
+def new_context() -> ConversationContext:
+    return {
+        "turns": 0,
+        "recent": [],
+        "transcript": [],
+        "summary": "",
+        "rounds": [],
+        "latest_student": "",
+        "journey": []
+    }
+
+def append_turn(context: Optional[ConversationContext], role: str, content: str, iteration: int,
+                window: int = TRANSCRIPT_WINDOW) -> ConversationContext:
+    """Return a new context with one more turn; cost depends only on the bounded views, not the history length"""
+    ctx = context or new_context()
+    label = role.capitalize()
+
+    recent = (ctx["recent"] + [f"{label}: {_truncate(content, STUDENT_CHARS)}"])[-STUDENT_RECENT_ENTRIES:]
+
+    transcript = ctx["transcript"] + [f"{label} (Round {iteration}): {_truncate(content, TRANSCRIPT_CHARS)}"]
+    summary = ctx["summary"]
+    if len(transcript) > window:
+        dropped, transcript = transcript[:-window], transcript[-window:]
+        folded = "; ".join(_truncate(line, SUMMARY_SNIPPET_CHARS) for line in dropped)
+        summary = f"{summary}; {folded}" if summary else folded
+        summary = summary[-SUMMARY_MAX_CHARS:]
+
+    rounds = [dict(r) for r in ctx["rounds"]]
+    latest_student = ctx["latest_student"]
+    journey = ctx["journey"]
+    if role == "student":
+        rounds.append({"iteration": iteration, "student": content, "teacher": None})
+        rounds = rounds[-(DEAN_ROUNDS + 1):]
+        latest_student = content
+        journey = journey + [f"Round {iteration}: {_truncate(content, JOURNEY_CHARS)}"]
+        if len(journey) > JOURNEY_MAX_ROUNDS:
+            journey = journey[:1] + journey[-(JOURNEY_MAX_ROUNDS - 1):]
+    elif rounds and rounds[-1]["teacher"] is None:
+        rounds[-1]["teacher"] = content
+
+    return {
+        "turns": ctx["turns"] + 1,
+        "recent": recent,
+        "transcript": transcript,
+        "summary": summary,
+        "rounds": rounds,
+        "latest_student": latest_student,
+        "journey": journey
+    }
+
+def context_from_history(conversation_history: Optional[List[Dict]]) -> ConversationContext:
+    """Build a context from a plain history list (for callers and checkpoints that predate it)"""
+    ctx = new_context()
+    for entry in conversation_history or []:
+        ctx = append_turn(ctx, entry["role"], entry["content"], entry["iteration"])
+    return ctx
+
+def compact_context(ctx: ConversationContext, keep_entries: int = 2) -> ConversationContext:
+    """Smaller copy of a context for prompts over their token budget: older turns move into the summary"""
+    transcript = ctx["transcript"]
+    summary = ctx["summary"]
+    if len(transcript) > keep_entries:
+        dropped, transcript = transcript[:-keep_entries], transcript[-keep_entries:]
+        folded = "; ".join(_truncate(line, SUMMARY_SNIPPET_CHARS) for line in dropped)
+        summary = (f"{summary}; {folded}" if summary else folded)[-SUMMARY_MAX_CHARS:]
+    return {
+        **ctx,
+        "recent": ctx["recent"][-2:],
+        "transcript": transcript,
+        "summary": summary,
+        "rounds": ctx["rounds"][-2:],
+        "journey": ctx["journey"][:1] + ctx["journey"][1:][-2:]
+    }
+
+# Views used by the agents
+
+def student_view(ctx: ConversationContext) -> str:
+    if not ctx["turns"]:
+        return ""
+    return "\n\nPrevious conversation:\n" + "".join(f"{line}\n" for line in ctx["recent"])
+
+def teacher_view(ctx: ConversationContext) -> str:
+    if ctx["turns"] <= 2:
+        return ""
+    text = "\n\nConversation so far:\n"
+    if ctx["summary"]:
+        text += f"(Earlier rounds, summarized: {ctx['summary']})\n"
+    return text + "".join(f"{line}\n" for line in ctx["transcript"])
+
+def dean_view(ctx: ConversationContext) -> str:
+    complete = [r for r in ctx["rounds"] if r["teacher"] is not None][-DEAN_ROUNDS:]
+    return "".join(
+        f"Round {r['iteration']}:\nStudent: {r['student']}\nTeacher: {r['teacher']}\n\n" for r in complete
+    )
+
+def cognitive_view(ctx: ConversationContext) -> str:
+    if not ctx["journey"]:
+        return ""
+    return "\n\nLearning Journey:\n" + "".join(f"{line}\n" for line in ctx["journey"])
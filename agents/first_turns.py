@@ -0,0 +1,119 @@
+# agents/first_turns.py
+
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from agents.student import student_agent
+from config.llm_config import LLMProvider, sampling_options
+from utils.question_source import canonical_question, canonical_question_id
+
+DEFAULT_FIRST_TURNS_PATH = ".cache/first_turns.sqlite"
+
+class FirstTurnStore:
+    """
+    Precomputed opening student replies, keyed by (canonical question, persona, provider, model).
+
+    The first student turn never sees the teacher, so it only depends on the question and the persona.
+    Each pair holds a few variants sampled with different seeds; a dialogue picks one with a seed of its own,
+    so repeated questions still start differently across dialogues but reproducibly across runs.
+    """
+
+    def __init__(self, path: str = DEFAULT_FIRST_TURNS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS first_turns ("
+            "canonical_id TEXT NOT NULL, persona TEXT NOT NULL, provider TEXT NOT NULL, model TEXT NOT NULL, "
+            "variant INTEGER NOT NULL, question TEXT NOT NULL, reply TEXT NOT NULL, created REAL NOT NULL, "
+            "PRIMARY KEY (canonical_id, persona, provider, model, variant))"
+        )
+        self._conn.commit()
+
+    def put(self, question: str, persona: str, provider: str, model: str, variant: int, reply: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO first_turns VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (canonical_question_id(question), persona, provider, model, variant,
+                 canonical_question(question), reply, time.time())
+            )
+            self._conn.commit()
+
+    def variants(self, question: str, persona: str, provider: str, model: str) -> Dict[int, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT variant, reply FROM first_turns "
+                "WHERE canonical_id = ? AND persona = ? AND provider = ? AND model = ? ORDER BY variant",
+                (canonical_question_id(question), persona, provider, model)
+            ).fetchall()
+        return dict(rows)
+
+    def pick(self, question: str, persona: str, provider: str, model: str, seed: str) -> Optional[str]:
+        """One stored variant chosen by seed, or None if the pair was never precomputed"""
+        variants = self.variants(question, persona, provider, model)
+        with self._lock:
+            if not variants:
+                self.misses += 1
+                return None
+            self.hits += 1
+        choice = random.Random(seed).choice(sorted(variants))
+        return variants[choice]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def precompute_first_turns(
+    store: FirstTurnStore,
+    questions: Iterable[str],
+    personas: Iterable[str],
+    provider: LLMProvider,
+    model: str,
+    variants: int = 3,
+    max_workers: int = 4
+) -> Tuple[int, int]:
+    """
+    Generate the missing opening replies for every distinct question among `questions` and every persona.
+
+    Questions are de-duplicated by canonical ID and asked without their (Qnnn) suffix, so one reply
+    serves every row of the bank that repeats the question.
+
+    Returns:
+        (replies generated, replies that failed)
+    """
+    distinct: Dict[str, str] = {}
+    for question in questions:
+        distinct.setdefault(canonical_question_id(question), canonical_question(question))
+    personas = list(personas)
+
+    jobs: List[Tuple[str, str, int]] = []
+    for question in distinct.values():
+        for persona in personas:
+            have = store.variants(question, persona, provider, model)
+            jobs.extend((question, persona, variant) for variant in range(variants) if variant not in have)
+
+    def generate(job: Tuple[str, str, int]) -> bool:
+        question, persona, variant = job
+        reply = student_agent(
+            question=question, persona=persona, provider=provider, model=model,
+            options=sampling_options(provider, variant)
+        )
+        if reply.startswith("ERROR:"):
+            return False
+        store.put(question, persona, provider, model, variant, reply)
+        return True
+
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="first-turns") as pool:
+        outcomes = list(pool.map(generate, jobs))
+    return sum(outcomes), len(outcomes) - sum(outcomes)
@@ -0,0 +1,193 @@
+# agents/prejudge.py
+
+import json
+import math
+import os
+import random
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from agents.conversation_context import ConversationContext
+from agents.dean import apply_stopping_rules
+from utils.question_source import canonical_question
+
+# Phrases that mark a student reply as unsure
+HEDGING_PHRASES = [
+    "not sure", "not totally sure", "not entirely sure", "i don't know", "i dont know", "no idea",
+    "i'm confused", "im confused", "i guess", "maybe it", "i think maybe", "kind of lost", "not really sure",
+    "i'm not certain", "could you explain", "can you explain"
+]
+
+# Phrases that mark a teacher reply as closure rather than another Socratic question
+CLOSURE_PHRASES = [
+    "excellent!", "you've grasped", "you have grasped", "well done", "great job", "you've got it",
+    "that's exactly right", "exactly right", "you've correctly", "you have correctly", "spot on",
+    "perfect explanation", "you nailed"
+]
+
+STOPWORDS = set("""
+a an the and or but if of to in on for with by as at from is are was were be been being it its this that these
+those i you he she we they my your our their me him her us them do does did so not no yes can could would should
+will just like about into than then there here what which who how why when also very really think
+""".split())
+
+def reference_key(question: str) -> str:
+    """Canonical question text, lowercased, so repeated questions share references"""
+    return canonical_question(question).lower()
+
+def _tokens(text: str) -> Counter:
+    return Counter(t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS and len(t) > 2)
+
+def lexical_similarity(a: str, b: str) -> float:
+    """Cosine similarity of content-word counts"""
+    ta, tb = _tokens(a), _tokens(b)
+    if not ta or not tb:
+        return 0.0
+    dot = sum(ta[t] * tb[t] for t in ta)
+    return dot / (math.sqrt(sum(v * v for v in ta.values())) * math.sqrt(sum(v * v for v in tb.values())))
+
+class PreJudge:
+    """
+    Local stage in front of the LLM dean that settles clear-cut iterations without an LLM call.
+
+    It returns a verdict when:
+    - a first-round student reply hedges and the teacher answered with a question (continue),
+    - the teacher reply is plain closure and the student did not hedge (satisfactory),
+    - the student reply closely matches a reference answer the LLM dean already accepted (satisfactory).
+    Everything else returns None and goes to the LLM dean. A sample of local decisions is still
+    sent to the LLM (audit_rate) so agreement can be tracked and thresholds tuned; only the decisions
+    that are not audited count as resolved locally.
+
+    It reads the same bounded rounds of the ConversationContext as the LLM dean, never the full history.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.6, audit_rate: float = 0.1,
+                 max_references: int = 5, seed: Optional[int] = None):
+        """
+        Args:
+            similarity_threshold: Minimum similarity to an accepted reference answer to judge locally
+            audit_rate: Share of local decisions double-checked by the LLM dean
+            max_references: Accepted answers kept per canonical question
+            seed: Seed for audit sampling
+        """
+        self.similarity_threshold = similarity_threshold
+        self.audit_rate = audit_rate
+        self.max_references = max_references
+        self.references: Dict[str, List[str]] = {}
+        self.stats = {"calls": 0, "local": 0, "deferred": 0, "audited": 0, "agreed": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _has_phrase(text: str, phrases: List[str]) -> bool:
+        lowered = text.lower()
+        return any(p in lowered for p in phrases)
+
+    @staticmethod
+    def _latest_round(context: ConversationContext) -> Optional[Dict]:
+        """The round the dean is reviewing: the last one with both a student and a teacher reply"""
+        complete = [r for r in context["rounds"] if r["teacher"] is not None]
+        return complete[-1] if complete else None
+
+    def judge(self, question: str, context: ConversationContext,
+              current_iteration: int, max_iterations: int) -> Optional[dict]:
+        """Return a dean-style assessment when the outcome is clear, otherwise None"""
+        with self._lock:
+            self.stats["calls"] += 1
+
+        latest = self._latest_round(context)
+        if latest is None:
+            return self._defer()
+        latest_student, latest_teacher = latest["student"], latest["teacher"]
+        hedging = self._has_phrase(latest_student, HEDGING_PHRASES)
+        closure = self._has_phrase(latest_teacher, CLOSURE_PHRASES) and "?" not in latest_teacher
+
+        if current_iteration == 1 and hedging and "?" in latest_teacher and not closure:
+            return self._decide("continue", "poor", "partially_correct",
+                                "First-round answer hedges and the teacher is still probing",
+                                current_iteration, max_iterations)
+
+        if closure and not hedging:
+            return self._decide("satisfactory", "good", "correct",
+                                "Teacher gave closure on an unhedged answer",
+                                current_iteration, max_iterations)
+
+        with self._lock:
+            references = list(self.references.get(reference_key(question), []))
+        if references and not hedging:
+            best = max(lexical_similarity(latest_student, ref) for ref in references)
+            if best >= self.similarity_threshold:
+                return self._decide("satisfactory", "good", "correct",
+                                    f"Answer matches an accepted reference (similarity {best:.2f})",
+                                    current_iteration, max_iterations)
+
+        return self._defer()
+
+    def _defer(self) -> None:
+        with self._lock:
+            self.stats["deferred"] += 1
+        return None
+
+    def _decide(self, verdict: str, understanding: str, correctness: str, reason: str,
+                current_iteration: int, max_iterations: int) -> dict:
+        result = {
+            "verdict": verdict,
+            "understanding_level": understanding,
+            "answer_correctness": correctness,
+            "reasoning": f"Pre-judge: {reason}",
+            "key_insights_gained": [],
+            "remaining_gaps": [],
+            "prejudged": True
+        }
+        return apply_stopping_rules(result, current_iteration, max_iterations)
+
+    def should_audit(self) -> bool:
+        """
+        Whether this local decision should also be checked by the LLM dean.
+        A decision that is not audited is counted as resolved locally; an audited one is counted by observe().
+        """
+        with self._lock:
+            audit = self._rng.random() < self.audit_rate
+            if not audit:
+                self.stats["local"] += 1
+            return audit
+
+    def observe(self, question: str, context: ConversationContext, llm_result: dict,
+                local_result: Optional[dict] = None) -> None:
+        """Learn from an LLM dean verdict: track agreement and keep accepted answers as references"""
+        with self._lock:
+            if local_result is not None:
+                self.stats["audited"] += 1
+                if local_result["verdict"] == llm_result.get("verdict"):
+                    self.stats["agreed"] += 1
+
+            if llm_result.get("verdict") == "satisfactory" and llm_result.get("answer_correctness") == "correct":
+                latest = self._latest_round(context)
+                if latest is not None:
+                    refs = self.references.setdefault(reference_key(question), [])
+                    if latest["student"] not in refs:
+                        refs.append(latest["student"])
+                        del refs[:-self.max_references]
+
+    @property
+    def agreement_rate(self) -> Optional[float]:
+        return self.stats["agreed"] / self.stats["audited"] if self.stats["audited"] else None
+
+    def summary(self) -> str:
+        s = self.stats
+        agreement = f"{self.agreement_rate:.0%}" if self.agreement_rate is not None else "n/a"
+        return (f"{s['local']}/{s['calls']} dean calls resolved locally, "
+                f"{s['audited']} more decided locally but audited by the LLM (agreement {agreement})")
+
+    def save_references(self, path: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock, open(path, "w") as f:
+            json.dump(self.references, f, indent=2)
+
+    def load_references(self, path: str) -> None:
+        if os.path.exists(path):
+            with open(path) as f, self._lock:
+                self.references.update(json.load(f))
@@ -0,0 +1,74 @@
+# agents/schemas.py
+
+# Response schemas for the JSON-producing agents, passed to providers that support constrained output.
+# They mirror the JSON formats described in agents/prompts.py.
+
+LEVEL = {"type": "string", "enum": ["poor", "developing", "good", "excellent"]}
+TEXT = {"type": "string"}
+TEXT_LIST = {"type": "array", "items": {"type": "string"}}
+
+def _object(properties: dict, required=None) -> dict:
+    return {"type": "object", "properties": properties, "required": list(required or properties)}
+
+DEAN_REQUIRED = ("verdict", "understanding_level", "answer_correctness")
+
+DEAN_PROPERTIES = {
+    "verdict": {"type": "string", "enum": ["continue", "satisfactory", "max_reached"]},
+    "understanding_level": LEVEL,
+    "reasoning": TEXT,
+    "answer_correctness": {"type": "string", "enum": ["correct", "partially_correct", "incorrect"]},
+    "key_insights_gained": TEXT_LIST,
+    "remaining_gaps": TEXT_LIST
+}
+
+DEAN_SCHEMA = _object(DEAN_PROPERTIES, DEAN_REQUIRED)
+
+TEACHER_DEAN_REQUIRED = ("teacher_reply",) + DEAN_REQUIRED
+
+TEACHER_DEAN_SCHEMA = _object({"teacher_reply": TEXT, **DEAN_PROPERTIES}, TEACHER_DEAN_REQUIRED)
+
+COGNITIVE_REQUIRED = (
+    "mental_model_development",
+    "learning_patterns",
+    "cognitive_skills_demonstrated",
+    "persona_consistency",
+    "recommendations",
+    "overall_assessment"
+)
+
+COGNITIVE_SCHEMA = _object({
+    "mental_model_development": _object({
+        "initial_state": TEXT,
+        "final_state": TEXT,
+        "key_breakthroughs": TEXT_LIST,
+        "persistent_misconceptions": TEXT_LIST
+    }),
+    "learning_patterns": _object({
+        "preferred_learning_style": TEXT,
+        "response_to_guidance": TEXT,
+        "question_asking_behavior": TEXT,
+        "confidence_progression": TEXT
+    }),
+    "cognitive_skills_demonstrated": _object({
+        "analytical_thinking": LEVEL,
+        "conceptual_connections": LEVEL,
+        "self_reflection": LEVEL,
+        "knowledge_application": LEVEL
+    }),
+    "persona_consistency": _object({
+        "trait_alignment": TEXT,
+        "authentic_behaviors": TEXT_LIST,
+        "persona_development": TEXT
+    }),
+    "recommendations": _object({
+        "next_learning_steps": TEXT_LIST,
+        "teaching_strategies": TEXT_LIST,
+        "knowledge_gaps": TEXT_LIST
+    }),
+    "overall_assessment": _object({
+        "learning_effectiveness": {"type": "string", "enum": ["poor", "fair", "good", "excellent"]},
+        "engagement_level": {"type": "string", "enum": ["low", "medium", "high"]},
+        "readiness_for_advanced_topics": {"type": "string", "enum": ["yes", "no", "partial"]},
+        "summary": TEXT
+    })
+}, COGNITIVE_REQUIRED)
@@ -1,7 +1,11 @@
 # agents/student.py
 
-from config.llm_config import chat_with_llm, LLMProvider
-from config.personas import persona_traits
+import threading
+
+from config.llm_config import chat_with_llm, exceeds_budget, stop_rule_for, LLMProvider
+from utils.streaming import StopOnCancel
+from agents.prompts import student_system
+from agents.conversation_context import ConversationContext, context_from_history, compact_context, student_view
 from typing import List, Dict, Optional
 
 def student_agent(
@@ -10,7 +14,10 @@ def student_agent(
     provider: LLMProvider = "gemini", 
     model: str = "gemini-2.0-flash",
     teacher_guidance: Optional[str] = None,
-    conversation_history: Optional[List[Dict]] = None
+    conversation_history: Optional[List[Dict]] = None,
+    context: Optional[ConversationContext] = None,
+    cancel: Optional[threading.Event] = None,
+    options: Optional[Dict] = None
 ) -> str:
     """
     Student agent that responds to questions based on their persona and learning state.
@@ -22,60 +29,38 @@ def student_agent(
         model: Model name
         teacher_guidance: Latest teacher response for iterative learning
         conversation_history: Full conversation context
+        context: Incrementally maintained conversation views (preferred over conversation_history)
+        cancel: Setting this event abandons the reply mid-generation (used for speculative turns)
+        options: Provider options, e.g. sampling_options() for precomputed first-turn variants
     """
-    traits = persona_traits[persona]
-    
-    # Build context from conversation history
-    context = ""
-    if conversation_history:
-        context = "\n\nPrevious conversation:\n"
-        for entry in conversation_history[-4:]:  # Last 4 exchanges for context
-            role = entry["role"].capitalize()
-            content = entry["content"][:200] + "..." if len(entry["content"]) > 200 else entry["content"]
-            context += f"{role}: {content}\n"
+    ctx = context if context is not None else context_from_history(conversation_history)
     
-    # Different prompts for initial vs iterative responses
-    if teacher_guidance and conversation_history:
+    # Stable persona/instruction prefix goes in the system prompt; only the dialogue varies
+    if teacher_guidance and ctx["turns"]:
         # Continuing the Socratic dialogue
-        prompt = f"""
-You are a data science student with the following traits:
-- Persona: {persona}
-- Problem Understanding: {traits['Problem Understanding']}
-- Instruction Understanding: {traits['Instruction Understanding']}
-- Calculation: {traits['Calculation']}
-- Knowledge Mastery: {traits['Knowledge Mastery']}
-- Thirst for Learning: {traits['Thirst for Learning']}
-
+        def render(history_text: str) -> str:
+            return f"""
 Original question: "{question}"
 
-{context}
+{history_text}
 
 Your teacher just asked you: "{teacher_guidance}"
-
-Respond as this student persona would, building on what you've learned so far. Show your thinking process and any new insights you've gained. Keep your response to 2-4 sentences.
-
-Remember:
-- Stay true to your persona's learning style and knowledge level
-- Show progression in understanding from previous responses
-- Ask follow-up questions if you're curious about something
-- Acknowledge when something clicks or when you're still confused
 """
+        system = student_system(persona, followup=True)
+        prompt = render(student_view(ctx))  # Last 4 exchanges for context
+        if exceeds_budget("student", system, prompt):
+            prompt = render(student_view(compact_context(ctx)))
     else:
         # Initial response to the question
+        system = student_system(persona, followup=False)
         prompt = f"""
-You are a data science student with the following traits:
-- Persona: {persona}
-- Problem Understanding: {traits['Problem Understanding']}
-- Instruction Understanding: {traits['Instruction Understanding']}
-- Calculation: {traits['Calculation']}
-- Knowledge Mastery: {traits['Knowledge Mastery']}
-- Thirst for Learning: {traits['Thirst for Learning']}
-
-Your task is to respond to this data science interview question:
+Respond to this data science interview question:
 
 "{question}"
-
-Write a response in 2–4 sentences, reflecting your level of knowledge and confidence based on your persona traits. Don't be afraid to show uncertainty or ask clarifying questions if that fits your persona.
 """
     
-    return chat_with_llm(prompt, provider=provider, model=model)
\ No newline at end of file
+    stop = stop_rule_for("student")
+    if cancel is not None:
+        stop = StopOnCancel(cancel, stop)
+    return chat_with_llm(prompt, system=system, provider=provider, model=model, agent="student", stop=stop,
+                        options=options)
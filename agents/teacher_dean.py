@@ -0,0 +1,58 @@
+# agents/teacher_dean.py
+
+from config.llm_config import chat_json, exceeds_budget, LLMProvider
+from agents.dean import apply_stopping_rules, fallback_assessment
+from agents.prompts import teacher_dean_system
+from agents.schemas import TEACHER_DEAN_SCHEMA, TEACHER_DEAN_REQUIRED
+from utils.structured_output import StructuredOutputError, extract_json
+from agents.conversation_context import ConversationContext, context_from_history, compact_context, teacher_view
+from typing import List, Dict, Optional
+
+def teacher_dean_agent(
+    question: str,
+    student_reply: str,
+    current_iteration: int,
+    max_iterations: int,
+    provider: LLMProvider = "gemini",
+    model: str = "gemini-2.0-flash",
+    conversation_history: Optional[List[Dict]] = None,
+    context: Optional[ConversationContext] = None
+) -> dict:
+    """
+    Combined Socratic teacher and dean in a single structured call.
+    Returns the dean assessment fields plus "teacher_reply", so one round trip replaces two.
+    """
+
+    # Conversation context, bounded by the rolling transcript window
+    ctx = context if context is not None else context_from_history(conversation_history)
+
+    def render(history_text: str) -> str:
+        return f"""
+Original interview question: "{question}"
+Student's latest response: "{student_reply}"
+{history_text}
+Iteration {current_iteration}/{max_iterations}
+"""
+
+    system = teacher_dean_system()
+    prompt = render(teacher_view(ctx))
+    if exceeds_budget("teacher_dean", system, prompt):
+        prompt = render(teacher_view(compact_context(ctx)))
+
+    try:
+        result = chat_json(
+            prompt, system=system, provider=provider, model=model, agent="teacher_dean",
+            schema=TEACHER_DEAN_SCHEMA, required=TEACHER_DEAN_REQUIRED
+        )
+        if not result.get("teacher_reply"):
+            raise StructuredOutputError("Empty teacher_reply", str(result))
+        return apply_stopping_rules(result, current_iteration, max_iterations)
+
+    except StructuredOutputError as e:
+        print(f"Teacher/dean JSON parsing error: {e}")
+        print(f"Raw response: {e.response}")
+
+        # Keep whatever teacher text there is so the dialogue can still go on
+        partial = extract_json(e.response) or {}
+        teacher_reply = partial.get("teacher_reply") or e.response
+        return {**fallback_assessment(current_iteration, max_iterations), "teacher_reply": teacher_reply}
@@ -0,0 +1,44 @@
+# assessment_worker.py - drain a run's deferred cognitive assessment queue, e.g. later or on a cheaper model
+
+import argparse
+import os
+
+from config.llm_config import PROVIDER_QUOTAS, close_all_clients
+from utils.assessment_queue import ASSESSMENT_QUEUE_FILE, AssessmentQueue, AssessmentWorkerPool
+from utils.run_manifest import RUNS_DIR
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the queued cognitive assessments of a run started with --defer-assessment")
+    parser.add_argument("run_id", help="Run ID under outputs/runs")
+    parser.add_argument("--provider", choices=list(PROVIDER_QUOTAS), help="Provider (default: each dialogue's)")
+    parser.add_argument("--model", help="Model (default: each dialogue's, or the --provider default)")
+    parser.add_argument("--workers", type=int, default=2, help="Assessments in flight")
+    parser.add_argument("--rpm", type=float, help="Requests/min budget for the assessments")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    path = os.path.join(RUNS_DIR, args.run_id, ASSESSMENT_QUEUE_FILE)
+    if not os.path.exists(path):
+        raise SystemExit(f"No assessment queue at {path}")
+    # Imported here so the graph module is only loaded once the queue is known to exist
+    from main import DEFAULT_MODELS, run_assessment
+    if args.provider:
+        args.model = args.model or DEFAULT_MODELS[args.provider]
+
+    queue = AssessmentQueue(path)
+    print(f"🧠 {queue.counts()['pending']} cognitive assessments pending in {args.run_id}")
+    pool = AssessmentWorkerPool(
+        queue,
+        lambda payload: run_assessment(payload, args.provider, args.model),
+        max_workers=args.workers,
+        requests_per_minute=args.rpm
+    ).start()
+    try:
+        pool.close()
+    finally:
+        close_all_clients()
+    stats = pool.stats()
+    counts = queue.counts()
+    print(f"🧠 {stats.completed} assessed, {stats.failed} failed; queue: {counts['done']} done, {counts['failed']} failed")
+    queue.close()
@@ -0,0 +1,259 @@
+# benchmark.py - offline load test of the dialogue pipeline against the simulated provider
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List
+
+from config.llm_config import PROVIDER_QUOTAS, ROUTER_SETTINGS, get_llm_client
+from config.personas import persona_traits
+from utils.fake_client import configure_fake_provider
+from utils.scheduler import DialogueScheduler
+from utils.lockstep import LockstepBatcher
+from utils.structured_output import get_json_stats
+from utils.streaming import get_stream_totals
+from utils.rate_limiter import get_rate_limiter_stats
+from utils.speculation import get_speculation_stats
+from utils.assessment_queue import AssessmentQueue, AssessmentWorkerPool
+from utils.tracing import configure_tracing, span
+from utils.question_source import QuestionSource
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+class NodeTimer:
+    """Collects wall-clock latency per graph node"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def wrap(self, name, fn):
+        def timed(state):
+            start = time.perf_counter()
+            try:
+                return fn(state)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.latencies[name].append(elapsed)
+        return timed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run N dialogues through the simulated provider and report throughput")
+    parser.add_argument("--dialogues", type=int, default=50, help="Number of dialogues to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="Dialogues in flight at once")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Median/fixed simulated call latency")
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal spread")
+    parser.add_argument("--satisfactory-rate", type=float, default=0.4, help="Share of dean verdicts that end the dialogue")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls rejected with a 429")
+    parser.add_argument("--server-rpm", type=int, help="Requests/min the simulated server accepts before answering 429")
+    parser.add_argument("--client-rpm", type=int, help="Requests/min quota given to the client-side rate limiter")
+    parser.add_argument("--malformed-json-rate", type=float, default=0.0, help="Share of JSON responses that are broken")
+    parser.add_argument("--wrapped-json-rate", type=float, default=0.0, help="Share of JSON responses wrapped in fences and prose")
+    parser.add_argument("--server-parallel", type=int, help="Requests the simulated server handles at once (default unlimited)")
+    parser.add_argument("--token-interval-ms", type=float, default=0.0, help="Delay between streamed words")
+    parser.add_argument("--runaway-rate", type=float, default=0.0, help="Share of free-text replies that run far too long")
+    parser.add_argument("--router", action="store_true", help="Route calls over the fake and fake-b backends")
+    parser.add_argument("--hedge-after-ms", type=float, help="Router hedge delay (default: ROUTER_SETTINGS)")
+    parser.add_argument("--degraded-latency-ms", type=float, help="Make the preferred backend this slow (lognormal median)")
+    parser.add_argument("--degraded-error-rate", type=float, default=0.0, help="Share of 429s from the preferred backend")
+    parser.add_argument("--max-iterations", type=int, default=5)
+    parser.add_argument("--fused", action="store_true", help="Use the combined teacher/dean node")
+    parser.add_argument("--prejudge", action="store_true", help="Put the local pre-judge in front of the dean")
+    parser.add_argument("--lockstep", action="store_true", help="Batch the cohort's LLM calls step by step")
+    parser.add_argument("--speculative", action="store_true", help="Generate the next student turn while the dean decides")
+    parser.add_argument("--first-turns", type=int, metavar="VARIANTS",
+                        help="Precompute this many opening turns per question and persona (untimed) and start from them")
+    parser.add_argument("--defer-assessment", action="store_true", help="Queue cognitive assessments for a separate pool")
+    parser.add_argument("--assessment-workers", type=int, default=2, help="Threads draining the assessment queue")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", metavar="PATH", help="Write spans to PATH for trace_report.py --path")
+    parser.add_argument("--memory", action="store_true", help="Trace Python allocations and report peak memory (slower)")
+    parser.add_argument("--verbose", action="store_true", help="Keep the per-node console output")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    configure_fake_provider(
+        latency_distribution=args.latency_distribution,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        verdict_weights={"continue": 1 - args.satisfactory_rate, "satisfactory": args.satisfactory_rate},
+        rate_limit_rate=args.rate_limit_rate,
+        requests_per_minute=args.server_rpm,
+        malformed_json_rate=args.malformed_json_rate,
+        wrapped_json_rate=args.wrapped_json_rate,
+        max_parallel=args.server_parallel,
+        token_interval_ms=args.token_interval_ms,
+        runaway_reply_rate=args.runaway_rate,
+        seed=args.seed
+    )
+    if args.degraded_latency_ms or args.degraded_error_rate:
+        configure_fake_provider(
+            model="fake", latency_ms=args.degraded_latency_ms or args.latency_ms, latency_sigma=1.0,
+            rate_limit_rate=args.degraded_error_rate
+        )
+    if args.hedge_after_ms is not None:
+        ROUTER_SETTINGS["hedge_after"] = args.hedge_after_ms / 1000.0
+    PROVIDER_QUOTAS["fake"] = {**PROVIDER_QUOTAS["fake"], "requests_per_minute": args.client_rpm}
+    provider = "router" if args.router else "fake"
+    # Import after configuring so nothing reads the defaults first
+    from main import build_graph, build_initial_state
+    from agents.prejudge import PreJudge
+
+    timer = NodeTimer()
+    prejudge = PreJudge(seed=args.seed) if args.prejudge else None
+    graph = build_graph(node_wrapper=timer.wrap, fused=args.fused, prejudge=prejudge, speculative=args.speculative,
+                        deferred_assessment=args.defer_assessment)
+    assessment_pool = None
+    if args.defer_assessment:
+        from main import assessment_payload, run_assessment
+        queue_dir = tempfile.mkdtemp(prefix="benchmark-assessments-")
+        assessment_pool = AssessmentWorkerPool(
+            AssessmentQueue(os.path.join(queue_dir, "assessments.sqlite")), run_assessment,
+            max_workers=args.assessment_workers
+        ).start()
+    questions = [row for _, row in QuestionSource("data/data_science_interview_questions.csv")]
+    rng = random.Random(args.seed)
+    personas = list(persona_traits.keys())
+    first_turns = None
+    if args.first_turns:
+        from agents.first_turns import FirstTurnStore, precompute_first_turns
+        first_turns = FirstTurnStore(os.path.join(tempfile.mkdtemp(prefix="benchmark-first-turns-"), "first_turns.sqlite"))
+        precompute_first_turns(first_turns, (row["question"] for row in questions), personas, provider, "fake",
+                               variants=args.first_turns, max_workers=args.concurrency)
+        get_llm_client("fake", "fake")._get_backend().calls = 0
+
+    def dialogues():
+        for i in range(args.dialogues):
+            row = questions[i % len(questions)]
+            state = build_initial_state(row, rng.choice(personas), provider=provider, model="fake")
+            state["max_iterations"] = args.max_iterations
+            if first_turns is not None:
+                state["first_student_reply"] = first_turns.pick(row["question"], state["persona"], provider, "fake",
+                                                                seed=f"{args.seed}:{i}")
+            yield f"D{i+1}", state
+
+    iterations: List[int] = []
+    prompt_tokens: Dict[str, List[int]] = defaultdict(list)
+
+    def collect(dialogue_id, final):
+        if assessment_pool is not None:
+            assessment_pool.submit(dialogue_id, assessment_payload(final))
+        iterations.append(final["final_assessment"]["total_iterations"])
+        for agent, usage in final["final_assessment"]["token_usage"]["by_agent"].items():
+            prompt_tokens[agent].append(usage["max_prompt_tokens"])
+
+    def run_dialogue(dialogue_id, state):
+        return timer.wrap("dialogue", lambda s: run_traced(dialogue_id, s))(state)
+
+    def run_traced(dialogue_id, state):
+        with span("dialogue", kind="dialogue", dialogue_id=dialogue_id, persona=state["persona"]) as dialogue_span:
+            final = graph.invoke(state)
+            if dialogue_span is not None:
+                dialogue_span.set(iterations=final["final_assessment"]["total_iterations"])
+            return final
+
+    if args.trace:
+        configure_tracing(args.trace)
+    batcher = LockstepBatcher() if args.lockstep else None
+    scheduler = DialogueScheduler(
+        run_dialogue,
+        max_workers=args.concurrency,
+        on_complete=collect,
+        batcher=batcher
+    )
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    if args.memory:
+        tracemalloc.start()
+    with output:
+        stats = scheduler.run(dialogues())
+        if args.memory:
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        if assessment_pool is not None:
+            drain_started = time.monotonic()
+            assessment_pool.close()
+            drain_seconds = time.monotonic() - drain_started
+
+    backend = get_llm_client("fake", "fake")._get_backend()
+    llm_calls = backend.calls
+    if args.router:
+        # Every answer came from a fake backend; hedged duplicates count as calls too
+        llm_calls += get_llm_client("fake", "fake-b")._get_backend().calls
+    mode = "fused teacher/dean" if args.fused else "separate teacher and dean"
+    if args.lockstep:
+        mode += ", lockstep batching"
+    if args.speculative and not args.fused:
+        mode += ", speculative student turns"
+    if first_turns is not None:
+        mode += f", precomputed opening turns ({args.first_turns} variants)"
+    if assessment_pool is not None:
+        mode += f", deferred assessment ({args.assessment_workers} workers)"
+    print(f"🧪 Simulated provider: {args.latency_distribution} {args.latency_ms:.0f}ms, concurrency {args.concurrency}, {mode}")
+    print("=" * 50)
+    print(f"Dialogues: {stats.completed} completed, {stats.failed} failed in {stats.elapsed:.2f}s")
+    print(f"Throughput: {stats.completed / stats.elapsed:.2f} dialogues/sec")
+    if stats.completed:
+        print(f"LLM calls per dialogue: {llm_calls / stats.completed:.2f}")
+        print(f"Iterations per dialogue: {sum(iterations) / len(iterations):.2f}")
+    if args.memory:
+        print(f"Peak traced memory: {peak_memory / 2**20:.1f} MB, "
+              f"{peak_memory / 1024 / min(args.concurrency, args.dialogues):.0f} KB per dialogue in flight")
+    if batcher is not None:
+        batch_stats = batcher.stats()
+        print(f"Lockstep batches: {batch_stats.batches}, mean size {batch_stats.mean_batch_size:.1f}, largest {batch_stats.largest}")
+    limiter_stats = get_rate_limiter_stats().get(("fake", "fake"))
+    if limiter_stats is not None and (backend.rejected or limiter_stats.throttled_seconds >= 0.1):
+        print(f"Rate limiting: {backend.rejected} calls rejected by the server, {limiter_stats.retries} retries, "
+              f"{limiter_stats.gave_up} gave up, {limiter_stats.throttled_seconds:.1f}s throttled, "
+              f"concurrency limit {limiter_stats.concurrency_limit:.1f}")
+    if first_turns is not None:
+        print(f"Precomputed opening turns: {first_turns.hits} used, {first_turns.misses} missing")
+    if assessment_pool is not None:
+        pool_stats = assessment_pool.stats()
+        print(f"Deferred assessments: {pool_stats.completed} done, {pool_stats.failed} failed, "
+              f"queue drained {drain_seconds:.2f}s after the last dialogue")
+    speculation = get_speculation_stats()
+    if speculation.started:
+        print(f"Speculative student turns: {speculation.started} started, {speculation.committed} used, "
+              f"{speculation.discarded} discarded ({speculation.waste_rate:.0%}), {speculation.skipped} never sent, "
+              f"{speculation.wasted_seconds:.1f}s and {speculation.wasted_tokens} tokens wasted")
+    json_stats = get_json_stats()
+    print(f"JSON responses: {json_stats.direct} direct, {json_stats.repaired} repaired, "
+          f"{json_stats.reasked} re-asked, {json_stats.failed} failed")
+    if args.router:
+        for health in get_llm_client("router", "fake")._get_backend().health():
+            latency = f"{health.latency * 1000:.0f}ms" if health.latency is not None else "n/a"
+            print(f"Router {health.name}: {health.calls} calls ({health.hedges} hedges), {health.wins} answers used, "
+                  f"{health.errors} errors, {health.ejections} ejections, latency {latency}")
+    stream_totals = get_stream_totals()
+    if stream_totals.calls:
+        print(f"Streamed calls: {stream_totals.calls}, {stream_totals.stopped_early} stopped early, "
+              f"mean TTFT {stream_totals.mean_ttft * 1000:.1f}ms, {stream_totals.tokens_per_sec:.0f} tokens/sec")
+    if prejudge is not None:
+        print(f"Dean pre-judge: {prejudge.summary()}")
+    if prompt_tokens:
+        peaks = ", ".join(f"{agent} {max(values)}" for agent, values in prompt_tokens.items())
+        print(f"Peak prompt tokens: {peaks}")
+    print(f"\n{'node':<12}{'calls':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, values in timer.latencies.items():
+        ms = [v * 1000 for v in values]
+        print(f"{name:<12}{len(ms):>8}{percentile(ms, 50):>10.1f}{percentile(ms, 95):>10.1f}{percentile(ms, 99):>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,27 @@
 # config/llm_config.py
 
-from utils.ollama_client import ollama_chat
-from utils.gemini_client import gemini_chat
-from typing import Literal
+import atexit
+import importlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from utils.response_cache import ResponseCache, CacheMissError, CacheStats, DEFAULT_CACHE_PATH
+from utils.token_usage import UsageRecord, estimate_tokens, peek_provider_usage, record_usage, take_provider_usage
+from utils.rate_limiter import RateLimitError, RateLimiter, current_call_budget, get_rate_limiter
+from utils.tracing import span, annotate_span
+from utils.lockstep import current_batcher
+from utils.streaming import StopAfter, StopWhenJsonComplete, StreamStats, apply_stop, consume_stream, stream_writer_for
+from utils.structured_output import (
+    StructuredOutputError, count_json_outcome, extract_json, missing_fields, reask_prompt
+)
+from typing import Dict, Iterator, List, Literal, Optional, Sequence, Tuple
 
 # Available LLM providers
-LLMProvider = Literal["ollama", "gemini"]
+LLMProvider = Literal["ollama", "ollama_http", "gemini", "fake", "router"]
+
+# Response cache modes: "off", "readwrite" (use and fill the cache), "cache_only" (never call the provider)
+CacheMode = Literal["off", "readwrite", "cache_only"]
 
 # Model configurations
 OLLAMA_MODELS = {
@@ -21,6 +37,115 @@ GEMINI_MODELS = {
     "gemini": "gemini-2.0-flash"             # Default alias
 }
 
+# Simulated provider for offline load tests (see utils/fake_client.py)
+FAKE_MODELS = {
+    "fake": "fake",
+    "fake-b": "fake-b"  # Second simulated backend, configurable separately
+}
+
+# Routes for the "router" provider (utils/router_client.py): route name -> backends, most preferred first
+ROUTER_ROUTES = {
+    "gemini-ollama": [("gemini", "gemini-2.0-flash"), ("ollama_http", "llama3")],
+    "gemini-tiers": [("gemini", "gemini-2.0-flash"), ("gemini", "gemini-2.0-pro")],
+    "fake": [("fake", "fake"), ("fake", "fake-b")]
+}
+
+# Router tuning: send a hedged duplicate after hedge_after seconds without an answer (None: never),
+# and skip a backend for eject_seconds after eject_after consecutive failures
+ROUTER_SETTINGS = {
+    "hedge_after": float(os.getenv("ROUTER_HEDGE_AFTER", "4.0")),
+    "eject_after": 3,
+    "eject_seconds": 60.0
+}
+
+# USD per million (input, output) tokens; unlisted models are treated as free
+MODEL_PRICING = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-pro": (1.25, 10.00)
+}
+
+# Per-agent prompt budgets in tokens (system + prompt); agents compact their context when exceeded
+AGENT_TOKEN_BUDGETS = {
+    "student": 1200,
+    "teacher": 1500,
+    "teacher_dean": 2000,
+    "dean": 2000,
+    "cognitive": 2500
+}
+
+# Early-stop caps on free-text replies; generation is cancelled once a reply passes them
+AGENT_STOP_LIMITS = {
+    "student": {"sentences": 5, "tokens": 250}  # The prompt asks for 2-4 sentences
+}
+
+# Stream responses whenever a call has a stop rule or a stream writer; "0" always waits for the full reply
+STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+
+# Provider quotas enforced client-side by each (provider, model)'s shared rate limiter
+# (None means unlimited); max_concurrency also sizes the dialogue worker pool
+PROVIDER_QUOTAS = {
+    "gemini": {"requests_per_minute": 15, "tokens_per_minute": 1_000_000, "max_concurrency": 4},  # Free tier limits
+    "ollama": {"requests_per_minute": None, "tokens_per_minute": None, "max_concurrency": 2},  # Bounded by local hardware
+    "ollama_http": {"requests_per_minute": None, "tokens_per_minute": None, "max_concurrency": 2},
+    "fake": {"requests_per_minute": None, "tokens_per_minute": None, "max_concurrency": 16},
+    # Members keep their own quotas; this only bounds calls in flight through the router
+    "router": {"requests_per_minute": None, "tokens_per_minute": None, "max_concurrency": 8}
+}
+
+# Output tokens reserved against tokens_per_minute before a call; settled against reported usage after
+EXPECTED_OUTPUT_TOKENS = 300
+
+# Provider backends as "module:Class", imported only when a client for that provider is first used,
+# so e.g. an Ollama-only run never loads the Gemini SDK
+PROVIDER_BACKENDS = {
+    "gemini": "utils.gemini_client:GeminiClient",
+    "ollama": "utils.ollama_client:OllamaCLIClient",
+    "ollama_http": "utils.ollama_http_client:OllamaHTTPClient",
+    "fake": "utils.fake_client:FakeLLMClient",
+    "router": "utils.router_client:RouterClient"
+}
+
+PROVIDER_MODELS = {
+    "gemini": GEMINI_MODELS,
+    "ollama": OLLAMA_MODELS,
+    "ollama_http": OLLAMA_MODELS,
+    "fake": FAKE_MODELS,
+    "router": {name: name for name in ROUTER_ROUTES}
+}
+
+def register_route(name: str, members: Sequence[Tuple[str, str]]) -> None:
+    """Add a router route over (provider, model) backends, most preferred first"""
+    ROUTER_ROUTES[name] = list(members)
+    PROVIDER_MODELS["router"][name] = name
+
+def register_provider(name: str, backend: str, models: Dict[str, str], quota: Optional[Dict] = None) -> None:
+    """
+    Add a provider plugin.
+    
+    Args:
+        name: Provider name used in chat_with_llm(provider=...)
+        backend: "module:Class"; the class takes model= and has chat(prompt, system, options=None) and close()
+        models: Model aliases accepted for this provider, mapped to backend model names
+        quota: requests_per_minute / tokens_per_minute / max_concurrency (default: unlimited, 4 concurrent)
+    """
+    PROVIDER_BACKENDS[name] = backend
+    PROVIDER_MODELS[name] = models
+    PROVIDER_QUOTAS[name] = quota or {"requests_per_minute": None, "tokens_per_minute": None, "max_concurrency": 4}
+
+_env_loaded = False
+
+def _load_environment() -> None:
+    """Read .env once, just before the first backend needs its settings (API keys, OLLAMA_HOST)"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+def _load_backend_class(provider: str):
+    module_name, class_name = PROVIDER_BACKENDS[provider].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
 class LLMClient:
     """Unified client for different LLM providers"""
     
@@ -28,30 +153,420 @@ class LLMClient:
         self.provider = provider
         self.model = model
         # Validate model for provider
-        if provider == "ollama" and model not in OLLAMA_MODELS:
-            raise ValueError(f"Model {model} not available for Ollama. Available: {list(OLLAMA_MODELS.keys())}")
-        elif provider == "gemini" and model not in GEMINI_MODELS:
-            raise ValueError(f"Model {model} not available for Gemini. Available: {list(GEMINI_MODELS.keys())}")
+        if provider not in PROVIDER_BACKENDS:
+            raise ValueError(f"Unknown provider {provider}. Available: {list(PROVIDER_BACKENDS.keys())}")
+        models = PROVIDER_MODELS[provider]
+        if model not in models:
+            raise ValueError(f"Model {model} not available for {provider}. Available: {list(models.keys())}")
+        
+        # Provider backend is created on first use and reused for every later call
+        self._backend = None
+        self._backend_lock = threading.Lock()
+        self._batch_pool: Optional[ThreadPoolExecutor] = None
+        quota = PROVIDER_QUOTAS.get(provider, {})
+        self.rate_limiter: RateLimiter = get_rate_limiter(
+            provider, model,
+            requests_per_minute=quota.get("requests_per_minute"),
+            tokens_per_minute=quota.get("tokens_per_minute"),
+            max_concurrency=self.batch_parallelism()
+        )
+    
+    def _get_backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    _load_environment()
+                    backend_class = _load_backend_class(self.provider)
+                    self._backend = backend_class(model=PROVIDER_MODELS[self.provider][self.model])
+        return self._backend
+    
+    def chat(self, prompt: str, system: str = "", options: Optional[Dict] = None,
+             max_retries: Optional[int] = None) -> str:
+        """
+        Send prompt to configured LLM provider, with optional generation parameters.
+        Goes through the provider/model's shared rate limiter, which retries quota rejections
+        (max_retries times if given, otherwise the limiter's default).
+        """
+        try:
+            backend = self._get_backend()
+        except Exception as e:
+            return f"ERROR: {str(e)}"
+        try:
+            return self.rate_limiter.call(
+                lambda: backend.chat(prompt, system, options=options),
+                tokens=_reserved_tokens(prompt, system), usage=_reported_tokens, max_retries=max_retries
+            )
+        except RateLimitError as e:
+            return f"ERROR: Rate limit exceeded after {e.attempts} attempts"
+    
+    def chat_stream(self, prompt: str, system: str = "", options: Optional[Dict] = None,
+                    max_retries: Optional[int] = None) -> Iterator[str]:
+        """
+        Yield the response in chunks as the provider produces them.
+        Closing the iterator cancels the request; backends without streaming yield their full reply once.
+        Quota rejections before the first chunk are retried under the rate limiter.
+        """
+        try:
+            backend = self._get_backend()
+        except Exception as e:
+            yield f"ERROR: {str(e)}"
+            return
+        
+        def whole_reply():
+            yield backend.chat(prompt, system, options=options)
+        
+        attempt = 0
+        while True:
+            attempt += 1
+            with self.rate_limiter.slot(_reserved_tokens(prompt, system)) as slot:
+                chunks = backend.chat_stream(prompt, system, options=options) if hasattr(backend, "chat_stream") else whole_reply()
+                try:
+                    first = next(chunks, None)
+                except RateLimitError as e:
+                    slot.mark_rate_limited(e.retry_after)
+                    error = e
+                else:
+                    if first is not None:
+                        yield first
+                    yield from chunks
+                    slot.actual_tokens = _reported_tokens()
+                    return
+            if attempt > (self.rate_limiter.max_retries if max_retries is None else max_retries):
+                self.rate_limiter.give_up(error, attempt)
+                yield f"ERROR: Rate limit exceeded after {attempt} attempts"
+                return
+            self.rate_limiter.wait_before_retry(attempt, error)
     
-    def chat(self, prompt: str, system: str = "") -> str:
-        """Send prompt to configured LLM provider"""
+    def batch_parallelism(self) -> int:
+        """How many requests of one batch are sent to the provider at once"""
+        if self.provider == "ollama_http":
+            # Should match the server's OLLAMA_NUM_PARALLEL
+            return int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+        return PROVIDER_QUOTAS.get(self.provider, {}).get("max_concurrency", 4)
+    
+    def chat_batch(self, requests: List[Tuple[str, str, Optional[Dict]]]) -> List[Tuple[str, Optional[Tuple]]]:
+        """
+        Answer several (prompt, system, options) requests together.
+        Uses the backend's batch endpoint when it has one, otherwise sends the requests concurrently.
+        Returns (response, provider-reported usage) pairs in request order.
+        """
+        try:
+            backend = self._get_backend()
+        except Exception as e:
+            return [(f"ERROR: {str(e)}", None)] * len(requests)
+        if hasattr(backend, "chat_batch"):
+            # One batch request against the quota, reserving tokens for every prompt in it
+            try:
+                return self.rate_limiter.call(
+                    lambda: backend.chat_batch(requests),
+                    tokens=sum(_reserved_tokens(prompt, system) for prompt, system, _ in requests)
+                )
+            except RateLimitError as e:
+                return [(f"ERROR: Rate limit exceeded after {e.attempts} attempts", None)] * len(requests)
+        
+        def one(request):
+            take_provider_usage()
+            response = self.chat(*request)
+            return response, take_provider_usage()
         
-        if self.provider == "ollama":
-            return ollama_chat(prompt, model=OLLAMA_MODELS[self.model], system=system)
-        elif self.provider == "gemini":
-            return gemini_chat(prompt, model=GEMINI_MODELS[self.model], system=system)
-        else:
-            return f"ERROR: Unknown provider {self.provider}"
+        with self._backend_lock:
+            if self._batch_pool is None:
+                self._batch_pool = ThreadPoolExecutor(self.batch_parallelism(), thread_name_prefix=f"{self.provider}-batch")
+        return list(self._batch_pool.map(one, requests))
+    
+    def close(self) -> None:
+        """Release the provider backend"""
+        with self._backend_lock:
+            if self._batch_pool is not None:
+                self._batch_pool.shutdown(wait=False)
+                self._batch_pool = None
+            if self._backend is not None:
+                self._backend.close()
+                self._backend = None
+
+def _reserved_tokens(prompt: str, system: str) -> int:
+    return estimate_tokens(system) + estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS
+
+def _reported_tokens() -> Optional[int]:
+    """Tokens the provider reported for the call that just finished on this thread, without consuming them"""
+    reported = peek_provider_usage()
+    if not reported or reported[0] is None or reported[1] is None:
+        return None
+    return reported[0] + reported[1]
+
+# Process-wide client registry keyed by (provider, model)
+_client_registry: Dict[Tuple[str, str], LLMClient] = {}
+_registry_lock = threading.Lock()
 
 # Convenience functions
 def get_llm_client(provider: LLMProvider = "gemini", model: str = "gemini-2.5-flash") -> LLMClient:
-    """Get configured LLM client"""
-    return LLMClient(provider, model)
+    """Get the shared LLM client for a provider/model, creating it on first use"""
+    key = (provider, model)
+    client: Optional[LLMClient] = _client_registry.get(key)
+    if client is None:
+        with _registry_lock:
+            client = _client_registry.get(key)
+            if client is None:
+                client = LLMClient(provider, model)
+                _client_registry[key] = client
+    return client
+
+# Optional response cache shared by every chat_with_llm call
+_cache: Optional[ResponseCache] = None
+_cache_mode: CacheMode = os.getenv("LLM_CACHE_MODE", "off")  # type: ignore[assignment]
+_cache_lock = threading.Lock()
+
+def configure_cache(
+    mode: CacheMode = "readwrite",
+    path: str = os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+    max_entries: Optional[int] = 50000,
+    max_bytes: Optional[int] = 200 * 1024 * 1024,
+    ttl_seconds: Optional[float] = None
+) -> Optional[ResponseCache]:
+    """
+    Enable, reconfigure or disable the response cache.
+    
+    Args:
+        mode: "off", "readwrite" or "cache_only" (raise CacheMissError instead of calling the provider)
+        path: SQLite file holding cached responses
+        max_entries: Entry cap before LRU eviction
+        max_bytes: Size cap before LRU eviction
+        ttl_seconds: Entries older than this are treated as misses
+    """
+    global _cache, _cache_mode
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+            _cache = None
+        _cache_mode = mode
+        if mode != "off":
+            _cache = ResponseCache(path, max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    return _cache
+
+def _get_cache() -> Optional[ResponseCache]:
+    global _cache
+    if _cache is None and _cache_mode != "off":
+        with _cache_lock:
+            if _cache is None and _cache_mode != "off":
+                # Environment-configured cache (LLM_CACHE_MODE / LLM_CACHE_PATH) opens on first use
+                _cache = ResponseCache(os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH))
+    return _cache
+
+def get_cache_stats() -> Optional[CacheStats]:
+    """Hit/miss/eviction counters for the active cache, or None when caching is off"""
+    cache = _get_cache()
+    return cache.stats() if cache else None
+
+def close_all_clients() -> None:
+    """Close every registered client; safe to call more than once"""
+    with _registry_lock:
+        clients = list(_client_registry.values())
+        _client_registry.clear()
+    for client in clients:
+        client.close()
+    configure_cache("off")
+
+atexit.register(close_all_clients)
+
+def exceeds_budget(agent: str, system: str, prompt: str) -> bool:
+    """Whether a prompt is over the agent's configured token budget"""
+    budget = AGENT_TOKEN_BUDGETS.get(agent)
+    return budget is not None and estimate_tokens(system) + estimate_tokens(prompt) > budget
 
-def chat_with_llm(prompt: str, system: str = "", provider: LLMProvider = "gemini", model: str = "gemini-2.5-flash") -> str:
-    """Direct chat function with specified provider"""
-    client = get_llm_client(provider, model)
-    return client.chat(prompt, system)
+def stop_rule_for(agent: str) -> Optional[StopAfter]:
+    """The agent's configured early-stop cap, if any"""
+    limits = AGENT_STOP_LIMITS.get(agent)
+    return StopAfter(**limits) if limits else None
+
+def _record_call(agent: Optional[str], provider: str, model: str, system: str, prompt: str,
+                 response: str, cached: bool, stream: Optional[StreamStats] = None) -> UsageRecord:
+    reported = None if cached else take_provider_usage()
+    return record_backend_call(agent, provider, model, system, prompt, response, reported, cached=cached, stream=stream)
+
+def record_backend_call(agent: Optional[str], provider: str, model: str, system: str, prompt: str, response: str,
+                        reported: Optional[Tuple[Optional[int], Optional[int]]], cached: bool = False,
+                        stream: Optional[StreamStats] = None) -> UsageRecord:
+    """
+    Record one provider call with the (prompt, output) tokens it reported; missing counts are estimated from
+    the text. Also used for calls chat_with_llm never sees, e.g. the router's hedged duplicates.
+    """
+    prompt_tokens = reported[0] if reported and reported[0] is not None else None
+    output_tokens = reported[1] if reported and reported[1] is not None else None
+    estimated = prompt_tokens is None or output_tokens is None
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(system) + estimate_tokens(prompt)
+    if output_tokens is None:
+        output_tokens = estimate_tokens(response)
+    input_price, output_price = MODEL_PRICING.get(PROVIDER_MODELS.get(provider, {}).get(model, model), (0.0, 0.0))
+    cost = 0.0 if cached else (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+    return record_usage(UsageRecord(
+        agent=agent, provider=provider, model=model,
+        prompt_chars=len(system) + len(prompt),
+        prompt_tokens=prompt_tokens, output_tokens=output_tokens,
+        estimated=estimated, cached=cached, cost=cost,
+        ttft=stream.ttft if stream else None,
+        tokens_per_sec=stream.tokens_per_sec if stream else None,
+        stopped_early=stream.stopped_early if stream else False
+    ))
+
+def chat_with_llm(
+    prompt: str,
+    system: str = "",
+    provider: LLMProvider = "gemini",
+    model: str = "gemini-2.5-flash",
+    options: Optional[Dict] = None,
+    agent: Optional[str] = None,
+    stop=None
+) -> str:
+    """
+    Direct chat function with specified provider, served from the response cache when enabled.
+    Every call is recorded for token accounting, tagged with the calling agent, and traced as an "llm" span.
+    
+    The response is streamed when a stop rule (see utils/streaming.py) or a stream writer applies to the
+    call: generation is cancelled as soon as stop fires, and time-to-first-token and tokens/sec are recorded.
+    """
+    with span(f"llm.{agent or 'call'}", kind="llm", provider=provider, model=model, agent=agent) as call_span:
+        cache = _get_cache()
+        key = None
+        if cache is not None:
+            # The stop rule shapes the response, so it is part of the key; cancellation does not change
+            # what a finished reply looks like, so a cancellable call shares the key of the rule it wraps
+            key_stop = getattr(stop, "inner", stop)
+            key_options = {**(options or {}), "_stop": repr(key_stop)} if key_stop is not None else options
+            key = ResponseCache.make_key(provider, model, system, prompt, key_options)
+            cached = cache.get(key)
+            if cached is not None:
+                record = _record_call(agent, provider, model, system, prompt, cached, cached=True)
+                _annotate_call(call_span, record, cached)
+                return cached
+            if _cache_mode == "cache_only":
+                raise CacheMissError(f"No cached response for {provider}/{model} prompt {key[:12]}")
+        
+        if options:
+            # Keys starting with "_" only distinguish cache entries (see sampling_options); providers never see them
+            options = {k: v for k, v in options.items() if not k.startswith("_")} or None
+        client = get_llm_client(provider, model)
+        take_provider_usage()  # Drop anything a previous call on this thread left behind
+        batcher = current_batcher()
+        writer = stream_writer_for(agent)
+        stream_stats = None
+        # Cache hits never get here, so only real provider calls count against a caller's budget
+        budget = current_call_budget()
+        with budget.slot() if budget is not None else nullcontext():
+            if batcher is not None:
+                # Lockstep mode: wait for the rest of the cohort and go out as one batch
+                response = apply_stop(stop, batcher.submit(client, prompt, system, options))
+            elif STREAMING and (stop is not None or writer is not None):
+                response, stream_stats = _stream_call(client, prompt, system, options, stop, agent, writer)
+            else:
+                response = apply_stop(stop, client.chat(prompt, system, options))
+        record = _record_call(agent, provider, model, system, prompt, response, cached=False, stream=stream_stats)
+        _annotate_call(call_span, record, response)
+        
+        # Never cache provider failures or abandoned replies
+        if cache is not None and not response.startswith("ERROR:") and not getattr(stop, "cancelled", False):
+            cache.put(key, response)
+        return response
+
+def _stream_call(client: LLMClient, prompt: str, system: str, options: Optional[Dict], stop,
+                 agent: Optional[str], writer) -> Tuple[str, StreamStats]:
+    if writer is None:
+        return consume_stream(client.chat_stream(prompt, system, options), stop)
+    writer.start(agent)
+    try:
+        return consume_stream(client.chat_stream(prompt, system, options), stop,
+                              on_chunk=lambda chunk: writer.write(agent, chunk))
+    finally:
+        writer.end(agent)
+
+def _annotate_call(call_span, record: UsageRecord, response: str) -> None:
+    if call_span is None:
+        return
+    call_span.set(
+        cached=record.cached,
+        prompt_tokens=record.prompt_tokens,
+        output_tokens=record.output_tokens,
+        estimated_tokens=record.estimated
+    )
+    if record.ttft is not None:
+        call_span.set(ttft=round(record.ttft, 4), stopped_early=record.stopped_early)
+        if record.tokens_per_sec is not None:
+            call_span.set(tokens_per_sec=round(record.tokens_per_sec, 1))
+    if response.startswith("ERROR:"):
+        call_span.status = "error"
+        call_span.error = response[:300]
+
+def json_mode_options(provider: LLMProvider, schema: Optional[Dict] = None) -> Dict:
+    """Provider-native options that constrain the response to JSON (and to a schema where supported)"""
+    if provider == "gemini":
+        options = {"response_mime_type": "application/json"}
+        if schema is not None:
+            options["response_schema"] = schema
+        return options
+    if provider in ("ollama", "ollama_http"):
+        return {"format": "json"}
+    if provider == "router":
+        # Translated per backend by the router
+        return {"json": schema if schema is not None else True}
+    return {}
+
+def sampling_options(provider: LLMProvider, seed: int) -> Dict:
+    """
+    Options for one of several deliberately different samples of the same prompt.
+    Ollama takes the seed natively; elsewhere the seed only keeps each sample's cache entry separate.
+    """
+    if provider in ("ollama", "ollama_http"):
+        return {"seed": seed, "temperature": 0.8}
+    return {"temperature": 1.0, "_seed": seed}
+
+def chat_json(
+    prompt: str,
+    system: str = "",
+    provider: LLMProvider = "gemini",
+    model: str = "gemini-2.5-flash",
+    agent: Optional[str] = None,
+    schema: Optional[Dict] = None,
+    required: Sequence[str] = (),
+    options: Optional[Dict] = None,
+    reask: bool = True
+) -> Dict:
+    """
+    Chat in the provider's JSON mode and return the parsed object.
+    Fenced, wrapped or truncated JSON is repaired locally; only when that fails (or required fields
+    are missing) is the model asked once more, for the JSON alone.
+    
+    Raises:
+        StructuredOutputError: No usable object after the re-ask; .response holds the last raw reply
+    """
+    options = {**json_mode_options(provider, schema), **(options or {})}
+    stop = StopWhenJsonComplete()
+    response = chat_with_llm(prompt, system=system, provider=provider, model=model, options=options,
+                             agent=agent, stop=stop)
+    if response.startswith("ERROR:"):
+        # Provider failures are retried by the provider client, not re-asked here
+        count_json_outcome("failed")
+        raise StructuredOutputError(response, response)
+    
+    result = extract_json(response)
+    if not missing_fields(result, required):
+        direct = response.strip().startswith("{") and response.strip().endswith("}")
+        count_json_outcome("direct" if direct else "repaired")
+        return result
+    
+    if reask:
+        count_json_outcome("reasked")
+        annotate_span(json_reask=True)
+        follow_up = chat_with_llm(
+            reask_prompt(response, required), system=system, provider=provider, model=model,
+            options=options, agent=agent, stop=stop
+        )
+        result = extract_json(follow_up)
+        if not missing_fields(result, required):
+            return result
+        response = follow_up
+    
+    count_json_outcome("failed")
+    raise StructuredOutputError(f"Missing required fields: {missing_fields(result, required)}", response)
 
 # Example usage
 if __name__ == "__main__":
@@ -1,279 +1,781 @@
 # main.py with LLM provider selection
 
-import pandas as pd
+import argparse
+import operator
+import threading
+import os
 import random
-import json
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, Optional, List
+from collections import ChainMap
+from typing import Annotated, TypedDict, Optional, List, Callable, Tuple
 
 from agents.student import student_agent
 from agents.teacher import teacher_agent  
 from agents.dean import dean_agent
+from agents.teacher_dean import teacher_dean_agent
+from agents.prejudge import PreJudge
+from agents.conversation_context import (
+    ConversationContext, HistoryEntry, Turn, new_context, append_turn, context_from_history, history_as_dicts
+)
 from agents.cognitive_state import generate_cognitive_state
+from agents.first_turns import DEFAULT_FIRST_TURNS_PATH, FirstTurnStore
 from config.personas import persona_traits
-from config.llm_config import LLMProvider
-
-# Load questions
-df = pd.read_csv("data/data_science_interview_questions.csv")
+from config.llm_config import LLMProvider, PROVIDER_QUOTAS, close_all_clients, get_cache_stats, get_llm_client
+from utils.scheduler import DialogueScheduler
+from utils.lockstep import LockstepBatcher
+from utils.run_manifest import RunManifest, open_checkpointer, thread_config
+from utils.result_sink import open_result_sink
+from utils.sharding import parse_shard, in_shard, shard_suffix
+from utils.question_source import QuestionSource, canonical_question_id
+from utils.token_usage import adopt_usage, usage_scope, merge_usage
+from utils.tracing import configure_tracing, span, annotate_span
+from utils.rate_limiter import get_rate_limiter_stats
+from utils.response_cache import CacheMissError
+from utils.speculation import SpeculativeCall, get_speculation_stats
+from utils.assessment_queue import ASSESSMENT_QUEUE_FILE, AssessmentQueue, AssessmentWorkerPool
+from utils.streaming import ConsoleStreamWriter, configure_stream_output, get_stream_totals
 
-# Configuration - Change these to switch providers
-LLM_PROVIDER: LLMProvider = "gemini"  # or "ollama"
+# Configuration defaults - override per run with the command-line flags (python main.py --help)
+LLM_PROVIDER: LLMProvider = "gemini"  # or "ollama" / "ollama_http"
 LLM_MODEL = "gemini-2.0-flash"  # Free Gemini model
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "jsonl")  # "jsonl", "jsonl.gz" or "parquet"
+# One combined teacher/dean call per iteration instead of two
+FUSED_TEACHER_DEAN = os.getenv("FUSED_TEACHER_DEAN", "0") == "1"
+# Settle clear-cut dean decisions locally and only call the LLM dean when ambiguous
+DEAN_PREJUDGE = os.getenv("DEAN_PREJUDGE", "0") == "1"
+PREJUDGE_REFERENCES = ".cache/reference_answers.json"
+# Advance a cohort of dialogues in lockstep and send each step's LLM calls to the provider together
+LOCKSTEP_BATCHING = os.getenv("LOCKSTEP_BATCHING", "0") == "1"
+LOCKSTEP_COHORT = int(os.getenv("LOCKSTEP_COHORT", "16"))
+# Span export for `python trace_report.py`: "jsonl", "otlp" (OTLP/JSON lines) or "off"
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "jsonl")
+# Start the next student turn while the dean decides; discarded if the dialogue ends
+SPECULATIVE_STUDENT = os.getenv("SPECULATIVE_STUDENT", "0") == "1"
+# Run the cognitive assessment off the dialogue's critical path, from a durable queue in the run directory
+DEFER_ASSESSMENT = os.getenv("DEFER_ASSESSMENT", "0") == "1"
+ASSESSMENT_WORKERS = int(os.getenv("ASSESSMENT_WORKERS", "2"))  # 0: only queue, drain later with assessment_worker.py
+# Start dialogues from opening student turns precomputed by precompute_first_turns.py, where available
+FIRST_TURNS = os.getenv("FIRST_TURNS", "0") == "1"
+# Print student and teacher replies to the console token by token as they are generated
+STREAM_TURNS = os.getenv("STREAM_TURNS", "0") == "1"
 
-# Define shared LangGraph state
+# Define shared LangGraph state. Nodes return only the fields they change; LangGraph merges them in,
+# appending to conversation_history through its reducer instead of copying the history every turn
 class TeachingState(TypedDict):
     question: str
+    question_id: Optional[str]  # The bank's (Qnnn) ID; not unique, dialogues are keyed by dialogue_id
+    canonical_id: str  # Shared by every row of the bank asking the same question
     category: str
     difficulty: str
     persona: str
     llm_provider: str
     llm_model: str
-    conversation_history: List[dict]
+    conversation_history: Annotated[List[HistoryEntry], operator.add]
+    context: Optional[ConversationContext]
     current_student_reply: Optional[str]
     current_teacher_reply: Optional[str]
+    speculative_student_reply: Optional[str]  # Next student turn, generated while the dean was deciding
+    first_student_reply: Optional[str]  # Precomputed opening turn for this question and persona
     dean_verdict: Optional[str]
     understanding_level: Optional[str]
     iteration_count: int
     max_iterations: int
     final_assessment: Optional[dict]
     cognitive_state: Optional[dict]
+    token_usage: Optional[dict]
 
-# LangGraph Node Wrappers
-def student_node(state: TeachingState) -> TeachingState:
-    print(f"=== Student Iteration {state['iteration_count']} ===")
-    
+def conversation_context(state: TeachingState) -> ConversationContext:
+    """Incremental conversation views, rebuilt only for states checkpointed before they existed"""
+    return state.get("context") or context_from_history(state.get("conversation_history"))
+
+def student_reply(state: TeachingState, cancel: Optional[threading.Event] = None) -> str:
+    """The student's next turn, answering the teacher's last message if there is one"""
     context = state.get("conversation_history", [])
     last_teacher_response = context[-1]["content"] if context and context[-1]["role"] == "teacher" else None
     
+    if last_teacher_response:
+        return student_agent(
+            question=state["question"], 
+            persona=state["persona"], 
+            teacher_guidance=last_teacher_response,
+            context=conversation_context(state),
+            provider=state["llm_provider"],
+            model=state["llm_model"],
+            cancel=cancel
+        )
+    return student_agent(
+        question=state["question"], 
+        persona=state["persona"], 
+        provider=state["llm_provider"],
+        model=state["llm_model"],
+        cancel=cancel
+    )
+
+# LangGraph Node Wrappers
+def student_node(state: TeachingState) -> dict:
+    print(f"=== Student Iteration {state['iteration_count']} ===")
+    
     try:
-        if last_teacher_response:
-            response = student_agent(
-                question=state["question"], 
-                persona=state["persona"], 
-                teacher_guidance=last_teacher_response,
-                conversation_history=context,
-                provider=state["llm_provider"],
-                model=state["llm_model"]
-            )
+        response = state.get("speculative_student_reply")
+        if response is not None:
+            print("⚡ Using the student turn generated while the dean was deciding")
+        elif not state.get("conversation_history") and state.get("first_student_reply"):
+            response = state["first_student_reply"]
+            print("📦 Using the precomputed opening turn")
         else:
-            response = student_agent(
-                question=state["question"], 
-                persona=state["persona"], 
-                provider=state["llm_provider"],
-                model=state["llm_model"]
-            )
-        
-        new_history = context + [{"role": "student", "content": response, "iteration": state["iteration_count"]}]
+            response = student_reply(state)
         
         return {
-            **state, 
             "current_student_reply": response,
-            "conversation_history": new_history
+            "speculative_student_reply": None,
+            "conversation_history": [Turn("student", response, state["iteration_count"])],
+            "context": append_turn(conversation_context(state), "student", response, state["iteration_count"])
         }
+    except CacheMissError:
+        # A cache_only run fails the dialogue here instead of carrying ERROR text through every node
+        raise
     except Exception as e:
         print(f"Error in student_node: {e}")
-        return {**state, "current_student_reply": f"Error: {str(e)}"}
+        return {"current_student_reply": f"Error: {str(e)}", "speculative_student_reply": None}
 
-def teacher_node(state: TeachingState) -> TeachingState:
+def teacher_node(state: TeachingState) -> dict:
     print(f"=== Teacher Iteration {state['iteration_count']} ===")
     
     try:
         response = teacher_agent(
             question=state["question"],
             student_reply=state["current_student_reply"],
-            conversation_history=state.get("conversation_history", []),
+            context=conversation_context(state),
             iteration=state["iteration_count"],
             provider=state["llm_provider"],
             model=state["llm_model"]
         )
         
-        new_history = state["conversation_history"] + [{"role": "teacher", "content": response, "iteration": state["iteration_count"]}]
-        
         return {
-            **state, 
             "current_teacher_reply": response,
-            "conversation_history": new_history
+            "conversation_history": [Turn("teacher", response, state["iteration_count"])],
+            "context": append_turn(conversation_context(state), "teacher", response, state["iteration_count"])
         }
+    except CacheMissError:
+        raise
     except Exception as e:
         print(f"Error in teacher_node: {e}")
-        return {**state, "current_teacher_reply": f"Error: {str(e)}"}
+        return {"current_teacher_reply": f"Error: {str(e)}"}
 
-def dean_node(state: TeachingState) -> TeachingState:
+def dean_node(state: TeachingState, prejudge: Optional[PreJudge] = None) -> dict:
     print(f"=== Dean Assessment Iteration {state['iteration_count']} ===")
     
     try:
-        result = dean_agent(
+        context = conversation_context(state)
+        local_result = None
+        if prejudge is not None:
+            local_result = prejudge.judge(
+                question=state["question"],
+                context=context,
+                current_iteration=state["iteration_count"],
+                max_iterations=state["max_iterations"]
+            )
+        
+        if local_result is not None and not prejudge.should_audit():
+            print(f"⚡ {local_result['reasoning']}")
+            result = local_result
+        else:
+            result = dean_agent(
+                question=state["question"],
+                conversation_history=state["conversation_history"],
+                context=context,
+                current_iteration=state["iteration_count"],
+                max_iterations=state["max_iterations"],
+                provider=state["llm_provider"],
+                model=state["llm_model"]
+            )
+            if prejudge is not None:
+                prejudge.observe(state["question"], context, result, local_result)
+        
+        return {
+            "dean_verdict": result["verdict"],
+            "understanding_level": result["understanding_level"],
+            "iteration_count": state["iteration_count"] + 1
+        }
+    except CacheMissError:
+        raise
+    except Exception as e:
+        print(f"Error in dean_node: {e}")
+        return {
+            "dean_verdict": "continue",
+            "understanding_level": "unknown",
+            "iteration_count": state["iteration_count"] + 1
+        }
+
+def speculative_dean_node(state: TeachingState, prejudge: Optional[PreJudge] = None) -> dict:
+    """
+    dean_node, with the next student turn generated at the same time.
+    The student prompt only depends on the teacher reply the dean is reviewing, so if the dialogue
+    continues the turn is already there; otherwise it is cancelled and counted as waste.
+    """
+    speculation = SpeculativeCall(
+        lambda cancel: student_reply(state, cancel),
+        iteration=state["iteration_count"] + 1,
+        persona=state.get("persona"),
+        question=state.get("question")
+    )
+    result = dean_node(state, prejudge)
+    if route_dialogue(ChainMap(result, state))[0] != "student":
+        speculation.discard()
+        annotate_span(speculation="discarded")
+        return result
+    
+    try:
+        reply = speculation.commit()
+    except CacheMissError:
+        raise
+    except Exception as e:
+        # The student node will make the call itself
+        print(f"Speculative student turn failed: {e}")
+        annotate_span(speculation="failed")
+        return result
+    adopt_usage(speculation.records)
+    annotate_span(speculation="committed")
+    return {**result, "speculative_student_reply": reply}
+
+def teacher_dean_node(state: TeachingState) -> dict:
+    print(f"=== Teacher + Dean Iteration {state['iteration_count']} ===")
+    
+    try:
+        result = teacher_dean_agent(
             question=state["question"],
-            conversation_history=state["conversation_history"],
+            student_reply=state["current_student_reply"],
+            context=conversation_context(state),
             current_iteration=state["iteration_count"],
             max_iterations=state["max_iterations"],
             provider=state["llm_provider"],
             model=state["llm_model"]
         )
         
+        response = result["teacher_reply"]
         return {
-            **state,
+            "current_teacher_reply": response,
+            "conversation_history": [Turn("teacher", response, state["iteration_count"])],
+            "context": append_turn(conversation_context(state), "teacher", response, state["iteration_count"]),
             "dean_verdict": result["verdict"],
             "understanding_level": result["understanding_level"],
             "iteration_count": state["iteration_count"] + 1
         }
+    except CacheMissError:
+        raise
     except Exception as e:
-        print(f"Error in dean_node: {e}")
+        print(f"Error in teacher_dean_node: {e}")
         return {
-            **state,
+            "current_teacher_reply": f"Error: {str(e)}",
             "dean_verdict": "continue",
             "understanding_level": "unknown",
             "iteration_count": state["iteration_count"] + 1
         }
 
-def cognitive_node(state: TeachingState) -> TeachingState:
+def build_final_assessment(state: TeachingState) -> dict:
+    return {
+        "total_iterations": state["iteration_count"] - 1,
+        "final_understanding_level": state["understanding_level"],
+        "conversation_length": len(state["conversation_history"]),
+        "llm_provider": state["llm_provider"],
+        "llm_model": state["llm_model"],
+        "learning_progression": analyze_learning_progression(state["conversation_history"])
+    }
+
+def cognitive_node(state: TeachingState) -> dict:
     print(f"=== Final Cognitive Assessment ===")
     
     try:
         cognitive_state = generate_cognitive_state(
             persona=state["persona"],
-            conversation_history=state["conversation_history"],
+            context=conversation_context(state),
             final_understanding=state["understanding_level"],
             provider=state["llm_provider"],
             model=state["llm_model"]
         )
         
-        final_assessment = {
-            "total_iterations": state["iteration_count"] - 1,
-            "final_understanding_level": state["understanding_level"],
-            "conversation_length": len(state["conversation_history"]),
-            "llm_provider": state["llm_provider"],
-            "llm_model": state["llm_model"],
-            "learning_progression": analyze_learning_progression(state["conversation_history"])
-        }
-        
         return {
-            **state, 
             "cognitive_state": cognitive_state,
-            "final_assessment": final_assessment
+            "final_assessment": build_final_assessment(state)
         }
+    except CacheMissError:
+        raise
     except Exception as e:
         print(f"Error in cognitive_node: {e}")
-        return {**state, "cognitive_state": {"error": str(e)}}
+        return {"cognitive_state": {"error": str(e)}}
 
-def analyze_learning_progression(history: List[dict]) -> List[str]:
+def finalize_node(state: TeachingState) -> dict:
+    """Ends the dialogue without the cognitive assessment, which the assessment queue fills in later"""
+    print("=== Dialogue Finished (cognitive assessment deferred) ===")
+    return {
+        "cognitive_state": None,
+        "final_assessment": {**build_final_assessment(state), "cognitive_assessment": "deferred"}
+    }
+
+def assessment_payload(state: TeachingState) -> dict:
+    """Everything the deferred cognitive assessment needs from a finished dialogue"""
+    return {
+        "question": state["question"],
+        "persona": state["persona"],
+        "conversation_history": history_as_dicts(state["conversation_history"]),
+        "understanding_level": state["understanding_level"],
+        "llm_provider": state["llm_provider"],
+        "llm_model": state["llm_model"]
+    }
+
+def run_assessment(payload: dict, provider: Optional[str] = None, model: Optional[str] = None) -> dict:
+    """
+    The cognitive assessment for a queued dialogue, on the dialogue's own provider/model unless
+    another (e.g. cheaper) one is given. The result is what merge_results.py joins back to the record.
+
+    Raises:
+        RuntimeError: The assessment came back as the fallback state, so the queue retries the job
+    """
+    provider = provider or payload["llm_provider"]
+    model = model or payload["llm_model"]
+    with usage_scope(persona=payload["persona"], question=payload["question"]) as scope:
+        cognitive_state = generate_cognitive_state(
+            persona=payload["persona"],
+            context=context_from_history(payload["conversation_history"]),
+            final_understanding=payload["understanding_level"],
+            provider=provider,
+            model=model
+        )
+    if "error" in cognitive_state:
+        raise RuntimeError(f"Cognitive assessment failed: {cognitive_state['error']}")
+    return {
+        "cognitive_state": cognitive_state,
+        "assessed_by": {"llm_provider": provider, "llm_model": model},
+        "token_usage": merge_usage(None, scope.records)
+    }
+
+def analyze_learning_progression(history: List[HistoryEntry]) -> List[str]:
     """Analyze how understanding progressed through the conversation"""
     student_responses = [entry for entry in history if entry["role"] == "student"]
     return [f"Iteration {r['iteration']}: {r['content'][:100]}..." for r in student_responses]
 
-def should_continue_dialogue(state: TeachingState) -> str:
+def route_dialogue(state: TeachingState) -> Tuple[str, str]:
     """
-    Determine whether to continue the Socratic dialogue or end.
-    Now with stricter stopping criteria.
+    Decide whether to continue the Socratic dialogue or end, without side effects.
+    Returns the next node and the reason. Now with stricter stopping criteria.
     """
-    
     verdict = state.get("dean_verdict", "continue")
     understanding_level = state.get("understanding_level", "poor")
     iteration_count = state.get("iteration_count", 1)
     max_iterations = state.get("max_iterations", 5)
     
-    print(f"🎯 Dean verdict: {verdict}")
-    print(f"📊 Understanding: {understanding_level}")
-    print(f"🔄 Iteration: {iteration_count}/{max_iterations}")
-    
     # Clear stopping conditions (in order of priority)
     
     # 1. Student has satisfactory understanding - STOP
     if verdict == "satisfactory":
-        print("✅ Student has reached satisfactory understanding - ENDING")
-        return "cognitive"
+        return "cognitive", "✅ Student has reached satisfactory understanding - ENDING"
     
     # 2. Student shows good/excellent understanding - STOP  
     elif understanding_level in ["good", "excellent"] and iteration_count >= 2:
-        print("🎓 Student demonstrates good understanding - ENDING")
-        return "cognitive"
+        return "cognitive", "🎓 Student demonstrates good understanding - ENDING"
     
     # 3. Maximum iterations reached - STOP
     elif iteration_count >= max_iterations:
-        print("⏰ Maximum iterations reached - ENDING")
-        return "cognitive"
+        return "cognitive", "⏰ Maximum iterations reached - ENDING"
         
     # 4. Safety check: If we've gone 4+ rounds and understanding is developing+ - STOP
     elif iteration_count >= 4 and understanding_level in ["developing", "good", "excellent"]:
-        print("🛡️ Safety stop: 4+ rounds with developing+ understanding - ENDING")
-        return "cognitive"
+        return "cognitive", "🛡️ Safety stop: 4+ rounds with developing+ understanding - ENDING"
     
     # 5. Continue only if student truly needs more help
     elif verdict == "continue" and understanding_level in ["poor", "developing"]:
-        print("🔄 Student needs more guidance - CONTINUING")
-        return "student"
+        return "student", "🔄 Student needs more guidance - CONTINUING"
     
     # 6. Default fallback - end dialogue
     else:
-        print("🎯 Default stop condition reached - ENDING")
-        return "cognitive"
+        return "cognitive", "🎯 Default stop condition reached - ENDING"
+
+def should_continue_dialogue(state: TeachingState) -> str:
+    """Conditional edge after the dean: route_dialogue, with the decision printed"""
+    print(f"🎯 Dean verdict: {state.get('dean_verdict', 'continue')}")
+    print(f"📊 Understanding: {state.get('understanding_level', 'poor')}")
+    print(f"🔄 Iteration: {state.get('iteration_count', 1)}/{state.get('max_iterations', 5)}")
+    next_node, reason = route_dialogue(state)
+    print(reason)
+    return next_node
+
+def track_token_usage(node_fn: Callable) -> Callable:
+    """Tag the LLM calls a node makes with iteration/persona/question and fold their usage into the state"""
+    def node(state: TeachingState) -> dict:
+        with usage_scope(
+            iteration=state.get("iteration_count"),
+            persona=state.get("persona"),
+            question=state.get("question")
+        ) as scope:
+            result = node_fn(state)
+        
+        annotate_span(
+            llm_calls=len(scope.records),
+            prompt_tokens=sum(r.prompt_tokens for r in scope.records),
+            output_tokens=sum(r.output_tokens for r in scope.records)
+        )
+        # result is the node's own partial update, so it can be filled in place
+        if scope.records:
+            result["token_usage"] = merge_usage(state.get("token_usage"), scope.records)
+        if result.get("final_assessment") is not None:
+            result["final_assessment"]["token_usage"] = result.get("token_usage", state.get("token_usage"))
+        return result
+    return node
+
+def trace_node(name: str, node_fn: Callable) -> Callable:
+    """Record each node execution as a span under the dialogue's trace"""
+    def node(state: TeachingState) -> dict:
+        with span(name, kind="node", iteration=state.get("iteration_count")) as node_span:
+            result = node_fn(state)
+            if node_span is not None and name in ("dean", "teacher_dean"):
+                node_span.set(verdict=result.get("dean_verdict"), understanding_level=result.get("understanding_level"))
+            return result
+    return node
 
 # LangGraph Wiring
-builder = StateGraph(TeachingState)
-builder.add_node("student", student_node)
-builder.add_node("teacher", teacher_node) 
-builder.add_node("dean", dean_node)
-builder.add_node("cognitive", cognitive_node)
-
-builder.set_entry_point("student")
-builder.add_edge("student", "teacher")
-builder.add_edge("teacher", "dean")
-builder.add_conditional_edges(
-    "dean",
-    should_continue_dialogue,
-    {
-        "student": "student",
-        "cognitive": "cognitive"
-    }
-)
-builder.add_edge("cognitive", END)
+def build_graph(
+    node_wrapper: Optional[Callable[[str, Callable], Callable]] = None,
+    checkpointer=None,
+    fused: bool = FUSED_TEACHER_DEAN,
+    prejudge: Optional[PreJudge] = None,
+    speculative: bool = SPECULATIVE_STUDENT,
+    deferred_assessment: bool = DEFER_ASSESSMENT
+):
+    """
+    Compile the Socratic dialogue graph.
+    
+    Args:
+        node_wrapper: Optional (name, node_fn) -> node_fn hook, e.g. for timing each node
+        checkpointer: Optional LangGraph checkpointer that saves the state after every node
+        fused: Replace the teacher and dean nodes with one combined teacher_dean node
+        prejudge: Optional local pre-judge consulted before the LLM dean (separate mode only)
+        speculative: Generate the next student turn while the dean decides (separate mode only)
+        deferred_assessment: End with finalize_node instead of cognitive_node; the caller queues the assessment
+    """
+    from langgraph.graph import StateGraph, END
+    
+    outer = node_wrapper or (lambda name, fn: fn)
+    wrap = lambda name, fn: outer(name, trace_node(name, track_token_usage(fn)))
+    builder = StateGraph(TeachingState)
+    builder.add_node("student", wrap("student", student_node))
+    if deferred_assessment:
+        builder.add_node("finalize", wrap("finalize", finalize_node))
+        end_node = "finalize"
+    else:
+        builder.add_node("cognitive", wrap("cognitive", cognitive_node))
+        end_node = "cognitive"
+    
+    if fused:
+        builder.add_node("teacher_dean", wrap("teacher_dean", teacher_dean_node))
+        builder.add_edge("student", "teacher_dean")
+        verdict_node = "teacher_dean"
+    else:
+        builder.add_node("teacher", wrap("teacher", teacher_node)) 
+        dean = speculative_dean_node if speculative else dean_node
+        builder.add_node("dean", wrap("dean", lambda state: dean(state, prejudge)))
+        builder.add_edge("student", "teacher")
+        builder.add_edge("teacher", "dean")
+        verdict_node = "dean"
 
-graph = builder.compile()
+    builder.set_entry_point("student")
+    builder.add_conditional_edges(
+        verdict_node,
+        should_continue_dialogue,
+        {
+            "student": "student",
+            "cognitive": end_node
+        }
+    )
+    builder.add_edge(end_node, END)
 
-# Run Socratic dialogues
-print(f"🤖 Using {LLM_PROVIDER.upper()} with model: {LLM_MODEL}")
-print("=" * 50)
-import time
-results = []
-for idx, row in df.iterrows():
-    if idx == 50:
-        break
-    persona = random.choice(list(persona_traits.keys()))
-    initial_state: TeachingState = {
+    return builder.compile(checkpointer=checkpointer)
+
+def build_initial_state(row, persona: str, provider: str = LLM_PROVIDER, model: str = LLM_MODEL) -> TeachingState:
+    """Create the starting state for one question row"""
+    return {
         "question": row["question"],
+        "question_id": row.get("question_id"),
+        "canonical_id": canonical_question_id(row["question"]),
         "category": row["category"], 
         "difficulty": row["difficulty"],
         "persona": persona,
-        "llm_provider": LLM_PROVIDER,
-        "llm_model": LLM_MODEL,
+        "llm_provider": provider,
+        "llm_model": model,
         "conversation_history": [],
+        "context": new_context(),
         "current_student_reply": None,
         "current_teacher_reply": None,
+        "speculative_student_reply": None,
+        "first_student_reply": None,
         "dean_verdict": None,
         "understanding_level": None,
         "iteration_count": 1,
         "max_iterations": 5,  # Reasonable limit for free API
         "final_assessment": None,
-        "cognitive_state": None
+        "cognitive_state": None,
+        "token_usage": None
     }
-    
-    print(f"\n🎓 Starting Socratic Dialogue Q{idx+1}: {row['question']}")
-    print(f"👤 Student Persona: {persona}")
-    
+
+_graph = None
+
+def __getattr__(name: str):
+    # `main.graph` is compiled on first access rather than at import
+    global _graph
+    if name == "graph":
+        if _graph is None:
+            _graph = build_graph()
+        return _graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+DEFAULT_MODELS = {
+    "gemini": "gemini-2.0-flash", "ollama": "llama3", "ollama_http": "llama3", "fake": "fake", "router": "gemini-ollama"
+}
+QUESTIONS_PATH = "data/data_science_interview_questions.csv"
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run Socratic dialogues over the question bank")
+    parser.add_argument("--provider", choices=list(PROVIDER_QUOTAS), default=LLM_PROVIDER)
+    parser.add_argument("--model", help="Model name (default depends on the provider)")
+    parser.add_argument("--questions-file", default=QUESTIONS_PATH, help="Question bank (CSV or JSONL)")
+    parser.add_argument("--start", type=int, default=0, help="First row of the question bank to consider")
+    parser.add_argument("--limit", type=int, help="Number of rows to consider from --start (default: all)")
+    parser.add_argument("--question-ids", help="Comma-separated question IDs to run (every row carrying them), e.g. Q954,Q405")
+    parser.add_argument("--category", help="Only questions in this category")
+    parser.add_argument("--difficulty", help="Only questions of this difficulty")
+    parser.add_argument("--sample", type=int, help="Run a seeded random sample of this many matching questions")
+    parser.add_argument("--per-stratum", type=int, help="Run this many questions from each category/difficulty pair")
+    parser.add_argument("--seed", type=int, help="Seed for --sample/--per-stratum")
+    parser.add_argument("--shard", default="0/1", help="Run only shard i of N (0-based), partitioned by dialogue ID")
+    parser.add_argument("--run-id", help="Run ID for the manifest and checkpoints; reusing one resumes that run (default: provider-model[.shard])")
+    parser.add_argument("--output", help="Output path without extension (default: outputs/socratic_results_<provider>[.shard])")
+    parser.add_argument("--format", choices=["jsonl", "jsonl.gz", "parquet"], default=OUTPUT_FORMAT)
+    parser.add_argument("--concurrency", type=int, help="Dialogues in flight (default: provider quota)")
+    parser.add_argument("--max-iterations", type=int, default=5)
+    parser.add_argument("--fused", action="store_true", default=FUSED_TEACHER_DEAN, help="Combined teacher/dean node")
+    parser.add_argument("--prejudge", action="store_true", default=DEAN_PREJUDGE, help="Local dean pre-judge")
+    parser.add_argument("--lockstep", action="store_true", default=LOCKSTEP_BATCHING, help="Lockstep cohort batching")
+    parser.add_argument("--cohort", type=int, default=LOCKSTEP_COHORT, help="Cohort size with --lockstep")
+    parser.add_argument("--trace-format", choices=["jsonl", "otlp", "off"], default=TRACE_FORMAT)
+    parser.add_argument("--speculative", action="store_true", default=SPECULATIVE_STUDENT,
+                        help="Generate the next student turn while the dean decides")
+    parser.add_argument("--defer-assessment", action="store_true", default=DEFER_ASSESSMENT,
+                        help="Queue the cognitive assessment instead of running it at the end of each dialogue")
+    parser.add_argument("--assessment-workers", type=int, default=ASSESSMENT_WORKERS,
+                        help="Threads draining the assessment queue during the run (0: leave it for assessment_worker.py)")
+    parser.add_argument("--assessment-provider", choices=list(PROVIDER_QUOTAS),
+                        help="Provider for deferred assessments (default: the dialogue's)")
+    parser.add_argument("--assessment-model",
+                        help="Model for deferred assessments, e.g. a cheaper one (default: the dialogue's, or the --assessment-provider default)")
+    parser.add_argument("--assessment-rpm", type=float, help="Requests/min budget for deferred assessments")
+    parser.add_argument("--first-turns", action="store_true", default=FIRST_TURNS,
+                        help="Start from precomputed opening student turns (see precompute_first_turns.py)")
+    parser.add_argument("--stream", action="store_true", default=STREAM_TURNS,
+                        help="Print student/teacher replies as they are generated (runs one dialogue at a time)")
+    args = parser.parse_args(argv)
+
+    args.model = args.model or DEFAULT_MODELS[args.provider]
+    if args.assessment_provider:
+        args.assessment_model = args.assessment_model or DEFAULT_MODELS[args.assessment_provider]
     try:
-        final_state = graph.invoke(initial_state)
-        results.append(final_state)
-        # Save results with provider info
-        output_file = f"outputs/socratic_results_{LLM_PROVIDER}.jsonl"
-        with open(output_file, "a") as f:
-            f.write(json.dumps(final_state, default=str) + "\n")
-
-        print(f"✅ Completed Q{idx+1} after {final_state['final_assessment']['total_iterations']} iterations")
+        args.shard_index, args.shard_count = parse_shard(args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+    suffix = shard_suffix(args.shard_index, args.shard_count)
+    args.run_id = args.run_id or os.getenv("RUN_ID", f"{args.provider}-{args.model}") + suffix
+    args.output = args.output or f"outputs/socratic_results_{args.provider}{suffix}"
+    return args
+
+def select_questions(source: QuestionSource, args: argparse.Namespace):
+    """Yield (dialogue_id, row) for the rows this invocation is responsible for"""
+    if args.per_stratum:
+        selected = source.stratified_sample(args.per_stratum, seed=args.seed)
+    elif args.sample:
+        selected = source.sample(args.sample, seed=args.seed, category=args.category, difficulty=args.difficulty)
+    else:
+        question_ids = [q.strip() for q in args.question_ids.split(",")] if args.question_ids else None
+        selected = source.select(
+            category=args.category, difficulty=args.difficulty, question_ids=question_ids,
+            start=args.start, limit=args.limit
+        )
+    for dialogue_id, row in selected:
+        if in_shard(dialogue_id, args.shard_index, args.shard_count):
+            yield dialogue_id, row
+
+def run(args: argparse.Namespace):
+    """Run the selected dialogues and write them to this invocation's output file"""
+    source = QuestionSource(args.questions_file)
+    quota = PROVIDER_QUOTAS[args.provider]
+    # Streamed replies from concurrent dialogues would interleave on the console
+    max_concurrency = args.concurrency or (1 if args.stream else quota["max_concurrency"])
+    manifest = RunManifest(args.run_id)
+    checkpointer = open_checkpointer(manifest.checkpoint_path)
+    prejudge = None
+    if args.prejudge:
+        prejudge = PreJudge()
+        prejudge.load_references(PREJUDGE_REFERENCES)
+    if args.speculative and args.stream:
+        # A speculative turn would be printed before the dean's verdict, and printed again if discarded
+        print("⚠️ --speculative is ignored with --stream")
+        args.speculative = False
+    run_graph = build_graph(checkpointer=checkpointer, fused=args.fused, prejudge=prejudge,
+                            speculative=args.speculative, deferred_assessment=args.defer_assessment)
+    assessments = None
+    assessment_pool = None
+    if args.defer_assessment:
+        assessments = AssessmentQueue(os.path.join(manifest.run_dir, ASSESSMENT_QUEUE_FILE))
+        if args.assessment_workers > 0:
+            assessment_pool = AssessmentWorkerPool(
+                assessments,
+                lambda payload: run_assessment(payload, args.assessment_provider, args.assessment_model),
+                max_workers=args.assessment_workers,
+                requests_per_minute=args.assessment_rpm
+            ).start()
+    if args.trace_format != "off":
+        trace_file = "traces.jsonl" if args.trace_format == "jsonl" else f"traces.{args.trace_format}.jsonl"
+        configure_tracing(os.path.join(manifest.run_dir, trace_file), fmt=args.trace_format)
+    if args.stream:
+        configure_stream_output(ConsoleStreamWriter())
+
+    def mark_durable(dialogue_ids):
+        # Only dialogues whose records are on disk count as completed
+        for dialogue_id in dialogue_ids:
+            manifest.mark_completed(dialogue_id)
+            if checkpointer is not None:
+                checkpointer.delete_thread(thread_config(args.run_id, dialogue_id)["configurable"]["thread_id"])
+
+    sink = open_result_sink(args.output, args.format, run_id=args.run_id, on_flush=mark_durable)
+
+    print(f"🤖 Using {args.provider.upper()} with model: {args.model}")
+    concurrency = f"lockstep cohort of {args.cohort}" if args.lockstep else max_concurrency
+    print(f"⚙️ Concurrency: {concurrency}, quota: {quota['requests_per_minute'] or 'unlimited'} requests/min, "
+          f"{quota['tokens_per_minute'] or 'unlimited'} tokens/min")
+    if args.shard_count > 1:
+        print(f"🧩 Shard {args.shard_index}/{args.shard_count}")
+    print(f"🗂️ Run {args.run_id}: {len(manifest.completed)} dialogues already completed")
+    print("=" * 50)
+
+    first_turns = FirstTurnStore(DEFAULT_FIRST_TURNS_PATH) if args.first_turns else None
+
+    def pending_dialogues():
+        for dialogue_id, row in select_questions(source, args):
+            if manifest.is_completed(dialogue_id):
+                continue
+            persona = random.choice(list(persona_traits.keys()))
+            print(f"\n🎓 Starting Socratic Dialogue {dialogue_id}: {row['question']}")
+            print(f"👤 Student Persona: {persona}")
+            state = build_initial_state(row, persona, provider=args.provider, model=args.model)
+            state["max_iterations"] = args.max_iterations
+            if first_turns is not None:
+                # Seeded per run and row, so the choice of variant is reproducible
+                state["first_student_reply"] = first_turns.pick(
+                    row["question"], persona, args.provider, args.model, seed=f"{args.run_id}:{dialogue_id}"
+                )
+            yield dialogue_id, state
+
+    def run_dialogue(dialogue_id: str, initial_state: TeachingState) -> dict:
+        # One trace per dialogue; node and provider-call spans nest under it
+        with span("dialogue", kind="dialogue", run_id=args.run_id, dialogue_id=dialogue_id,
+                  question_id=initial_state["question_id"], persona=initial_state["persona"]) as dialogue_span:
+            final_state = invoke_dialogue(dialogue_id, initial_state)
+            if not final_state.get("final_assessment"):
+                # e.g. the cognitive node failed; raising keeps the record out of the sink and the manifest
+                error = (final_state.get("cognitive_state") or {}).get("error", "no final assessment")
+                raise RuntimeError(f"Dialogue {dialogue_id} did not finish: {error}")
+            if dialogue_span is not None:
+                dialogue_span.set(
+                    iterations=final_state["final_assessment"]["total_iterations"],
+                    understanding_level=final_state.get("understanding_level")
+                )
+            return final_state
+
+    def invoke_dialogue(dialogue_id: str, initial_state: TeachingState) -> dict:
+        if checkpointer is None:
+            return run_graph.invoke(initial_state)
+        config = thread_config(args.run_id, dialogue_id)
+        snapshot = run_graph.get_state(config)
+        if snapshot.next:
+            # Persona and history come from the checkpoint, not the fresh initial state
+            print(f"⏯️ Resuming {dialogue_id} at node '{snapshot.next[0]}'")
+            return run_graph.invoke(None, config)
+        if snapshot.values.get("final_assessment"):
+            # Finished before the crash but never recorded in the manifest
+            return snapshot.values
+        if snapshot.values:
+            # Ran to the end without a final assessment; start over rather than append to its history
+            checkpointer.delete_thread(config["configurable"]["thread_id"])
+        return run_graph.invoke(initial_state, config)
+
+    def save_result(dialogue_id: str, final_state: dict):
+        if assessments is not None:
+            # Queued durably before the record can reach the manifest, so no assessment is lost
+            payload = assessment_payload(final_state)
+            if assessment_pool is not None:
+                assessment_pool.submit(dialogue_id, payload)
+            else:
+                assessments.put(dialogue_id, payload)
+        # Buffered; the manifest is updated once the sink has flushed this record
+        sink.write(dialogue_id, final_state)
+
+        print(f"✅ Completed {dialogue_id} after {final_state['final_assessment']['total_iterations']} iterations")
         print(f"📊 Final understanding: {final_state['understanding_level']}")
-        
-    except Exception as e:
-        print(f"❌ Error processing Q{idx+1}: {e}")
-        continue
-    time.sleep(60)
-print(f"\n🎉 All Socratic dialogues completed using {LLM_PROVIDER.upper()}!")
-print(f"📁 Results saved to: outputs/socratic_results_{LLM_PROVIDER}.jsonl")
\ No newline at end of file
+
+    def report_error(dialogue_id: str, error: Exception):
+        print(f"❌ Error processing {dialogue_id}: {error}")
+
+    batcher = LockstepBatcher() if args.lockstep else None
+    scheduler = DialogueScheduler(
+        run_dialogue,
+        max_workers=args.cohort if args.lockstep else max_concurrency,
+        on_complete=save_result,
+        on_error=report_error,
+        batcher=batcher
+    )
+    try:
+        with sink:
+            stats = scheduler.run(pending_dialogues())
+        if assessments is not None:
+            if assessment_pool is not None:
+                print(f"🧠 Waiting for {assessments.counts()['pending']} queued cognitive assessments...")
+                assessment_pool.close()
+            counts = assessments.counts()
+            print(f"🧠 Cognitive assessments: {counts['done']} done, {counts['pending']} pending, {counts['failed']} failed")
+            print(f"   Join them to the records with: python merge_results.py {sink.path} "
+                  f"--assessments {assessments.path}")
+        cache_stats = get_cache_stats()
+        if cache_stats:
+            print(f"🗄️ Response cache: {cache_stats.hits} hits, {cache_stats.misses} misses ({cache_stats.hit_rate:.0%})")
+        for (provider, model), limiter_stats in get_rate_limiter_stats().items():
+            if limiter_stats.rate_limited or limiter_stats.throttled_seconds >= 1:
+                print(f"🚦 {provider}/{model}: {limiter_stats.rate_limited} rate-limited, {limiter_stats.retries} retries, "
+                      f"{limiter_stats.throttled_seconds:.0f}s throttled, concurrency limit {limiter_stats.concurrency_limit:.1f}")
+        if args.provider == "router":
+            for health in get_llm_client("router", args.model)._get_backend().health():
+                print(f"🔀 {health.name}: {health.wins} answers, {health.calls} calls ({health.hedges} hedged), "
+                      f"{health.errors} errors, {health.ejections} ejections")
+        stream_totals = get_stream_totals()
+        if stream_totals.calls:
+            print(f"⏱️ Streamed calls: {stream_totals.calls}, mean time to first token {stream_totals.mean_ttft:.2f}s, "
+                  f"{stream_totals.tokens_per_sec:.0f} tokens/sec, {stream_totals.stopped_early} stopped early")
+        if batcher is not None:
+            batch_stats = batcher.stats()
+            print(f"📦 Lockstep batches: {batch_stats.batches}, mean size {batch_stats.mean_batch_size:.1f}")
+        if first_turns is not None:
+            print(f"📦 Precomputed opening turns: {first_turns.hits} used, {first_turns.misses} generated live")
+        if args.speculative and not args.fused:
+            speculation = get_speculation_stats()
+            print(f"🔮 Speculative student turns: {speculation.committed} used, {speculation.discarded} discarded "
+                  f"({speculation.wasted_seconds:.1f}s and {speculation.wasted_tokens} tokens wasted)")
+        if prejudge is not None:
+            prejudge.save_references(PREJUDGE_REFERENCES)
+            print(f"⚡ Dean pre-judge: {prejudge.summary()}")
+    finally:
+        source.close()
+        close_all_clients()
+
+    print(f"\n🎉 All Socratic dialogues completed using {args.provider.upper()}!")
+    print(f"📈 {stats.completed} completed, {stats.failed} failed in {stats.elapsed:.0f}s ({stats.dialogues_per_minute:.1f} dialogues/min)")
+    print(f"📁 Results saved to: {sink.path}")
+    return stats
+
+# Run Socratic dialogues
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,94 @@
+# merge_results.py - combine shard outputs into one de-duplicated result set
+
+import argparse
+import glob
+import os
+from typing import Dict, List, Tuple
+
+from utils.assessment_queue import AssessmentQueue
+from utils.result_sink import open_result_sink, parquet_base, read_results, result_files
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """Expand globs; all the part files of one Parquet output count as one input, <base>.parquet"""
+    paths = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if path.endswith(".parquet"):
+                path = parquet_base(path)
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def merge(paths: List[str]) -> Tuple[Dict[str, Tuple[Dict, List[Dict]]], int]:
+    """
+    Keep one record per dialogue ID. A finished record (with final_assessment) beats an unfinished one;
+    otherwise the later input wins, so re-runs listed after the original take precedence.
+    """
+    merged: Dict[str, Tuple[Dict, List[Dict]]] = {}
+    duplicates = 0
+    for path in paths:
+        for record, turns in read_results(path):
+            dialogue_id = record["dialogue_id"]
+            existing = merged.get(dialogue_id)
+            if existing is not None:
+                duplicates += 1
+                if existing[0].get("final_assessment") and not record.get("final_assessment"):
+                    continue
+            merged[dialogue_id] = (record, turns)
+    return merged, duplicates
+
+def join_assessments(merged: Dict[str, Tuple[Dict, List[Dict]]], queue_paths: List[str]) -> int:
+    """Fill in deferred cognitive assessments from the runs' assessment queues; returns how many were joined"""
+    joined = 0
+    for path in queue_paths:
+        queue = AssessmentQueue(path)
+        for dialogue_id, result in queue.results():
+            if dialogue_id not in merged:
+                continue
+            record, _ = merged[dialogue_id]
+            record["cognitive_state"] = result["cognitive_state"]
+            if record.get("final_assessment"):
+                record["final_assessment"] = {
+                    **record["final_assessment"],
+                    "cognitive_assessment": "completed",
+                    "cognitive_assessed_by": result.get("assessed_by"),
+                    "cognitive_token_usage": result.get("token_usage")
+                }
+            joined += 1
+        queue.close()
+    return joined
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Merge and de-duplicate shard result files")
+    parser.add_argument("inputs", nargs="+", help="Result files or globs (jsonl, jsonl.gz, parquet)")
+    parser.add_argument("--output", default="outputs/socratic_results_merged", help="Output path without extension")
+    parser.add_argument("--format", choices=["jsonl", "jsonl.gz", "parquet"], default="jsonl")
+    parser.add_argument("--assessments", nargs="+", default=[],
+                        help="Assessment queues (outputs/runs/<run_id>/assessments.sqlite, globs allowed) to join into the records")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    paths = expand_inputs(args.inputs)
+    missing = [p for p in paths if not result_files(p)]
+    if missing:
+        raise SystemExit(f"Input not found: {', '.join(missing)}")
+
+    merged, duplicates = merge(paths)
+    queue_paths = [path for pattern in args.assessments for path in sorted(glob.glob(pattern)) or [pattern]]
+    missing = [p for p in queue_paths if not os.path.exists(p)]
+    if missing:
+        raise SystemExit(f"Assessment queue not found: {', '.join(missing)}")
+    joined = join_assessments(merged, queue_paths)
+    sink = open_result_sink(args.output, args.format, batch_size=1000)
+    if result_files(sink.path):
+        raise SystemExit(f"{sink.path} already exists; choose another --output")
+    with sink:
+        for dialogue_id in sorted(merged):
+            sink.write_normalized(*merged[dialogue_id])
+
+    print(f"🧩 Merged {len(paths)} files: {len(merged)} dialogues, {duplicates} duplicates dropped")
+    if queue_paths:
+        deferred = sum(1 for record, _ in merged.values() if not record.get("cognitive_state"))
+        print(f"🧠 Joined {joined} cognitive assessments, {deferred} dialogues still without one")
+    print(f"📁 Results saved to: {sink.path}")
@@ -0,0 +1,51 @@
+# precompute_first_turns.py - generate the opening student turn once per (canonical question, persona)
+
+import argparse
+
+from agents.first_turns import DEFAULT_FIRST_TURNS_PATH, FirstTurnStore, precompute_first_turns
+from config.llm_config import PROVIDER_QUOTAS, close_all_clients
+from config.personas import persona_traits
+from utils.question_source import QuestionSource
+
+QUESTIONS_PATH = "data/data_science_interview_questions.csv"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Precompute opening student turns for main.py --first-turns")
+    parser.add_argument("--provider", choices=list(PROVIDER_QUOTAS), default="gemini")
+    parser.add_argument("--model", help="Model (default: the provider's, as in main.py)")
+    parser.add_argument("--questions-file", default=QUESTIONS_PATH, help="Question bank (CSV or JSONL)")
+    parser.add_argument("--personas", help="Comma-separated personas (default: all)")
+    parser.add_argument("--variants", type=int, default=3, help="Differently seeded replies per question and persona")
+    parser.add_argument("--workers", type=int, default=4, help="Replies generated at once")
+    parser.add_argument("--store", default=DEFAULT_FIRST_TURNS_PATH, help="SQLite file holding the replies")
+    args = parser.parse_args()
+    if args.model is None:
+        # Same default as main.py, so the stored turns match the runs that look them up
+        from main import DEFAULT_MODELS
+        args.model = DEFAULT_MODELS[args.provider]
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    personas = [p.strip() for p in args.personas.split(",")] if args.personas else list(persona_traits)
+    unknown = [p for p in personas if p not in persona_traits]
+    if unknown:
+        raise SystemExit(f"Unknown persona: {', '.join(unknown)}")
+
+    source = QuestionSource(args.questions_file)
+    questions = source.canonical_questions()
+    rows = sum(1 for _ in source.rows())
+    source.close()
+    print(f"🗂️ {rows} questions in the bank, {len(questions)} distinct")
+
+    store = FirstTurnStore(args.store)
+    try:
+        generated, failed = precompute_first_turns(
+            store, questions.values(), personas, args.provider, args.model,
+            variants=args.variants, max_workers=args.workers
+        )
+    finally:
+        close_all_clients()
+        store.close()
+    print(f"📦 {generated} opening turns generated, {failed} failed "
+          f"({len(questions)} questions x {len(personas)} personas x {args.variants} variants)")
@@ -0,0 +1,151 @@
+# tests/test_ollama_http_client.py
+
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ollama_http_client import OllamaHTTPClient, ollama_http_chat
+from utils.rate_limiter import RateLimitError
+
+class StubOllama(BaseHTTPRequestHandler):
+    """
+    Minimal /api/chat endpoint. The server's `replies` list holds (status, headers, body) tuples served
+    in order; a list body is sent as newline-delimited JSON chunks. Every request is recorded on the server.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append({"path": self.path, "body": body, "client": self.client_address})
+        status, headers, reply = self.server.replies.pop(0)
+        if isinstance(reply, list):
+            data = b"".join(json.dumps(chunk).encode() + b"\n" for chunk in reply)
+        elif isinstance(reply, dict):
+            data = json.dumps(reply).encode()
+        else:
+            data = reply.encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    httpd.requests = []
+    httpd.replies = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def client(server):
+    client = OllamaHTTPClient(model="llama3", base_url=f"http://127.0.0.1:{server.server_address[1]}")
+    yield client
+    client.close()
+
+def reply(content, **extra):
+    return {"message": {"role": "assistant", "content": content}, "done": True, **extra}
+
+def test_chat_returns_message_content(server, client):
+    server.replies.append((200, {}, reply("  Hello there.  ", prompt_eval_count=12, eval_count=3)))
+
+    assert client.chat("Hi", system="Be brief") == "Hello there."
+    request = server.requests[0]
+    assert request["path"] == "/api/chat"
+    assert request["body"]["stream"] is False
+    assert request["body"]["messages"] == [
+        {"role": "system", "content": "Be brief"},
+        {"role": "user", "content": "Hi"}
+    ]
+
+def test_chat_without_system_sends_only_user_message(server, client):
+    server.replies.append((200, {}, reply("ok")))
+
+    client.chat("Hi")
+    assert server.requests[0]["body"]["messages"] == [{"role": "user", "content": "Hi"}]
+
+def test_payload_carries_keep_alive_and_merged_options(server):
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    client = OllamaHTTPClient(
+        model="mistral", base_url=base_url, keep_alive="1h", options={"temperature": 0.2, "num_ctx": 4096}
+    )
+    server.replies.append((200, {}, reply("{}")))
+
+    client.chat("Hi", options={"temperature": 0.9, "format": "json"})
+    client.close()
+    body = server.requests[0]["body"]
+    assert body["model"] == "mistral"
+    assert body["keep_alive"] == "1h"
+    assert body["options"] == {"temperature": 0.9, "num_ctx": 4096}
+    assert body["format"] == "json"
+    # Per-call options must not leak into the client defaults
+    assert client.options == {"temperature": 0.2, "num_ctx": 4096}
+
+def test_chat_stream_assembles_chunks(server, client):
+    server.replies.append((200, {}, [
+        {"message": {"content": "What "}, "done": False},
+        {"message": {"content": ""}, "done": False},
+        {"message": {"content": "do you think?"}, "done": False},
+        {"message": {"content": ""}, "done": True, "prompt_eval_count": 20, "eval_count": 4}
+    ]))
+
+    chunks = list(client.chat_stream("Hi"))
+    assert chunks == ["What ", "do you think?"]
+    assert "".join(chunks) == "What do you think?"
+    assert server.requests[0]["body"]["stream"] is True
+
+def test_chat_stream_reports_error_chunk(server, client):
+    server.replies.append((200, {}, [{"message": {"content": "Par"}, "done": False}, {"error": "model crashed"}]))
+
+    assert list(client.chat_stream("Hi")) == ["Par", "ERROR: model crashed"]
+
+def test_session_is_reused_across_calls(server, client):
+    server.replies.extend([(200, {}, reply("one")), (200, {}, reply("two")), (200, {}, [reply("three")])])
+
+    assert client.chat("1") == "one"
+    assert client.chat("2") == "two"
+    assert list(client.chat_stream("3")) == ["three"]
+    # One pooled keep-alive connection serves every call
+    assert len({request["client"] for request in server.requests}) == 1
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_overload_raises_rate_limit_error(server, client, status):
+    server.replies.append((status, {"Retry-After": "7"}, "server busy"))
+
+    with pytest.raises(RateLimitError) as excinfo:
+        client.chat("Hi")
+    assert excinfo.value.retry_after == 7.0
+    assert str(status) in str(excinfo.value)
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_overload_raises_rate_limit_error_when_streaming(server, client, status):
+    server.replies.append((status, {}, "server busy"))
+
+    with pytest.raises(RateLimitError) as excinfo:
+        list(client.chat_stream("Hi"))
+    assert excinfo.value.retry_after is None
+
+def test_other_http_errors_become_error_strings(server, client):
+    server.replies.append((404, {}, "model 'llama3' not found"))
+
+    assert client.chat("Hi") == "ERROR: Ollama returned 404: model 'llama3' not found"
+
+def test_convenience_function_turns_overload_into_error_string(server, monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOST", f"127.0.0.1:{server.server_address[1]}")
+    server.replies.append((503, {}, "queue full"))
+
+    assert ollama_http_chat("Hi").startswith("ERROR: Ollama returned 503")
@@ -0,0 +1,170 @@
+# trace_report.py - summarize the spans written by utils/tracing.py for a run
+
+import argparse
+import json
+import os
+from collections import defaultdict
+from typing import Dict, List
+
+from utils.run_manifest import RUNS_DIR
+
+def _from_otlp(line: Dict) -> List[Dict]:
+    """Convert an OTLP/JSON line back into the flat span dicts used below"""
+    def value(v):
+        for key in ("stringValue", "boolValue", "doubleValue"):
+            if key in v:
+                return v[key]
+        return int(v["intValue"]) if "intValue" in v else None
+
+    spans = []
+    for resource in line.get("resourceSpans", []):
+        for scope in resource.get("scopeSpans", []):
+            for s in scope.get("spans", []):
+                attributes = {a["key"]: value(a["value"]) for a in s.get("attributes", [])}
+                start = int(s["startTimeUnixNano"]) / 1e9
+                end = int(s["endTimeUnixNano"]) / 1e9
+                spans.append({
+                    "trace_id": s["traceId"],
+                    "span_id": s["spanId"],
+                    "parent_id": s.get("parentSpanId"),
+                    "name": s["name"],
+                    "kind": attributes.pop("kind", "internal"),
+                    "start": start,
+                    "end": end,
+                    "status": "error" if s.get("status", {}).get("code") == 2 else "ok",
+                    "error": s.get("status", {}).get("message") or None,
+                    "attributes": attributes,
+                    "events": [
+                        {"name": e["name"], **{a["key"]: value(a["value"]) for a in e.get("attributes", [])}}
+                        for e in s.get("events", [])
+                    ]
+                })
+    return spans
+
+def load_spans(path: str) -> List[Dict]:
+    spans = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            spans.extend(_from_otlp(record) if "resourceSpans" in record else [record])
+    return spans
+
+def critical_path(root: Dict, children: Dict[str, List[Dict]]) -> List[Dict]:
+    """
+    Walk back from the end of a span, always stepping to the child that finished last before the cursor.
+    Time not covered by any child is attributed to the span itself.
+    """
+    path = []
+    cursor = root["end"]
+    for child in sorted(children.get(root["span_id"], []), key=lambda s: s["end"], reverse=True):
+        if child["end"] > cursor + 1e-6:
+            continue  # overlapped by something that finished later
+        if cursor - child["end"] > 0:
+            path.append({"name": f"({root['name']} self)", "duration": cursor - child["end"]})
+        path.append({"name": child["name"], "duration": child["end"] - child["start"]})
+        cursor = child["start"]
+    if cursor - root["start"] > 0:
+        path.append({"name": f"({root['name']} self)", "duration": cursor - root["start"]})
+    return path
+
+def _dialogue_label(dialogue: Dict) -> str:
+    # Older traces only carry the (non-unique) question_id
+    attributes = dialogue["attributes"]
+    return attributes.get("dialogue_id") or attributes.get("question_id") or dialogue["trace_id"][:8]
+
+def report(spans: List[Dict], top: int = 5) -> None:
+    children: Dict[str, List[Dict]] = defaultdict(list)
+    by_id = {}
+    for s in spans:
+        by_id[s["span_id"]] = s
+        if s.get("parent_id"):
+            children[s["parent_id"]].append(s)
+
+    dialogues = [s for s in spans if s["kind"] == "dialogue"]
+    if not dialogues:
+        print("No dialogue spans found")
+        return
+    wall = sum(d["end"] - d["start"] for d in dialogues)
+    print(f"🧵 {len(dialogues)} dialogues, {wall:.1f}s total dialogue time ({wall / len(dialogues):.1f}s mean)")
+
+    # Node share of dialogue time, split into provider time and local work
+    node_time: Dict[str, float] = defaultdict(float)
+    node_llm_time: Dict[str, float] = defaultdict(float)
+    node_count: Dict[str, int] = defaultdict(int)
+    for s in spans:
+        if s["kind"] != "node":
+            continue
+        node_time[s["name"]] += s["end"] - s["start"]
+        node_count[s["name"]] += 1
+        node_llm_time[s["name"]] += sum(c["end"] - c["start"] for c in children.get(s["span_id"], []) if c["kind"] == "llm")
+    print("\n⏱️ Share of dialogue time by node")
+    for name, seconds in sorted(node_time.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {name:>13}: {seconds / wall:6.1%}  {seconds:8.1f}s over {node_count[name]:4d} runs, "
+              f"{node_llm_time[name] / seconds if seconds else 0:.0%} waiting on the provider")
+
+    # Critical path, aggregated across dialogues
+    path_time: Dict[str, float] = defaultdict(float)
+    for d in dialogues:
+        for step in critical_path(d, children):
+            path_time[step["name"]] += step["duration"]
+    print("\n🛤️ Critical path breakdown")
+    for name, seconds in sorted(path_time.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {name:>20}: {seconds / wall:6.1%}  {seconds:8.1f}s")
+
+    # Streamed calls: time to first token and early stops per call type
+    ttfts: Dict[str, List[float]] = defaultdict(list)
+    stopped: Dict[str, int] = defaultdict(int)
+    for s in spans:
+        if s["kind"] == "llm" and s["attributes"].get("ttft") is not None:
+            ttfts[s["name"]].append(s["attributes"]["ttft"])
+            stopped[s["name"]] += int(bool(s["attributes"].get("stopped_early")))
+    if ttfts:
+        print("\n⚡ Time to first token (streamed calls)")
+        for name, values in sorted(ttfts.items()):
+            print(f"  {name:>20}: {sum(values) / len(values):6.2f}s mean over {len(values):4d} calls, "
+                  f"{stopped[name]} stopped early")
+
+    # Retries and errors, charged to the dialogue they happened in
+    retry_wait: Dict[str, float] = defaultdict(float)
+    retry_count: Dict[str, int] = defaultdict(int)
+    errors: Dict[str, int] = defaultdict(int)
+    roots = {d["trace_id"]: d for d in dialogues}
+    for s in spans:
+        root = roots.get(s["trace_id"])
+        label = _dialogue_label(root) if root else s["trace_id"][:8]
+        for event in s.get("events", []):
+            if event["name"] == "retry":
+                retry_wait[label] += event.get("wait_seconds", 0) or 0
+                retry_count[label] += 1
+        if s.get("status") == "error" and s["kind"] == "llm":
+            errors[s["name"]] += 1
+    if retry_count:
+        print(f"\n🔁 {sum(retry_count.values())} retries adding {sum(retry_wait.values()):.1f}s of backoff")
+        for label, seconds in sorted(retry_wait.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f"  retries added {seconds:.1f}s to {label} ({retry_count[label]} retries)")
+    if errors:
+        print("\n❌ Failed provider calls: " + ", ".join(f"{name} {count}" for name, count in sorted(errors.items())))
+
+    print("\n🐢 Slowest dialogues")
+    for d in sorted(dialogues, key=lambda d: d["end"] - d["start"], reverse=True)[:top]:
+        attributes = d["attributes"]
+        print(f"  {_dialogue_label(d):>12}: {d['end'] - d['start']:6.1f}s, "
+              f"{attributes.get('iterations', '?')} iterations, {attributes.get('persona', '')}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Per-node timing, critical path and retry cost from a run's trace file")
+    parser.add_argument("run_id", nargs="?", help="Run ID under outputs/runs (reads its traces.jsonl)")
+    parser.add_argument("--path", help="Trace file to read instead (JSONL or OTLP/JSON lines)")
+    parser.add_argument("--top", type=int, default=5, help="How many dialogues to list in the retry and slowest sections")
+    args = parser.parse_args()
+    if not args.path and not args.run_id:
+        parser.error("give a run ID or --path")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    path = args.path or os.path.join(RUNS_DIR, args.run_id, "traces.jsonl")
+    report(load_spans(path), top=args.top)
@@ -0,0 +1,225 @@
+# utils/assessment_queue.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from utils.rate_limiter import RateLimiter, call_budget
+
+ASSESSMENT_QUEUE_FILE = "assessments.sqlite"
+
+class AssessmentQueue:
+    """
+    Durable queue of finished dialogues waiting for their cognitive assessment, backed by a local SQLite file.
+
+    Jobs move pending -> running -> done (or failed once max_attempts is used up). A failed attempt puts the
+    job back to pending with an exponential backoff (not_before), so a provider outage is not hammered.
+    Jobs left running by a process that died are put back to pending when the queue is opened, so nothing
+    is lost across restarts.
+    Enqueuing a dialogue again replaces its job, so a re-run dialogue is assessed on its new transcript.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, retry_delay: float = 10.0):
+        """
+        Args:
+            path: SQLite file location (parent directories are created)
+            max_attempts: Tries per job before it is marked failed
+            retry_delay: Seconds before the first retry, doubled on each further attempt
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS assessments ("
+            "dialogue_id TEXT PRIMARY KEY, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, "
+            "enqueued_at REAL NOT NULL, finished_at REAL, not_before REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(assessments)")}
+        if "not_before" not in columns:
+            # Queue files written before retries were delayed
+            self._conn.execute("ALTER TABLE assessments ADD COLUMN not_before REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON assessments(status, enqueued_at)")
+        self._conn.execute("UPDATE assessments SET status = 'pending' WHERE status = 'running'")
+        self._conn.commit()
+
+    def put(self, dialogue_id: str, payload: Dict) -> None:
+        """Queue (or re-queue) one dialogue; durable once this returns"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO assessments (dialogue_id, payload, status, enqueued_at) VALUES (?, ?, 'pending', ?) "
+                "ON CONFLICT(dialogue_id) DO UPDATE SET payload = excluded.payload, status = 'pending', "
+                "attempts = 0, result = NULL, error = NULL, enqueued_at = excluded.enqueued_at, finished_at = NULL, "
+                "not_before = 0",
+                (dialogue_id, json.dumps(payload, default=str, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def claim(self) -> Optional[Tuple[str, Dict]]:
+        """Take the oldest pending job that is not backing off, or None if there is none"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dialogue_id, payload FROM assessments WHERE status = 'pending' AND not_before <= ? "
+                "ORDER BY enqueued_at LIMIT 1", (time.time(),)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE assessments SET status = 'running', attempts = attempts + 1 WHERE dialogue_id = ?", (row[0],)
+            )
+            self._conn.commit()
+        return row[0], json.loads(row[1])
+
+    def complete(self, dialogue_id: str, result: Dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE assessments SET status = 'done', result = ?, error = NULL, finished_at = ? WHERE dialogue_id = ?",
+                (json.dumps(result, default=str, ensure_ascii=False), time.time(), dialogue_id)
+            )
+            self._conn.commit()
+
+    def fail(self, dialogue_id: str, error: str) -> bool:
+        """
+        Record a failed attempt; returns True if the job went back to pending for another try,
+        claimable after retry_delay * 2^(attempts - 1) seconds
+        """
+        with self._lock:
+            attempts, = self._conn.execute(
+                "SELECT attempts FROM assessments WHERE dialogue_id = ?", (dialogue_id,)
+            ).fetchone()
+            retry = attempts < self.max_attempts
+            now = time.time()
+            self._conn.execute(
+                "UPDATE assessments SET status = ?, error = ?, finished_at = ?, not_before = ? WHERE dialogue_id = ?",
+                ("pending" if retry else "failed", error, None if retry else now,
+                 now + self.retry_delay * 2 ** (attempts - 1) if retry else 0, dialogue_id)
+            )
+            self._conn.commit()
+        return retry
+
+    def next_retry_in(self) -> Optional[float]:
+        """Seconds until the next pending job can be claimed (0 if one already can), or None if none is pending"""
+        with self._lock:
+            not_before, = self._conn.execute(
+                "SELECT MIN(not_before) FROM assessments WHERE status = 'pending'"
+            ).fetchone()
+        return None if not_before is None else max(0.0, not_before - time.time())
+
+    def results(self) -> Iterator[Tuple[str, Dict]]:
+        """(dialogue_id, result) for every finished job"""
+        with self._lock:
+            rows = self._conn.execute("SELECT dialogue_id, result FROM assessments WHERE status = 'done'").fetchall()
+        for dialogue_id, result in rows:
+            yield dialogue_id, json.loads(result)
+
+    def counts(self) -> Dict[str, int]:
+        """Jobs per status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM assessments GROUP BY status").fetchall()
+        return {"pending": 0, "running": 0, "done": 0, "failed": 0, **dict(rows)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+@dataclass
+class AssessmentPoolStats:
+    """Counters for one worker pool"""
+    completed: int = 0
+    failed: int = 0
+    retried: int = 0
+    busy_seconds: float = 0.0
+
+class AssessmentWorkerPool:
+    """
+    Drains an AssessmentQueue on its own threads, so assessments never hold up a dialogue worker.
+
+    The pool has its own concurrency and, optionally, its own requests/min budget on top of the provider's
+    shared rate limiter, so assessments can be held to a share of the quota. The budget is taken per provider
+    call made by assess (see call_budget), so an assessment that re-asks for valid JSON counts twice.
+    assess(payload) returns the result stored for the job; an exception counts as a failed attempt.
+    """
+
+    def __init__(
+        self,
+        queue: AssessmentQueue,
+        assess: Callable[[Dict], Dict],
+        max_workers: int = 2,
+        requests_per_minute: Optional[float] = None,
+        poll_interval: float = 1.0
+    ):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.queue = queue
+        self.assess = assess
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self._limiter = RateLimiter(requests_per_minute=requests_per_minute, max_concurrency=max_workers)
+        self._wake = threading.Condition()
+        self._closing = False
+        self._threads = []
+        self._stats = AssessmentPoolStats()
+
+    def start(self) -> "AssessmentWorkerPool":
+        for i in range(self.max_workers):
+            thread = threading.Thread(target=self._work, name=f"assessment-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, dialogue_id: str, payload: Dict) -> None:
+        """Queue a job and wake an idle worker"""
+        self.queue.put(dialogue_id, payload)
+        with self._wake:
+            self._wake.notify()
+
+    def _work(self) -> None:
+        while True:
+            job = self.queue.claim()
+            if job is None:
+                retry_in = self.queue.next_retry_in()
+                with self._wake:
+                    if self._closing and retry_in is None:
+                        return
+                    # Also polls, for jobs another process put in the same queue file
+                    self._wake.wait(min(self.poll_interval, retry_in or self.poll_interval))
+                continue
+            dialogue_id, payload = job
+            started = time.monotonic()
+            try:
+                with call_budget(self._limiter):
+                    result = self.assess(payload)
+            except Exception as e:
+                retried = self.queue.fail(dialogue_id, str(e))
+                print(f"❌ Cognitive assessment of {dialogue_id} failed: {e}")
+                with self._wake:
+                    self._stats.retried += int(retried)
+                    self._stats.failed += int(not retried)
+                continue
+            self.queue.complete(dialogue_id, result)
+            with self._wake:
+                self._stats.completed += 1
+                self._stats.busy_seconds += time.monotonic() - started
+
+    def close(self) -> None:
+        """Finish every queued job, retries included, then stop the workers"""
+        with self._wake:
+            self._closing = True
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def stats(self) -> AssessmentPoolStats:
+        with self._wake:
+            return AssessmentPoolStats(**vars(self._stats))
@@ -0,0 +1,221 @@
+# utils/fake_client.py
+
+import contextlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.rate_limiter import RateLimitError
+
+@dataclass
+class FakeProviderConfig:
+    """
+    Behaviour of the simulated provider.
+
+    Attributes:
+        latency_distribution: "fixed", "uniform" or "lognormal"
+        latency_ms: Fixed latency, uniform upper bound or lognormal median, in milliseconds
+        latency_sigma: Spread of the lognormal distribution
+        verdict_weights: Relative weights of dean verdicts
+        rate_limit_rate: Fraction of calls rejected with a 429 regardless of load
+        requests_per_minute: Server-side quota, enforced smoothly (at most rpm/60 requests in any 1s window);
+            calls over it get a 429 with retry-after
+        malformed_json_rate: Fraction of dean/cognitive calls that return broken JSON
+        wrapped_json_rate: Fraction of JSON responses wrapped in a code fence with surrounding prose
+        max_parallel: Requests the simulated server processes at once (None: unlimited); a batch takes one slot
+        token_interval_ms: Delay between streamed words after the first one arrives
+        runaway_reply_rate: Fraction of free-text replies that keep going well past the requested length
+        seed: Seed for reproducible runs (None for random)
+    """
+    latency_distribution: str = "lognormal"
+    latency_ms: float = 50.0
+    latency_sigma: float = 0.5
+    verdict_weights: Dict[str, float] = field(default_factory=lambda: {"continue": 0.6, "satisfactory": 0.4})
+    rate_limit_rate: float = 0.0
+    requests_per_minute: Optional[int] = None
+    malformed_json_rate: float = 0.0
+    wrapped_json_rate: float = 0.0
+    max_parallel: Optional[int] = None
+    token_interval_ms: float = 0.0
+    runaway_reply_rate: float = 0.0
+    seed: Optional[int] = None
+
+FAKE_PROVIDER_CONFIG = FakeProviderConfig()
+# Per-model overrides, e.g. a degraded "fake-b" behind the router
+FAKE_MODEL_CONFIGS: Dict[str, FakeProviderConfig] = {}
+
+def configure_fake_provider(model: Optional[str] = None, **kwargs) -> FakeProviderConfig:
+    """
+    Update the simulated provider's behaviour; takes FakeProviderConfig fields as keyword arguments.
+    With model=..., only that fake model changes (starting from the shared settings).
+    """
+    global FAKE_PROVIDER_CONFIG
+    if model is not None:
+        FAKE_MODEL_CONFIGS[model] = FakeProviderConfig(**{**vars(fake_config(model)), **kwargs})
+        return FAKE_MODEL_CONFIGS[model]
+    FAKE_PROVIDER_CONFIG = FakeProviderConfig(**{**vars(FAKE_PROVIDER_CONFIG), **kwargs})
+    return FAKE_PROVIDER_CONFIG
+
+def fake_config(model: str) -> FakeProviderConfig:
+    return FAKE_MODEL_CONFIGS.get(model, FAKE_PROVIDER_CONFIG)
+
+UNDERSTANDING_BY_VERDICT = {
+    "continue": ["poor", "developing"],
+    "satisfactory": ["good", "excellent"],
+    "max_reached": ["developing"]
+}
+
+class FakeLLMClient:
+    """
+    Offline provider returning canned, well-formed responses for each agent.
+    Used to measure orchestration overhead without real API latency or quota.
+    """
+
+    def __init__(self, model: str = "fake"):
+        self.model = model
+        self.calls = 0
+        self.batches = 0
+        self.rejected = 0
+        self._window = deque()
+        self._lock = threading.Lock()
+        self._rng = random.Random(fake_config(model).seed)
+        slots = fake_config(model).max_parallel
+        self._slots = threading.BoundedSemaphore(slots) if slots else contextlib.nullcontext()
+
+    def _sample_latency(self, config: FakeProviderConfig) -> float:
+        with self._lock:
+            if config.latency_distribution == "fixed":
+                ms = config.latency_ms
+            elif config.latency_distribution == "uniform":
+                ms = self._rng.uniform(0, config.latency_ms)
+            else:
+                ms = self._rng.lognormvariate(0, config.latency_sigma) * config.latency_ms
+        return ms / 1000.0
+
+    def _admit(self, config: FakeProviderConfig) -> None:
+        """Reject the request the way a quota-enforcing server would"""
+        with self._lock:
+            now = time.monotonic()
+            while self._window and self._window[0] <= now - 1:
+                self._window.popleft()
+            if config.requests_per_minute and len(self._window) >= max(1, config.requests_per_minute // 60):
+                self.rejected += 1
+                raise RateLimitError("Simulated quota exceeded", retry_after=self._window[0] + 1 - now)
+            if self._rng.random() < config.rate_limit_rate:
+                self.rejected += 1
+                raise RateLimitError("Simulated rate limit")
+            self._window.append(now)
+
+    def _roll(self, rate: float) -> bool:
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _dean_response(self, config: FakeProviderConfig) -> str:
+        with self._lock:
+            verdicts = list(config.verdict_weights)
+            verdict = self._rng.choices(verdicts, weights=[config.verdict_weights[v] for v in verdicts])[0]
+            understanding = self._rng.choice(UNDERSTANDING_BY_VERDICT.get(verdict, ["developing"]))
+        return json.dumps({
+            "verdict": verdict,
+            "understanding_level": understanding,
+            "reasoning": "Simulated dean assessment",
+            "answer_correctness": "correct" if verdict == "satisfactory" else "partially_correct",
+            "key_insights_gained": ["simulated insight"],
+            "remaining_gaps": [] if verdict == "satisfactory" else ["simulated gap"]
+        })
+
+    @staticmethod
+    def _cognitive_response() -> str:
+        return json.dumps({
+            "mental_model_development": {"initial_state": "simulated", "final_state": "simulated",
+                                         "key_breakthroughs": [], "persistent_misconceptions": []},
+            "learning_patterns": {"preferred_learning_style": "simulated", "response_to_guidance": "simulated",
+                                  "question_asking_behavior": "simulated", "confidence_progression": "simulated"},
+            "cognitive_skills_demonstrated": {"analytical_thinking": "good", "conceptual_connections": "good",
+                                              "self_reflection": "developing", "knowledge_application": "good"},
+            "persona_consistency": {"trait_alignment": "simulated", "authentic_behaviors": [],
+                                    "persona_development": "simulated"},
+            "recommendations": {"next_learning_steps": [], "teaching_strategies": [], "knowledge_gaps": []},
+            "overall_assessment": {"learning_effectiveness": "good", "engagement_level": "medium",
+                                   "readiness_for_advanced_topics": "partial", "summary": "Simulated assessment."}
+        })
+
+    def _maybe_wrap(self, config: FakeProviderConfig, body: str) -> str:
+        if self._roll(config.wrapped_json_rate):
+            return f"Here is my assessment:\n```json\n{body}\n```\nLet me know if you need more detail."
+        return body
+
+    def chat(self, prompt: str, system: str = "", options: Optional[Dict] = None) -> str:
+        """Sleep for a sampled latency, then return a canned response for the agent that sent the prompt"""
+        config = fake_config(self.model)
+        self._admit(config)
+        with self._lock:
+            self.calls += 1
+        with self._slots:
+            time.sleep(self._sample_latency(config))
+            response = self._respond(config, prompt, system)
+            if config.token_interval_ms:
+                # Generating the rest of the reply takes as long as streaming it would
+                time.sleep(config.token_interval_ms / 1000.0 * (len(response.split()) - 1))
+        return response
+
+    def chat_stream(self, prompt: str, system: str = "", options: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Like chat(), but the sampled latency is the time to first token and the response then arrives
+        word by word. Closing the iterator frees the server slot, as cancelling a real request would.
+        """
+        config = fake_config(self.model)
+        self._admit(config)
+        with self._lock:
+            self.calls += 1
+        with self._slots:
+            time.sleep(self._sample_latency(config))
+            response = self._respond(config, prompt, system)
+            for i, word in enumerate(re.findall(r"\S+\s*", response)):
+                if i and config.token_interval_ms:
+                    time.sleep(config.token_interval_ms / 1000.0)
+                yield word
+
+    def chat_batch(self, requests: List[Tuple[str, str, Optional[Dict]]]) -> List[Tuple[str, None]]:
+        """Simulated batch endpoint: the whole batch costs one sampled latency"""
+        config = fake_config(self.model)
+        self._admit(config)
+        with self._lock:
+            self.calls += len(requests)
+            self.batches += 1
+        with self._slots:
+            time.sleep(self._sample_latency(config))
+        return [(self._respond(config, prompt, system), None) for prompt, system, _ in requests]
+
+    def _respond(self, config: FakeProviderConfig, prompt: str, system: str) -> str:
+        text = f"{system}\n{prompt}"
+        if '"teacher_reply"' in text:
+            # Combined teacher/dean call
+            if self._roll(config.malformed_json_rate):
+                return '```json\n{"teacher_reply": "What do you think'
+            assessment = json.loads(self._dean_response(config))
+            return self._maybe_wrap(config, json.dumps(
+                {"teacher_reply": "What happens to the error signal as it flows back?", **assessment}
+            ))
+        if "You are the Dean" in text or "cognitive scientist" in text:
+            if self._roll(config.malformed_json_rate):
+                return '```json\n{"verdict": "continue", "understanding_level": '
+            if "You are the Dean" in text:
+                return self._maybe_wrap(config, self._dean_response(config))
+            return self._maybe_wrap(config, self._cognitive_response())
+        if "Socratic teacher" in text:
+            return self._maybe_ramble(config, "Good start. What happens to the error signal as it flows back through each layer?")
+        return self._maybe_ramble(config, "I think it works by adjusting the weights based on the error, but I'm not sure about the details.")
+
+    def _maybe_ramble(self, config: FakeProviderConfig, reply: str) -> str:
+        if self._roll(config.runaway_reply_rate):
+            return reply + " Also, let me think about this some more." * 12
+        return reply
+
+    def close(self) -> None:
+        pass
@@ -2,74 +2,161 @@
 
 import google.generativeai as genai
 import os
-from typing import Optional
-import time
-from dotenv import load_dotenv
-load_dotenv()
+import re
+import threading
+from typing import Dict, Iterator, Optional
+from google.api_core import exceptions as google_exceptions
+from utils.rate_limiter import RateLimitError
+from utils.token_usage import report_provider_usage
+
+# genai.configure sets up a process-wide transport; only redo it when the key changes
+_configure_lock = threading.Lock()
+_configured_api_key: Optional[str] = None
+
+def _ensure_configured(api_key: str) -> None:
+    global _configured_api_key
+    with _configure_lock:
+        if _configured_api_key != api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+
+_RETRY_DELAY = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)|retry in ([\d.]+)\s*s", re.IGNORECASE)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Server-suggested wait from a 429, carried as RetryInfo in the error details or quoted in its message"""
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    match = _RETRY_DELAY.search(str(error))
+    if match:
+        return float(match.group(1) or match.group(2))
+    return None
+
+MAX_SYSTEM_MODELS = 64
 
 class GeminiClient:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gemini-2.0-flash"
+    ):
         """
         Initialize Gemini client with API key.
-        API key can be passed directly or set as environment variable GEMINI_API_KEY
+        API key can be passed directly or set as environment variable GEMINI_API_KEY.
+        Instances are safe to share between threads and are meant to be long-lived.
+        
+        Args:
+            api_key: Gemini API key
+            model: Model name
         """
+        if not api_key and not os.getenv('GEMINI_API_KEY'):
+            # Used directly rather than through config.llm_config, which loads .env itself
+            from dotenv import load_dotenv
+            load_dotenv()
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
         if not self.api_key:
             raise ValueError("Gemini API key is required. Set GEMINI_API_KEY environment variable or pass it directly.")
         
-        genai.configure(api_key=self.api_key)
+        _ensure_configured(self.api_key)
         
-        # Initialize the free Gemini model
-        self.model = genai.GenerativeModel('gemini-2.0-flash')  # Free tier model
+        self.model_name = model
+        self.model = genai.GenerativeModel(model)
+        # One model handle per distinct system instruction (agent prompts use a handful of stable prefixes)
+        self._system_models: Dict[str, genai.GenerativeModel] = {}
+        self._models_lock = threading.Lock()
+    
+    def _model_for(self, system: str) -> genai.GenerativeModel:
+        """Model handle carrying the system instruction, created once per distinct prefix"""
+        if not system:
+            return self.model
+        with self._models_lock:
+            model = self._system_models.get(system)
+            if model is None:
+                model = genai.GenerativeModel(self.model_name, system_instruction=system)
+                if len(self._system_models) >= MAX_SYSTEM_MODELS:
+                    self._system_models.pop(next(iter(self._system_models)))
+                self._system_models[system] = model
+        return model
         
-    def chat(self, prompt: str, system: str = "", max_retries: int = 3) -> str:
+    def chat(
+        self,
+        prompt: str,
+        system: str = "",
+        generation_config: Optional[dict] = None,
+        options: Optional[dict] = None
+    ) -> str:
         """
         Sends a prompt to Gemini and returns the generated response.
         
         Args:
             prompt: The user prompt/question
             system: System instructions (optional)
-            max_retries: Number of retry attempts for rate limiting
+            generation_config: Generation parameters (temperature, max_output_tokens, ...)
+            options: Same as generation_config, under the name the other provider clients use
             
         Returns:
             Generated response as string
+        
+        Raises:
+            RateLimitError: Rejected for quota reasons (429) or because the model is overloaded (503);
+                retrying is up to the caller's rate limiter (see utils/rate_limiter.py)
         """
         try:
-            # Combine system instructions with prompt if provided
-            full_prompt = f"{system}\n\n{prompt}" if system else prompt
-            
-            # Make request with retries for rate limiting
-            for attempt in range(max_retries):
-                try:
-                    response = self.model.generate_content(full_prompt)
-                    return response.text.strip()
-                    
-                except Exception as e:
-                    error_msg = str(e).lower()
-                    
-                    # Handle rate limiting
-                    if "quota" in error_msg or "rate" in error_msg:
-                        if attempt < max_retries - 1:
-                            wait_time = (attempt + 1) * 2  # Exponential backoff
-                            print(f"Rate limited. Waiting {wait_time} seconds before retry {attempt + 1}/{max_retries}")
-                            time.sleep(wait_time)
-                            continue
-                        else:
-                            return f"ERROR: Rate limit exceeded after {max_retries} attempts"
-                    
-                    # Handle other API errors
-                    elif "safety" in error_msg:
-                        return "ERROR: Content blocked by safety filters"
-                    else:
-                        raise e
-                        
+            generation_config = generation_config or options
+            # System instructions travel as the model's system_instruction, not as prompt text
+            model = self._model_for(system)
+            response = model.generate_content(prompt, generation_config=generation_config)
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None:
+                report_provider_usage(usage.prompt_token_count, usage.candidates_token_count)
+            return response.text.strip()
+        
+        except (google_exceptions.TooManyRequests, google_exceptions.ServiceUnavailable) as e:
+            raise RateLimitError(str(e), retry_after=_retry_after(e)) from e
         except Exception as e:
+            if "safety" in str(e).lower():
+                return "ERROR: Content blocked by safety filters"
             return f"ERROR: {str(e)}"
 
+    def chat_stream(self, prompt: str, system: str = "", options: Optional[dict] = None) -> Iterator[str]:
+        """
+        Like chat(), but yields text chunks as Gemini generates them; closing the iterator stops generation.
+        A quota rejection raises RateLimitError before the first chunk.
+        """
+        yielded = False
+        try:
+            model = self._model_for(system)
+            usage = None
+            for chunk in model.generate_content(prompt, generation_config=options, stream=True):
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = chunk.text if chunk.parts else ""
+                if text:
+                    yielded = True
+                    yield text
+            if usage is not None:
+                report_provider_usage(usage.prompt_token_count, usage.candidates_token_count)
+        
+        except (google_exceptions.TooManyRequests, google_exceptions.ServiceUnavailable) as e:
+            if yielded:
+                return
+            raise RateLimitError(str(e), retry_after=_retry_after(e)) from e
+        except Exception as e:
+            # A failure mid-stream ends the reply where it stopped
+            if not yielded:
+                yield "ERROR: Content blocked by safety filters" if "safety" in str(e).lower() else f"ERROR: {str(e)}"
+
+    def close(self) -> None:
+        """Release model handles"""
+        with self._models_lock:
+            self._system_models = {}
+        self.model = None
+
 # Convenience function for backward compatibility
-def gemini_chat(prompt: str, model: str = "gemini-2.5-flash", system: str = "") -> str:
+def gemini_chat(prompt: str, model: str = "gemini-2.0-flash", system: str = "") -> str:
     """
     Convenience function that mimics the ollama_chat interface.
+    Builds a throwaway client; use config.llm_config.get_llm_client for reuse.
     
     Args:
         prompt: The user prompt/question
@@ -80,7 +167,7 @@ def gemini_chat(prompt: str, model: str = "gemini-2.5-flash", system: str = "")
         Generated response as string
     """
     try:
-        client = GeminiClient()
+        client = GeminiClient(model=model)
         return client.chat(prompt, system)
     except Exception as e:
         return f"ERROR: {str(e)}"
@@ -89,6 +176,8 @@ def gemini_chat(prompt: str, model: str = "gemini-2.5-flash", system: str = "")
 if __name__ == "__main__":
     # Test the client
     import sys
+    from dotenv import load_dotenv
+    load_dotenv()
     
     # Check if API key is available
     api_key = os.getenv('GEMINI_API_KEY')
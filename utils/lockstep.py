@@ -0,0 +1,135 @@
+# utils/lockstep.py
+
+import contextvars
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from utils.token_usage import report_provider_usage
+from utils.tracing import annotate_span
+
+@dataclass
+class _PendingCall:
+    client: object
+    prompt: str
+    system: str
+    options: Optional[Dict]
+    done: threading.Event = field(default_factory=threading.Event)
+    response: Optional[str] = None
+    usage: Optional[Tuple[Optional[int], Optional[int]]] = None
+    batch_size: int = 0
+
+@dataclass
+class BatchStats:
+    batches: int = 0
+    calls: int = 0
+    largest: int = 0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.calls / self.batches if self.batches else 0.0
+
+class LockstepBatcher:
+    """
+    Holds each dialogue's LLM call until every active dialogue in the cohort is waiting on one,
+    then sends them all to the provider together and hands each response back to its dialogue.
+    Dialogues therefore advance a step at a time as a group, and throughput follows how much the
+    provider can process at once rather than per-call round-trip latency.
+
+    Args:
+        max_wait: Seconds a call may wait for the rest of the cohort before the batch goes out anyway
+        max_batch: Send as soon as this many calls are waiting (None: only when the whole cohort is)
+    """
+
+    def __init__(self, max_wait: float = 2.0, max_batch: Optional[int] = None):
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending: List[_PendingCall] = []
+        self._active = 0
+        self._stats = BatchStats()
+
+    def join(self) -> None:
+        """Register a dialogue that is about to start"""
+        with self._cond:
+            self._active += 1
+
+    def leave(self) -> None:
+        """Unregister a finished dialogue; the rest of the cohort may now be complete"""
+        with self._cond:
+            self._active -= 1
+            batch = self._take_ready()
+        if batch:
+            self._dispatch(batch)
+
+    def submit(self, client, prompt: str, system: str, options: Optional[Dict]) -> str:
+        """Queue one call and block until its batch has been answered"""
+        call = _PendingCall(client, prompt, system, options)
+        with self._cond:
+            self._pending.append(call)
+            batch = self._take_ready()
+        if batch:
+            self._dispatch(batch)
+
+        while not call.done.wait(self.max_wait):
+            # Someone in the cohort is busy with local work; don't hold the others hostage
+            with self._cond:
+                batch = self._pending if call in self._pending else []
+                self._pending = [] if batch else self._pending
+            if batch:
+                self._dispatch(batch)
+
+        if call.usage is not None:
+            report_provider_usage(*call.usage)
+        annotate_span(batch_size=call.batch_size)
+        return call.response
+
+    def stats(self) -> BatchStats:
+        with self._cond:
+            return BatchStats(**vars(self._stats))
+
+    def _take_ready(self) -> List[_PendingCall]:
+        # Caller holds the lock
+        ready = self._pending and (
+            len(self._pending) >= self._active
+            or (self.max_batch is not None and len(self._pending) >= self.max_batch)
+        )
+        if not ready:
+            return []
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _dispatch(self, batch: List[_PendingCall]) -> None:
+        with self._cond:
+            self._stats.batches += 1
+            self._stats.calls += len(batch)
+            self._stats.largest = max(self._stats.largest, len(batch))
+
+        by_client: Dict[int, List[_PendingCall]] = defaultdict(list)
+        for call in batch:
+            by_client[id(call.client)].append(call)
+        for calls in by_client.values():
+            client = calls[0].client
+            try:
+                results = client.chat_batch([(c.prompt, c.system, c.options) for c in calls])
+            except Exception as e:
+                results = [(f"ERROR: {e}", None)] * len(calls)
+            for call, (response, usage) in zip(calls, results):
+                call.response, call.usage, call.batch_size = response, usage, len(batch)
+                call.done.set()
+
+_current_batcher: contextvars.ContextVar[Optional[LockstepBatcher]] = contextvars.ContextVar("lockstep_batcher", default=None)
+
+def current_batcher() -> Optional[LockstepBatcher]:
+    return _current_batcher.get()
+
+@contextmanager
+def lockstep(batcher: LockstepBatcher):
+    """Route every chat_with_llm call made inside the block through the batcher"""
+    token = _current_batcher.set(batcher)
+    try:
+        yield batcher
+    finally:
+        _current_batcher.reset(token)
@@ -1,15 +1,19 @@
 # utils/ollama_client.py
 
+import codecs
 import subprocess
 import json
+from typing import Dict, Iterator, Optional
 
-def ollama_chat(prompt: str, model: str = "llama3", system: str = "") -> str:
+def ollama_chat(prompt: str, model: str = "llama3", system: str = "", format: Optional[str] = None) -> str:
     """
     Sends a prompt to a local Ollama model and returns the generated response.
-    Requires Ollama to be running locally.
+    Requires Ollama to be running locally. Pass format="json" to constrain the output to JSON.
     """
     try:
         command = ["ollama", "run", model]
+        if format:
+            command += ["--format", format]
         full_prompt = f"{system}\n{prompt}" if system else prompt
 
         # Use subprocess to run the command with the prompt piped in
@@ -25,3 +29,52 @@ def ollama_chat(prompt: str, model: str = "llama3", system: str = "") -> str:
 
     except Exception as e:
         return f"ERROR: {e}"
+
+def ollama_chat_stream(prompt: str, model: str = "llama3", system: str = "", format: Optional[str] = None) -> Iterator[str]:
+    """
+    Like ollama_chat, but yields output as the CLI prints it.
+    Closing the iterator early kills the ollama process, which stops generation.
+    """
+    command = ["ollama", "run", model]
+    if format:
+        command += ["--format", format]
+    full_prompt = f"{system}\n{prompt}" if system else prompt
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        yield f"ERROR: {e}"
+        return
+
+    try:
+        process.stdin.write(full_prompt.encode("utf-8"))
+        process.stdin.close()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = process.stdout.read1(4096)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+class OllamaCLIClient:
+    """Backend adapter so the CLI-based ollama_chat can be used like the other provider clients"""
+
+    def __init__(self, model: str = "llama3"):
+        self.model = model
+
+    def chat(self, prompt: str, system: str = "", options: Optional[Dict] = None) -> str:
+        return ollama_chat(prompt, model=self.model, system=system, format=(options or {}).get("format"))
+
+    def chat_stream(self, prompt: str, system: str = "", options: Optional[Dict] = None) -> Iterator[str]:
+        return ollama_chat_stream(prompt, model=self.model, system=system, format=(options or {}).get("format"))
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,158 @@
+# utils/ollama_http_client.py
+
+import json
+import os
+from typing import Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.rate_limiter import RateLimitError
+from utils.token_usage import report_provider_usage
+
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+
+def _check_overloaded(response: requests.Response) -> None:
+    """The server answers 503 when its request queue (OLLAMA_MAX_QUEUE) is full; proxies in front may send 429"""
+    if response.status_code in (429, 503):
+        retry_after = response.headers.get("Retry-After")
+        raise RateLimitError(
+            f"Ollama returned {response.status_code}: {response.text.strip()}",
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+        )
+
+class OllamaHTTPClient:
+    """
+    Talks to a local Ollama server over its HTTP API.
+    A single pooled session is reused for every call, and keep_alive keeps the model resident
+    between prompts, so there is no per-call process spawn or model load.
+    """
+
+    def __init__(
+        self,
+        model: str = "llama3",
+        base_url: Optional[str] = None,
+        keep_alive: str = "30m",
+        options: Optional[Dict] = None,
+        timeout: float = 300.0,
+        pool_size: Optional[int] = None
+    ):
+        """
+        Args:
+            model: Ollama model name
+            base_url: Server URL (defaults to OLLAMA_HOST or http://localhost:11434)
+            keep_alive: How long the server keeps the model loaded after a request
+            options: Default generation options (temperature, num_ctx, num_predict, ...)
+            timeout: Per-request timeout in seconds
+            pool_size: Maximum pooled connections, should cover the number of concurrent callers
+                (default: 8, or OLLAMA_NUM_PARALLEL if larger)
+        """
+        host = base_url or os.getenv("OLLAMA_HOST") or DEFAULT_OLLAMA_HOST
+        if not host.startswith("http"):
+            host = f"http://{host}"
+        self.base_url = host.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.options = options or {}
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        pool_size = pool_size or max(8, int(os.getenv("OLLAMA_NUM_PARALLEL", "0")))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, prompt: str, system: str, options: Optional[Dict], stream: bool) -> Dict:
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+        options = {**self.options, **(options or {})}
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": self.keep_alive
+        }
+        # "format" (e.g. "json" or a JSON schema) is a request field, not a sampling option
+        if "format" in options:
+            payload["format"] = options.pop("format")
+        payload["options"] = options
+        return payload
+
+    def chat(self, prompt: str, system: str = "", options: Optional[Dict] = None) -> str:
+        """
+        Sends a prompt and returns the full response.
+
+        Args:
+            prompt: The user prompt/question
+            system: System instructions (optional)
+            options: Generation options for this call, merged over the client defaults
+
+        Returns:
+            Generated response as string, or an "ERROR: ..." string with the server's message
+        
+        Raises:
+            RateLimitError: The server is overloaded (429/503)
+        """
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/chat",
+                json=self._payload(prompt, system, options, stream=False),
+                timeout=self.timeout
+            )
+            _check_overloaded(response)
+            if response.status_code != 200:
+                return f"ERROR: Ollama returned {response.status_code}: {response.text.strip()}"
+            body = response.json()
+            report_provider_usage(body.get("prompt_eval_count"), body.get("eval_count"))
+            return body["message"]["content"].strip()
+        except RateLimitError:
+            raise
+        except Exception as e:
+            return f"ERROR: {e}"
+
+    def chat_stream(self, prompt: str, system: str = "", options: Optional[Dict] = None) -> Iterator[str]:
+        """Yields response text chunks as the server produces them; raises RateLimitError like chat()"""
+        try:
+            with self.session.post(
+                f"{self.base_url}/api/chat",
+                json=self._payload(prompt, system, options, stream=True),
+                timeout=self.timeout,
+                stream=True
+            ) as response:
+                _check_overloaded(response)
+                if response.status_code != 200:
+                    yield f"ERROR: Ollama returned {response.status_code}: {response.text.strip()}"
+                    return
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        yield f"ERROR: {chunk['error']}"
+                        return
+                    content = chunk.get("message", {}).get("content", "")
+                    if content:
+                        yield content
+                    if chunk.get("done"):
+                        report_provider_usage(chunk.get("prompt_eval_count"), chunk.get("eval_count"))
+                        return
+        except RateLimitError:
+            raise
+        except Exception as e:
+            yield f"ERROR: {e}"
+
+    def close(self) -> None:
+        """Close pooled connections"""
+        self.session.close()
+
+# Convenience function that mirrors ollama_chat
+def ollama_http_chat(prompt: str, model: str = "llama3", system: str = "") -> str:
+    client = OllamaHTTPClient(model=model)
+    try:
+        return client.chat(prompt, system)
+    except RateLimitError as e:
+        return f"ERROR: {e}"
+    finally:
+        client.close()
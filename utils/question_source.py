@@ -0,0 +1,264 @@
+# utils/question_source.py
+
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+INDEX_DIR = ".cache"
+
+_QUESTION_ID = re.compile(r"\((Q\d+)\)\s*$")
+
+def question_id_for(question: str, idx: int) -> str:
+    """Question ID from the (Qnnn) suffix, falling back to the row number; the bank reuses some IDs"""
+    match = _QUESTION_ID.search(question)
+    return match.group(1) if match else f"row{idx+1}"
+
+def dialogue_id_for(question: str, idx: int) -> str:
+    """Unique, stable ID for one row of the bank, e.g. Q87-row4; manifests, checkpoints and outputs key on it"""
+    match = _QUESTION_ID.search(question)
+    return f"{match.group(1)}-row{idx+1}" if match else f"row{idx+1}"
+
+def _with_question_id(row: Dict, idx: int) -> Tuple[str, Dict]:
+    row["question_id"] = question_id_for(row["question"], idx)
+    return dialogue_id_for(row["question"], idx), row
+
+def canonical_question(question: str) -> str:
+    """Question text without its (Qnnn) suffix and with whitespace collapsed"""
+    return " ".join(_QUESTION_ID.sub("", question).split())
+
+def canonical_question_id(question: str) -> str:
+    """
+    ID shared by every row asking the same question: the bank repeats questions under different
+    (Qnnn) IDs, and some IDs under different questions
+    """
+    digest = hashlib.sha1(canonical_question(question).casefold().encode("utf-8")).hexdigest()
+    return f"C{digest[:10]}"
+
+class QuestionSource:
+    """
+    Streams a question bank (CSV with a header row, or JSONL) without loading it into memory.
+
+    Plain iteration reads the file front to back. Filtering by category, difficulty or question ID and
+    sampling go through a small SQLite index of (row, byte offset, question_id, category, difficulty),
+    built in one pass on first use and rebuilt when the bank file changes; matching rows are then
+    read back by seeking to their offsets.
+
+    Rows are yielded as (dialogue_id, row): dialogue_id is unique per row (see dialogue_id_for), and rows are
+    dicts with at least "question", "category" and "difficulty", plus the row's (possibly shared) "question_id".
+    """
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        self.path = path
+        self.is_jsonl = path.endswith(".jsonl")
+        name = os.path.basename(path)
+        self.index_path = index_path or os.path.join(INDEX_DIR, f"{name}.index.sqlite")
+        self._header: Optional[List[str]] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    # Reading
+
+    def _records(self, f) -> Iterator[Tuple[int, bytes]]:
+        """(byte offset, raw record) pairs for the whole file, after reading the CSV header"""
+        if not self.is_jsonl:
+            header = f.readline()
+            self._header = next(csv.reader([header.decode("utf-8-sig")]))
+        return self._split_records(f, f.tell())
+
+    def _split_records(self, f, offset: int) -> Iterator[Tuple[int, bytes]]:
+        # CSV records may span lines inside quoted fields; an odd quote count means the record continues
+        pending = b""
+        start = offset
+        for line in iter(f.readline, b""):
+            if not pending:
+                start = offset
+            offset += len(line)
+            pending += line
+            if not self.is_jsonl and pending.count(b'"') % 2:
+                continue
+            if pending.strip():
+                yield start, pending
+            pending = b""
+        if pending.strip():
+            yield start, pending
+
+    def _parse(self, raw: bytes) -> Dict:
+        text = raw.decode("utf-8")
+        if self.is_jsonl:
+            return json.loads(text)
+        values = next(csv.reader(io.StringIO(text)))
+        return dict(zip(self._header, values))
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict]]:
+        return self.rows()
+
+    def rows(self, start: int = 0, limit: Optional[int] = None) -> Iterator[Tuple[str, Dict]]:
+        """Stream (dialogue_id, row) for rows [start, start + limit) in file order"""
+        with open(self.path, "rb") as f:
+            for idx, (_, raw) in enumerate(self._records(f)):
+                if idx < start:
+                    continue
+                if limit is not None and idx >= start + limit:
+                    break
+                yield _with_question_id(self._parse(raw), idx)
+
+    # Index
+
+    def _index(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._open_index()
+            return self._conn
+
+    def _open_index(self) -> sqlite3.Connection:
+        stat = os.stat(self.path)
+        signature = f"{os.path.abspath(self.path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        if os.path.dirname(self.index_path):
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        current = conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        header = conn.execute("SELECT value FROM meta WHERE key = 'header'").fetchone()
+        if current and current[0] == signature:
+            self._header = json.loads(header[0]) if header and header[0] else None
+            return conn
+        self._build_index(conn, signature)
+        return conn
+
+    def _build_index(self, conn: sqlite3.Connection, signature: str) -> None:
+        conn.execute("DROP TABLE IF EXISTS questions")
+        conn.execute("""
+            CREATE TABLE questions (
+                row INTEGER PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                question_id TEXT NOT NULL,
+                category TEXT,
+                difficulty TEXT
+            )
+        """)
+
+        def entries():
+            with open(self.path, "rb") as f:
+                for idx, (offset, raw) in enumerate(self._records(f)):
+                    row = self._parse(raw)
+                    yield (idx, offset, question_id_for(row["question"], idx),
+                           (row.get("category") or "").lower(), (row.get("difficulty") or "").lower())
+
+        conn.execute("PRAGMA synchronous = OFF")  # Rebuilt from the bank if interrupted
+        with conn:
+            conn.executemany("INSERT INTO questions VALUES (?, ?, ?, ?, ?)", entries())
+            conn.execute("CREATE INDEX idx_question_id ON questions (question_id)")
+            conn.execute("CREATE INDEX idx_stratum ON questions (category, difficulty)")
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (signature,))
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('header', ?)", (json.dumps(self._header),))
+
+    def _where(self, category, difficulty, question_ids, start, limit) -> Tuple[str, list]:
+        clauses, params = ["row >= ?"], [start]
+        if limit is not None:
+            clauses.append("row < ?")
+            params.append(start + limit)
+        if category:
+            clauses.append("category = ?")
+            params.append(category.lower())
+        if difficulty:
+            clauses.append("difficulty = ?")
+            params.append(difficulty.lower())
+        if question_ids:
+            clauses.append(f"question_id IN ({', '.join('?' * len(question_ids))})")
+            params.extend(question_ids)
+        return " AND ".join(clauses), params
+
+    def _read_at(self, entries: Iterable[Tuple[int, int]]) -> Iterator[Tuple[str, Dict]]:
+        with open(self.path, "rb") as f:
+            for idx, offset in entries:
+                f.seek(offset)
+                _, raw = next(self._split_records(f, offset))
+                yield _with_question_id(self._parse(raw), idx)
+
+    # Selection
+
+    def select(
+        self,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        question_ids: Optional[Sequence[str]] = None,
+        start: int = 0,
+        limit: Optional[int] = None
+    ) -> Iterator[Tuple[str, Dict]]:
+        """(dialogue_id, row) for rows [start, start + limit) matching every given filter, in file order"""
+        if not (category or difficulty or question_ids):
+            return self.rows(start, limit)
+        where, params = self._where(category, difficulty, question_ids, start, limit)
+        cursor = self._index().execute(f"SELECT row, offset FROM questions WHERE {where} ORDER BY row", params)
+        return self._read_at(cursor)
+
+    def sample(
+        self,
+        n: int,
+        seed: Optional[int] = None,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None
+    ) -> Iterator[Tuple[str, Dict]]:
+        """Uniform sample of n matching rows, returned in file order; memory stays O(n)"""
+        where, params = self._where(category, difficulty, None, 0, None)
+        conn = self._index()
+        total = conn.execute(f"SELECT COUNT(*) FROM questions WHERE {where}", params).fetchone()[0]
+        cursor = conn.execute(f"SELECT row, offset FROM questions WHERE {where} ORDER BY row", params)
+        return self._read_at(_pick(cursor, total, n, random.Random(seed)))
+
+    def stratified_sample(
+        self,
+        per_stratum: int,
+        by: Sequence[str] = ("category", "difficulty"),
+        seed: Optional[int] = None
+    ) -> Iterator[Tuple[str, Dict]]:
+        """Up to per_stratum rows from every combination of the `by` columns (category and/or difficulty)"""
+        columns = [c for c in by if c in ("category", "difficulty")]
+        if not columns:
+            raise ValueError("Stratify by category and/or difficulty")
+        conn = self._index()
+        rng = random.Random(seed)
+        chosen: List[Tuple[int, int]] = []
+        strata = conn.execute(f"SELECT DISTINCT {', '.join(columns)} FROM questions ORDER BY {', '.join(columns)}")
+        for stratum in strata.fetchall():
+            where = " AND ".join(f"{c} = ?" for c in columns)
+            total = conn.execute(f"SELECT COUNT(*) FROM questions WHERE {where}", stratum).fetchone()[0]
+            cursor = conn.execute(f"SELECT row, offset FROM questions WHERE {where} ORDER BY row", stratum)
+            chosen.extend(_pick(cursor, total, per_stratum, rng))
+        return self._read_at(sorted(chosen))
+
+    def canonical_questions(self) -> Dict[str, str]:
+        """Canonical question ID -> canonical text, for every distinct question in the bank"""
+        questions: Dict[str, str] = {}
+        for _, row in self.rows():
+            questions.setdefault(canonical_question_id(row["question"]), canonical_question(row["question"]))
+        return questions
+
+    def strata(self) -> Dict[Tuple[str, str], int]:
+        """Row counts per (category, difficulty)"""
+        rows = self._index().execute("SELECT category, difficulty, COUNT(*) FROM questions GROUP BY 1, 2")
+        return {(category, difficulty): count for category, difficulty, count in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def _pick(entries: Iterable, total: int, n: int, rng: random.Random) -> list:
+    """n of the total entries chosen uniformly, in their original order"""
+    wanted = sorted(rng.sample(range(total), min(n, total)))
+    picked = []
+    for position, entry in enumerate(entries):
+        if len(picked) == len(wanted):
+            break
+        if position == wanted[len(picked)]:
+            picked.append(entry)
+    return picked
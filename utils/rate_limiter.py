@@ -0,0 +1,275 @@
+# utils/rate_limiter.py
+
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from utils.tracing import span_event
+
+T = TypeVar("T")
+
+class RateLimitError(Exception):
+    """
+    Raised by provider clients when the server rejects a call for quota reasons (HTTP 429 and friends).
+
+    Attributes:
+        retry_after: Seconds the server asked us to wait, if it said
+        attempts: Set by RateLimiter.call when it gives up
+    """
+
+    def __init__(self, message: str = "Rate limited", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.attempts = 0
+
+@dataclass
+class RateLimiterStats:
+    """Counters for one (provider, model) limiter"""
+    calls: int = 0
+    rate_limited: int = 0
+    retries: int = 0
+    gave_up: int = 0
+    throttled_seconds: float = 0.0  # Time callers spent waiting for the buckets, a slot or a retry-after pause
+    concurrency_limit: float = 0.0
+
+class _TokenBucket:
+    """Refills at rate_per_minute, holds at most capacity; a take may overdraw, later takes then wait"""
+
+    def __init__(self, rate_per_minute: float, capacity: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount (capped at capacity, so one large call cannot block forever) is available"""
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level - amount)
+
+class _Slot:
+    """Outcome of one attempt, filled in by the caller before the slot is released"""
+
+    def __init__(self, tokens: int, started: float):
+        self.tokens = tokens
+        self.started = started
+        self.rate_limited = False
+        self.retry_after: Optional[float] = None
+        self.actual_tokens: Optional[int] = None
+
+    def mark_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        self.rate_limited = True
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """
+    Client-side quota controller shared by every caller of one (provider, model).
+
+    - Token buckets keep requests/min and tokens/min under the quota, spreading calls evenly instead of
+      bursting into 429s.
+    - A retry-after hint from the server pauses every caller, not just the one that was rejected.
+    - The concurrency limit follows AIMD: +1 per limit's worth of successful calls, halved on a 429
+      (once per round of in-flight calls, so a burst of rejections only counts once).
+    - Rejected calls are retried with full-jitter exponential backoff.
+
+    Args:
+        requests_per_minute: Request quota (None: unlimited)
+        tokens_per_minute: Input + output token quota (None: unlimited)
+        max_concurrency: Ceiling for the adaptive concurrency limit
+        min_concurrency: Floor for the adaptive concurrency limit
+        max_retries: Retries after a 429 before RateLimitError is re-raised
+        base_delay: First backoff step in seconds
+        max_delay: Cap on a single backoff
+        token_burst_seconds: Tokens/min bucket size, in seconds of quota
+        seed: Seed for the backoff jitter
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        token_burst_seconds: float = 10.0,
+        seed: Optional[int] = None
+    ):
+        # One request of burst: calls go out evenly spaced, so no 60s window ever sees more than the quota
+        self._requests = _TokenBucket(requests_per_minute, 1.0) if requests_per_minute else None
+        self._tokens = (_TokenBucket(tokens_per_minute, tokens_per_minute * token_burst_seconds / 60.0)
+                        if tokens_per_minute else None)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._rng = random.Random(seed)
+        self._cond = threading.Condition()
+        self._stats = RateLimiterStats(concurrency_limit=self._limit)
+
+    @property
+    def concurrency_limit(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    def _acquire(self, tokens: int) -> _Slot:
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._paused_until > now:
+                    wait = self._paused_until - now
+                elif self._in_flight >= self.concurrency_limit:
+                    wait = None  # Until a release
+                else:
+                    wait = max(
+                        self._requests.wait_time(1, now) if self._requests else 0.0,
+                        self._tokens.wait_time(tokens, now) if self._tokens else 0.0
+                    )
+                    if wait <= 0:
+                        break
+                self._cond.wait(wait)
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens:
+                self._tokens.take(tokens)
+            self._in_flight += 1
+            self._stats.calls += 1
+            now = time.monotonic()
+            self._stats.throttled_seconds += now - started
+        return _Slot(tokens, now)
+
+    def _release(self, slot: _Slot) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if slot.rate_limited:
+                self._stats.rate_limited += 1
+                if slot.retry_after:
+                    self._paused_until = max(self._paused_until, time.monotonic() + slot.retry_after)
+                # Calls started before the last cut were already in flight when it happened; they don't cut again
+                if slot.started >= self._last_decrease:
+                    self._limit = max(float(self.min_concurrency), self._limit / 2)
+                    self._last_decrease = time.monotonic()
+            else:
+                self._limit = min(float(self.max_concurrency), self._limit + 1.0 / max(self._limit, 1.0))
+                if self._tokens and slot.actual_tokens is not None:
+                    # Settle the estimate against what the provider reported
+                    self._tokens.take(slot.actual_tokens - slot.tokens)
+            self._stats.concurrency_limit = self._limit
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, tokens: int = 0):
+        """
+        Hold one in-flight slot for a single attempt; call slot.mark_rate_limited() if the server
+        rejected it, and set slot.actual_tokens once usage is known.
+        """
+        slot = self._acquire(tokens)
+        try:
+            yield slot
+        finally:
+            self._release(slot)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential delay before retry number attempt (1-based), never shorter than retry_after"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        with self._cond:
+            delay = self._rng.uniform(0, ceiling)
+        return max(delay, retry_after or 0.0)
+
+    def wait_before_retry(self, attempt: int, error: RateLimitError) -> None:
+        delay = self.backoff(attempt, error.retry_after)
+        span_event("retry", attempt=attempt, wait_seconds=round(delay, 3), reason="rate_limit",
+                   retry_after=error.retry_after)
+        with self._cond:
+            self._stats.retries += 1
+            self._stats.throttled_seconds += delay
+        time.sleep(delay)
+
+    def give_up(self, error: RateLimitError, attempts: int) -> RateLimitError:
+        error.attempts = attempts
+        with self._cond:
+            self._stats.gave_up += 1
+        return error
+
+    def call(self, fn: Callable[[], T], tokens: int = 0,
+             usage: Optional[Callable[[], Optional[int]]] = None, max_retries: Optional[int] = None) -> T:
+        """
+        Run fn under the limiter, retrying on RateLimitError.
+        usage, if given, returns the call's actual token count after fn succeeds.
+        max_retries overrides the limiter's setting for this call (e.g. 0 when the caller can fail over).
+
+        Raises:
+            RateLimitError: Still rejected after max_retries retries; .attempts holds the attempt count
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            attempt += 1
+            with self.slot(tokens) as slot:
+                try:
+                    result = fn()
+                    if usage is not None:
+                        slot.actual_tokens = usage()
+                    return result
+                except RateLimitError as e:
+                    slot.mark_rate_limited(e.retry_after)
+                    error = e
+            if attempt > max_retries:
+                raise self.give_up(error, attempt)
+            self.wait_before_retry(attempt, error)
+
+    def stats(self) -> RateLimiterStats:
+        with self._cond:
+            return RateLimiterStats(**vars(self._stats))
+
+# Process-wide limiters keyed by (provider, model)
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider: str, model: str, **quota) -> RateLimiter:
+    """The shared limiter for a provider/model; quota keyword arguments only apply when it is first created"""
+    key = (provider, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(**quota)
+            _limiters[key] = limiter
+        return limiter
+
+# Extra per-caller budget on top of the provider's limiter, e.g. a worker pool's share of the quota
+_call_budget: contextvars.ContextVar[Optional[RateLimiter]] = contextvars.ContextVar("call_budget", default=None)
+
+@contextmanager
+def call_budget(limiter: Optional[RateLimiter]):
+    """Make every provider call made in this block (on this thread) also take one slot of limiter"""
+    token = _call_budget.set(limiter)
+    try:
+        yield
+    finally:
+        _call_budget.reset(token)
+
+def current_call_budget() -> Optional[RateLimiter]:
+    return _call_budget.get()
+
+def get_rate_limiter_stats() -> Dict[Tuple[str, str], RateLimiterStats]:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {key: limiter.stats() for key, limiter in limiters.items()}
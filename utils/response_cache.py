@@ -0,0 +1,145 @@
+# utils/response_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+DEFAULT_CACHE_PATH = ".cache/llm_responses.sqlite"
+
+class CacheMissError(LookupError):
+    """Raised in cache-only mode when a prompt has no stored response"""
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class ResponseCache:
+    """
+    Content-addressed LLM response store backed by a local SQLite file.
+    Entries are evicted least-recently-used first once the entry or byte cap is exceeded,
+    and entries older than ttl_seconds are treated as misses.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_entries: Optional[int] = 50000,
+        max_bytes: Optional[int] = 200 * 1024 * 1024,
+        ttl_seconds: Optional[float] = None
+    ):
+        """
+        Args:
+            path: SQLite file location (parent directories are created)
+            max_entries: Maximum number of stored responses (None for no limit)
+            max_bytes: Maximum total size of stored responses (None for no limit)
+            ttl_seconds: Maximum entry age (None to keep entries until evicted)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+
+        entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        self._stats = CacheStats(entries=entries, bytes=total)
+
+    @staticmethod
+    def make_key(provider: str, model: str, system: str, prompt: str, params: Optional[Dict] = None) -> str:
+        """Hash everything that can change the response"""
+        payload = json.dumps([provider, model, system, prompt, params or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, size, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[2] > self.ttl_seconds:
+                self._delete(key, row[1])
+                row = None
+            if row is None:
+                self._stats.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._stats.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            if old is None:
+                self._stats.entries += 1
+                self._stats.bytes += size
+            else:
+                self._stats.bytes += size - old[0]
+            self._evict()
+            self._conn.commit()
+
+    def _delete(self, key: str, size: int) -> None:
+        self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._conn.commit()
+        self._stats.entries -= 1
+        self._stats.bytes -= size
+
+    def _evict(self) -> None:
+        while ((self.max_entries is not None and self._stats.entries > self.max_entries) or
+               (self.max_bytes is not None and self._stats.bytes > self.max_bytes)):
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._stats.entries -= 1
+                self._stats.bytes -= size
+                self._stats.evictions += 1
+                if ((self.max_entries is None or self._stats.entries <= self.max_entries) and
+                        (self.max_bytes is None or self._stats.bytes <= self.max_bytes)):
+                    break
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(**vars(self._stats))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._stats = CacheStats()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,298 @@
+# utils/result_sink.py
+
+import glob
+import gzip
+import json
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Literal, Optional, Set, Tuple
+
+OutputFormat = Literal["jsonl", "jsonl.gz", "parquet"]
+
+# State fields that repeat text already in conversation_history or totals already in final_assessment
+REDUNDANT_FIELDS = ("conversation_history", "context", "current_student_reply", "current_teacher_reply",
+                    "speculative_student_reply", "first_student_reply", "token_usage")
+
+def normalize_record(dialogue_id: str, final_state: dict, run_id: Optional[str] = None) -> Tuple[Dict, List[Dict]]:
+    """
+    Split a final TeachingState into a compact dialogue record and its conversation turns.
+    Turn text is stored once, in the turns; the dialogue record keeps only per-dialogue fields.
+    """
+    record = {"dialogue_id": dialogue_id, "run_id": run_id}
+    record.update({k: v for k, v in final_state.items() if k not in REDUNDANT_FIELDS})
+    turns = [
+        {
+            "dialogue_id": dialogue_id,
+            "turn_index": i,
+            "role": entry["role"],
+            "iteration": entry["iteration"],
+            "content": entry["content"]
+        }
+        for i, entry in enumerate(final_state.get("conversation_history") or [])
+    ]
+    return record, turns
+
+class ResultSink(ABC):
+    """
+    Buffered writer for finished dialogues.
+    Records are held in memory only until the next flush, which happens every batch_size
+    records or flush_interval seconds; each flush is fsynced before on_flush is called
+    with the dialogue IDs it made durable.
+
+    Dialogue IDs are unique per row of the question bank, so a second record for the same ID means the
+    dialogue ran twice; it is skipped with a warning rather than written twice.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        run_id: Optional[str] = None,
+        batch_size: int = 25,
+        flush_interval: float = 10.0,
+        on_flush: Optional[Callable[[List[str]], None]] = None
+    ):
+        self.path = path
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.records_written = 0
+        self.duplicates = 0
+        self._pending: List[Tuple[Dict, List[Dict]]] = []
+        self._seen: Set[str] = set()
+        self._last_flush = time.monotonic()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, dialogue_id: str, final_state: dict) -> bool:
+        """Queue a finished dialogue; returns False (with a warning) if the dialogue was already written"""
+        if not self._first_sighting(dialogue_id):
+            return False
+        self._pending.append(normalize_record(dialogue_id, final_state, self.run_id))
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return True
+
+    def write_normalized(self, record: Dict, turns: List[Dict]) -> bool:
+        """Queue an already-normalized record (e.g. read back from another output file)"""
+        if not self._first_sighting(record["dialogue_id"]):
+            return False
+        self._pending.append((record, turns))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        return True
+
+    def _first_sighting(self, dialogue_id: str) -> bool:
+        if dialogue_id in self._seen:
+            self.duplicates += 1
+            print(f"⚠️ Result sink: dialogue {dialogue_id} was already written to {self.path}; skipping the duplicate")
+            return False
+        self._seen.add(dialogue_id)
+        return True
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._write_batch(batch)
+        self.records_written += len(batch)
+        if self.on_flush:
+            self.on_flush([record["dialogue_id"] for record, _ in batch])
+
+    @abstractmethod
+    def _write_batch(self, batch: List[Tuple[Dict, List[Dict]]]) -> None:
+        """Append one batch of (record, turns) pairs to the output and make it durable"""
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class JsonlResultSink(ResultSink):
+    """One JSON line per dialogue with its turns nested, optionally gzip-compressed"""
+
+    def __init__(self, path: str, compress: bool = False, **kwargs):
+        super().__init__(path, **kwargs)
+        self.compress = compress
+
+    def _write_batch(self, batch):
+        lines = "".join(
+            json.dumps({**record, "turns": [{k: t[k] for k in ("role", "iteration", "content")} for t in turns]},
+                       default=str, ensure_ascii=False) + "\n"
+            for record, turns in batch
+        )
+        # Appending a new gzip member per batch keeps the file readable as one stream
+        opener = gzip.open if self.compress else open
+        with opener(self.path, "at", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            if not self.compress:
+                os.fsync(f.fileno())
+        if self.compress:
+            with open(self.path, "rb") as raw:
+                os.fsync(raw.fileno())
+
+class ParquetResultSink(ResultSink):
+    """
+    Columnar output: each flush writes one immutable pair of part files,
+    <base>.part-NNNNN.dialogues.parquet and <base>.part-NNNNN.turns.parquet.
+    Parquet files cannot be appended to, so a resumed run adds parts next to the earlier ones instead of
+    reopening them; read_results() reads every part of a base path. The turns part is written first and the
+    dialogues part last, each to a temporary name that is fsynced and renamed, so a dialogues part on disk
+    is always complete before on_flush marks its dialogues durable.
+    Nested fields are stored as JSON strings and any state field outside the fixed schema goes
+    into the JSON "extra" column. Requires pyarrow (optional; see requirements-optional.txt).
+    """
+
+    STRING_COLUMNS = ("dialogue_id", "run_id", "question", "question_id", "canonical_id", "category", "difficulty",
+                      "persona", "llm_provider", "llm_model", "dean_verdict", "understanding_level")
+    INT_COLUMNS = ("iteration_count", "max_iterations")
+    JSON_COLUMNS = ("final_assessment", "cognitive_state", "extra")
+
+    def __init__(self, path: str, **kwargs):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow: pip install -r requirements-optional.txt")
+        super().__init__(path, **kwargs)
+        self.base = path[:-len(".parquet")] if path.endswith(".parquet") else path
+        self._part = 0
+        self._schemas = {
+            "dialogues": pa.schema(
+                [(c, pa.string()) for c in self.STRING_COLUMNS] +
+                [(c, pa.int64()) for c in self.INT_COLUMNS] +
+                [(c, pa.string()) for c in self.JSON_COLUMNS]
+            ),
+            "turns": pa.schema([
+                ("dialogue_id", pa.string()), ("turn_index", pa.int64()), ("role", pa.string()),
+                ("iteration", pa.int64()), ("content", pa.string())
+            ])
+        }
+
+    def _part_path(self, part: int, kind: str) -> str:
+        return f"{self.base}.part-{part:05d}.{kind}.parquet"
+
+    def _next_part(self) -> int:
+        """Lowest part number with no file of either kind, so existing parts are never overwritten"""
+        while any(os.path.exists(self._part_path(self._part, kind)) for kind in self._schemas):
+            self._part += 1
+        part, self._part = self._part, self._part + 1
+        return part
+
+    def _write_part(self, path: str, kind: str, rows: List[Dict]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tmp = f"{path}.tmp"
+        pq.write_table(pa.Table.from_pylist(rows, schema=self._schemas[kind]), tmp, compression="zstd")
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        # Make the rename itself durable
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _dialogue_row(self, record: Dict) -> Dict:
+        known = set(self.STRING_COLUMNS) | set(self.INT_COLUMNS) | set(self.JSON_COLUMNS)
+        row = {c: record.get(c) for c in self.STRING_COLUMNS + self.INT_COLUMNS}
+        row["final_assessment"] = json.dumps(record.get("final_assessment"), default=str, ensure_ascii=False)
+        row["cognitive_state"] = json.dumps(record.get("cognitive_state"), default=str, ensure_ascii=False)
+        extra = {k: v for k, v in record.items() if k not in known}
+        row["extra"] = json.dumps(extra, default=str, ensure_ascii=False) if extra else None
+        return row
+
+    def _write_batch(self, batch):
+        part = self._next_part()
+        self._write_part(self._part_path(part, "turns"), "turns", [turn for _, turns in batch for turn in turns])
+        self._write_part(self._part_path(part, "dialogues"), "dialogues",
+                         [self._dialogue_row(record) for record, _ in batch])
+
+def open_result_sink(base_path: str, fmt: OutputFormat = "jsonl", **kwargs) -> ResultSink:
+    """
+    Create a sink for the given format.
+
+    Args:
+        base_path: Output path without extension, e.g. outputs/socratic_results_gemini
+        fmt: "jsonl", "jsonl.gz" or "parquet"
+        kwargs: run_id, batch_size, flush_interval, on_flush
+    """
+    if fmt == "jsonl":
+        return JsonlResultSink(f"{base_path}.jsonl", **kwargs)
+    if fmt == "jsonl.gz":
+        return JsonlResultSink(f"{base_path}.jsonl.gz", compress=True, **kwargs)
+    if fmt == "parquet":
+        return ParquetResultSink(f"{base_path}.parquet", **kwargs)
+    raise ValueError(f"Unknown output format {fmt}. Available: jsonl, jsonl.gz, parquet")
+
+def _read_jsonl(path: str) -> Iterator[Tuple[Dict, List[Dict]]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            nested = record.pop("turns", [])
+            turns = [{"dialogue_id": record["dialogue_id"], "turn_index": i, **t} for i, t in enumerate(nested)]
+            yield record, turns
+
+def parquet_base(path: str) -> str:
+    """The <base>.parquet output a Parquet sink file belongs to, e.g. for <base>.part-00003.turns.parquet"""
+    for suffix in (".dialogues.parquet", ".turns.parquet", ".parquet"):
+        if path.endswith(suffix):
+            path = path[:-len(suffix)]
+            break
+    return re.sub(r"\.part-\d+$", "", path) + ".parquet"
+
+def _parquet_pairs(path: str) -> List[Tuple[str, str]]:
+    """
+    (dialogues, turns) file pairs of a Parquet output: a single part file's own pair, otherwise every
+    part of the base path plus the single pair written by older versions of the sink
+    """
+    base = path
+    for suffix in (".dialogues.parquet", ".turns.parquet", ".parquet"):
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+            break
+    dialogues = [f"{base}.dialogues.parquet"] if os.path.exists(f"{base}.dialogues.parquet") else []
+    dialogues += sorted(glob.glob(f"{glob.escape(base)}.part-[0-9]*.dialogues.parquet"))
+    return [(d, d[:-len(".dialogues.parquet")] + ".turns.parquet") for d in dialogues]
+
+def result_files(path: str) -> List[str]:
+    """The files holding a sink's output (every part of a Parquet output); empty if there are none yet"""
+    if path.endswith(".parquet"):
+        return [d for d, _ in _parquet_pairs(path)]
+    return [path] if os.path.exists(path) else []
+
+def _read_parquet(path: str) -> Iterator[Tuple[Dict, List[Dict]]]:
+    for dialogues_path, turns_path in _parquet_pairs(path):
+        yield from _read_parquet_pair(dialogues_path, turns_path)
+
+def _read_parquet_pair(dialogues_path: str, turns_path: str) -> Iterator[Tuple[Dict, List[Dict]]]:
+    import pyarrow.parquet as pq
+
+    turns_by_dialogue: Dict[str, List[Dict]] = {}
+    for turn in pq.read_table(turns_path).to_pylist():
+        turns_by_dialogue.setdefault(turn["dialogue_id"], []).append(turn)
+    for row in pq.read_table(dialogues_path).to_pylist():
+        record = {k: v for k, v in row.items() if k not in ParquetResultSink.JSON_COLUMNS}
+        for column in ("final_assessment", "cognitive_state"):
+            record[column] = json.loads(row[column]) if row[column] else None
+        record.update(json.loads(row["extra"]) if row["extra"] else {})
+        turns = sorted(turns_by_dialogue.get(record["dialogue_id"], []), key=lambda t: t["turn_index"])
+        yield record, turns
+
+def read_results(path: str) -> Iterator[Tuple[Dict, List[Dict]]]:
+    """Read (record, turns) pairs back from any sink's output file (every part, for a Parquet output)"""
+    if path.endswith(".parquet"):
+        return _read_parquet(path)
+    return _read_jsonl(path)
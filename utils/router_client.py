@@ -0,0 +1,236 @@
+# utils/router_client.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.rate_limiter import RateLimitError
+from utils.token_usage import estimate_tokens, report_provider_usage, take_provider_usage
+from utils.tracing import annotate_span, span_event
+
+@dataclass
+class BackendHealth:
+    """Live statistics for one backend behind the router"""
+    name: str
+    calls: int = 0
+    errors: int = 0
+    hedges: int = 0  # Calls sent as a hedged duplicate
+    wins: int = 0  # Calls whose answer was the one used
+    ejections: int = 0
+    latency: Optional[float] = None  # Moving average of successful call seconds
+    error_rate: float = 0.0  # Moving average of failures (0..1)
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+
+class RouterClient:
+    """
+    Provider backend that spreads calls over several (provider, model) backends.
+
+    Each call goes to the healthy backend with the best expected latency (moving average latency,
+    penalised by its recent error rate; configured order breaks ties). If no answer has arrived after
+    hedge_after seconds, a duplicate goes to the next-best backend and whichever succeeds first is used.
+    Failed calls fail over down the ranking, and a backend that fails eject_after times in a row is
+    skipped for eject_seconds.
+
+    Members are called through their shared LLMClients, so each keeps its own rate limiter.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        members: Optional[Sequence[Tuple[str, str]]] = None,
+        hedge_after: Optional[float] = None,
+        eject_after: Optional[int] = None,
+        eject_seconds: Optional[float] = None,
+        error_penalty: float = 4.0,
+        smoothing: float = 0.2,
+        max_workers: int = 32
+    ):
+        """
+        Args:
+            model: Route name in ROUTER_ROUTES
+            members: (provider, model) pairs, most preferred first (default: the route's)
+            hedge_after: Seconds before sending a hedged duplicate; None never hedges (default: ROUTER_SETTINGS)
+            eject_after: Consecutive failures that eject a backend (default: ROUTER_SETTINGS)
+            eject_seconds: How long an ejected backend is skipped (default: ROUTER_SETTINGS)
+            error_penalty: Expected latency is multiplied by 1 + error_penalty * error_rate
+            smoothing: Weight of the newest sample in the moving averages
+            max_workers: Threads available for concurrent member calls
+        """
+        from config.llm_config import ROUTER_ROUTES, ROUTER_SETTINGS, get_llm_client
+        self.model = model
+        members = list(members or ROUTER_ROUTES[model])
+        self.hedge_after = hedge_after if hedge_after is not None else ROUTER_SETTINGS["hedge_after"]
+        self.eject_after = eject_after or ROUTER_SETTINGS["eject_after"]
+        self.eject_seconds = eject_seconds or ROUTER_SETTINGS["eject_seconds"]
+        self.error_penalty = error_penalty
+        self.smoothing = smoothing
+
+        self._backends = members
+        self._members = [(provider, get_llm_client(provider, member_model)) for provider, member_model in members]
+        self._health = [BackendHealth(name=f"{provider}/{member_model}") for provider, member_model in members]
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix=f"router-{model}")
+
+    # Health
+
+    def _expected_latency(self, health: BackendHealth, fallback: float) -> float:
+        latency = health.latency if health.latency is not None else fallback
+        return latency * (1 + self.error_penalty * health.error_rate)
+
+    def _ranked(self) -> List[int]:
+        """Member indices, best first; ejected members only if every member is ejected"""
+        with self._lock:
+            now = time.monotonic()
+            known = [h.latency for h in self._health if h.latency is not None]
+            # An untried backend is assumed as fast as the best known one, so configured order decides
+            fallback = min(known) if known else 1.0
+            healthy = [i for i, h in enumerate(self._health) if h.ejected_until <= now]
+            candidates = healthy or list(range(len(self._health)))
+            return sorted(candidates, key=lambda i: (self._expected_latency(self._health[i], fallback), i))
+
+    def _record(self, index: int, ok: bool, elapsed: float, hedge: bool) -> None:
+        with self._lock:
+            health = self._health[index]
+            health.calls += 1
+            health.hedges += int(hedge)
+            health.error_rate += self.smoothing * ((0.0 if ok else 1.0) - health.error_rate)
+            if ok:
+                health.consecutive_failures = 0
+                health.latency = elapsed if health.latency is None else health.latency + self.smoothing * (elapsed - health.latency)
+                return
+            health.errors += 1
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.eject_after:
+                health.ejected_until = time.monotonic() + self.eject_seconds
+                health.ejections += 1
+                health.consecutive_failures = 0
+                print(f"⛔ Router: ejecting {health.name} for {self.eject_seconds:.0f}s after {self.eject_after} failures in a row")
+
+    def _won(self, index: int) -> None:
+        with self._lock:
+            self._health[index].wins += 1
+
+    def health(self) -> List[BackendHealth]:
+        with self._lock:
+            return [BackendHealth(**vars(h)) for h in self._health]
+
+    # Calls
+
+    def _member_options(self, provider: str, options: Optional[Dict]) -> Optional[Dict]:
+        # JSON mode arrives provider-neutral and is translated for each member
+        if not options or "json" not in options:
+            return options
+        from config.llm_config import json_mode_options
+        options = dict(options)
+        schema = options.pop("json")
+        return {**json_mode_options(provider, schema if isinstance(schema, dict) else None), **options}
+
+    def _call(self, index: int, prompt: str, system: str, options: Optional[Dict], hedge: bool):
+        provider, client = self._members[index]
+        started = time.monotonic()
+        take_provider_usage()
+        # No retries at the member: a rate-limited backend fails over to the next one instead of backing off
+        response = client.chat(prompt, system, self._member_options(provider, options), max_retries=0)
+        usage = take_provider_usage()
+        self._record(index, not response.startswith("ERROR:"), time.monotonic() - started, hedge)
+        return response, usage
+
+    def _record_spend(self, index: int, agent: str, prompt: str, system: str, response: str,
+                      usage: Optional[Tuple]) -> None:
+        """Record a member call whose answer was not used, so token totals and cost still include it"""
+        from config.llm_config import record_backend_call
+        provider, model = self._backends[index]
+        record_backend_call(agent, provider, model, system, prompt, response, usage)
+
+    def chat(self, prompt: str, system: str = "", options: Optional[Dict] = None) -> str:
+        """
+        Answer from the first backend to succeed, hedging slow calls and failing over on errors.
+        Only the answer used is reported as this call's usage; failed attempts that still reported usage,
+        and hedged duplicates abandoned while running, are recorded separately as "router.failover"
+        and "router.hedge" calls.
+        """
+        ranked = self._ranked()
+        pending: Dict = {}
+        next_member = 0
+        hedged = False
+        errors: List[str] = []
+
+        def launch(hedge: bool) -> None:
+            nonlocal next_member
+            index = ranked[next_member]
+            next_member += 1
+            pending[self._pool.submit(self._call, index, prompt, system, options, hedge)] = index
+
+        launch(hedge=False)
+        while pending:
+            can_hedge = self.hedge_after is not None and not hedged and next_member < len(ranked)
+            done, _ = wait(list(pending), timeout=self.hedge_after if can_hedge else None, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                span_event("hedge", backend=self._health[ranked[next_member]].name, after_seconds=self.hedge_after)
+                launch(hedge=True)
+                continue
+            for future in done:
+                index = pending.pop(future)
+                response, usage = future.result()
+                if not response.startswith("ERROR:"):
+                    self._won(index)
+                    if usage:
+                        report_provider_usage(*usage)
+                    # A slower duplicate still running finishes in the background (its member's limiter
+                    # settles its tokens then) and is billed like any call. It is recorded now, with its output
+                    # estimated at the winner's length, so the usage lands in the caller's token accounting.
+                    for loser in pending.values():
+                        self._record_spend(loser, "router.hedge", prompt, system, response,
+                                           (None, estimate_tokens(response)))
+                    annotate_span(routed_to=self._health[index].name, hedged=hedged)
+                    return response
+                if usage:
+                    self._record_spend(index, "router.failover", prompt, system, response, usage)
+                errors.append(response)
+            if not pending and next_member < len(ranked):
+                span_event("failover", backend=self._health[ranked[next_member]].name, error=errors[-1][:200])
+                launch(hedge=False)
+        return self._give_up(errors)
+
+    def chat_stream(self, prompt: str, system: str = "", options: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Stream from the best backend, failing over if it errors before its first chunk.
+        Streams are not hedged: a duplicate stream could not be merged into the one already being read.
+        """
+        errors: List[str] = []
+        for index in self._ranked():
+            provider, client = self._members[index]
+            started = time.monotonic()
+            chunks = client.chat_stream(prompt, system, self._member_options(provider, options), max_retries=0)
+            first = next(chunks, None)
+            if first is None or first.startswith("ERROR:"):
+                chunks.close()
+                self._record(index, False, time.monotonic() - started, hedge=False)
+                errors.append(first or "ERROR: Empty response")
+                continue
+            self._won(index)
+            annotate_span(routed_to=self._health[index].name)
+            try:
+                yield first
+                yield from chunks
+            finally:
+                self._record(index, True, time.monotonic() - started, hedge=False)
+            return
+        yield self._give_up(errors)
+
+    @staticmethod
+    def _give_up(errors: List[str]) -> str:
+        """
+        The error to return once every backend failed. If they were all rate limited, raise instead,
+        so the router's own rate limiter backs off and retries the whole route.
+        """
+        if errors and all(error.startswith("ERROR: Rate limit exceeded") for error in errors):
+            raise RateLimitError("Every routed backend is rate limited")
+        return errors[-1] if errors else "ERROR: No backends configured for this route"
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,76 @@
+# utils/run_manifest.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Set
+
+RUNS_DIR = "outputs/runs"
+
+class RunManifest:
+    """
+    Append-only record of the dialogues a run has finished.
+    Restarting a run with the same run_id skips every dialogue ID listed here (one per row of the bank;
+    question IDs are not unique, see utils/question_source.py).
+    """
+
+    def __init__(self, run_id: str, runs_dir: str = RUNS_DIR):
+        self.run_id = run_id
+        self.run_dir = os.path.join(runs_dir, run_id)
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.path = os.path.join(self.run_dir, "manifest.jsonl")
+        self._lock = threading.Lock()
+        self.completed: Set[str] = self._load()
+
+    def _load(self) -> Set[str]:
+        completed = set()
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    # Manifests written before dialogue IDs existed hold the non-unique question_id
+                    completed.add(entry.get("dialogue_id") or entry["question_id"])
+                except (json.JSONDecodeError, KeyError):
+                    # A crash can leave a torn last line; the dialogue simply reruns
+                    continue
+        return completed
+
+    def is_completed(self, dialogue_id: str) -> bool:
+        return dialogue_id in self.completed
+
+    def mark_completed(self, dialogue_id: str, **details) -> None:
+        """Record a finished dialogue; call only after its result has been written"""
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"dialogue_id": dialogue_id, "completed_at": time.time(), **details}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.completed.add(dialogue_id)
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.run_dir, "checkpoints.sqlite")
+
+def open_checkpointer(path: str):
+    """
+    SQLite-backed LangGraph checkpointer that saves TeachingState after every node.
+    Returns None when langgraph-checkpoint-sqlite is not installed, which disables mid-dialogue resume.
+    """
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        print("⚠️ langgraph-checkpoint-sqlite not installed; unfinished dialogues will restart from the beginning")
+        return None
+    conn = sqlite3.connect(path, check_same_thread=False)
+    return SqliteSaver(conn)
+
+def thread_config(run_id: str, dialogue_id: str) -> dict:
+    """LangGraph config that ties a dialogue to its checkpoint thread"""
+    return {"configurable": {"thread_id": f"{run_id}:{dialogue_id}"}}
@@ -0,0 +1,112 @@
+# utils/scheduler.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from utils.lockstep import LockstepBatcher, lockstep
+
+
+@dataclass
+class SchedulerStats:
+    """Counters collected while a batch of dialogues runs"""
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    errors: Dict[str, str] = field(default_factory=dict)  # dialogue_id -> what failed
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def dialogues_per_minute(self) -> float:
+        return self.completed / self.elapsed * 60 if self.elapsed > 0 else 0.0
+
+
+class DialogueScheduler:
+    """
+    Runs many dialogues through a compiled graph with a bounded worker pool.
+
+    Args:
+        run_dialogue: Callable taking (dialogue_id, initial_state) and returning the final state
+        max_workers: Maximum number of dialogues in flight at once
+        on_complete: Called with (dialogue_id, final_state) as soon as a dialogue finishes
+        on_error: Called with (dialogue_id, exception) when a dialogue raises, or when on_complete
+            raises for it (e.g. a failed sink write); the dialogue then counts as failed
+        batcher: Optional lockstep batcher; the in-flight dialogues then form a cohort whose LLM calls
+            are sent to the provider together, one step at a time
+
+    Callbacks always run on the thread that called run(), so sinks don't need their own locking.
+    Provider quotas are not the scheduler's concern: every LLM call already waits on the shared
+    rate limiter for its provider/model (utils/rate_limiter.py).
+    """
+
+    def __init__(
+        self,
+        run_dialogue: Callable[[str, dict], dict],
+        max_workers: int = 4,
+        on_complete: Optional[Callable[[str, dict], None]] = None,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+        batcher: Optional[LockstepBatcher] = None
+    ):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.run_dialogue = run_dialogue
+        self.max_workers = max_workers
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.batcher = batcher
+
+    def _run_one(self, dialogue_id: str, state: dict) -> dict:
+        if self.batcher is None:
+            return self.run_dialogue(dialogue_id, state)
+        self.batcher.join()
+        try:
+            with lockstep(self.batcher):
+                return self.run_dialogue(dialogue_id, state)
+        finally:
+            self.batcher.leave()
+
+    def run(self, dialogues: Iterable[Tuple[str, dict]]) -> SchedulerStats:
+        """
+        Run (dialogue_id, initial_state) pairs and return stats once all have finished.
+        The input iterable is consumed lazily, so only max_workers states are held at a time.
+        """
+        stats = SchedulerStats()
+        in_flight: Dict = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dialogue") as pool:
+            for dialogue_id, state in dialogues:
+                while len(in_flight) >= self.max_workers:
+                    self._drain(in_flight, stats)
+                in_flight[pool.submit(self._run_one, dialogue_id, state)] = dialogue_id
+                stats.submitted += 1
+
+            while in_flight:
+                self._drain(in_flight, stats)
+
+        stats.finished_at = time.monotonic()
+        return stats
+
+    def _drain(self, in_flight: Dict, stats: SchedulerStats) -> None:
+        done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+        for future in done:
+            dialogue_id = in_flight.pop(future)
+            try:
+                final_state = future.result()
+                if self.on_complete:
+                    self.on_complete(dialogue_id, final_state)
+            except Exception as e:
+                # Keep draining: the other dialogues in flight are still running
+                stats.failed += 1
+                stats.errors[dialogue_id] = f"{type(e).__name__}: {e}"
+                if self.on_error:
+                    self.on_error(dialogue_id, e)
+                continue
+
+            stats.completed += 1
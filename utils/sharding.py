@@ -0,0 +1,29 @@
+# utils/sharding.py
+
+import hashlib
+from typing import Tuple
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parse "i/N" (0 <= i < N) into (index, count)"""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in 0..{count - 1}, got {spec!r}")
+    return index, count
+
+def shard_for(dialogue_id: str, count: int) -> int:
+    """
+    Stable shard assignment for a dialogue ID.
+    Uses a content hash rather than hash(), so every process and machine agrees on the split.
+    """
+    digest = hashlib.sha1(dialogue_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+def in_shard(dialogue_id: str, index: int, count: int) -> bool:
+    return count == 1 or shard_for(dialogue_id, count) == index
+
+def shard_suffix(index: int, count: int) -> str:
+    """File/run-ID suffix for a shard; empty when the run is not sharded"""
+    return "" if count == 1 else f".shard{index}of{count}"
@@ -0,0 +1,101 @@
+# utils/speculation.py
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Generic, List, Optional, TypeVar
+
+from utils.lockstep import lockstep
+from utils.token_usage import UsageRecord, usage_scope
+
+T = TypeVar("T")
+
+@dataclass
+class SpeculationStats:
+    """What speculative work bought and what it cost"""
+    started: int = 0
+    committed: int = 0
+    discarded: int = 0
+    skipped: int = 0  # Discarded before the call went out, so nothing was wasted
+    wasted_seconds: float = 0.0  # Time spent generating discarded results
+    wasted_tokens: int = 0  # Prompt + output tokens of discarded calls that ran
+
+    @property
+    def waste_rate(self) -> float:
+        return self.discarded / self.started if self.started else 0.0
+
+_stats = SpeculationStats()
+_stats_lock = threading.Lock()
+
+def get_speculation_stats() -> SpeculationStats:
+    with _stats_lock:
+        return SpeculationStats(**vars(_stats))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(32, thread_name_prefix="speculative")
+        return _executor
+
+class SpeculativeCall(Generic[T]):
+    """
+    Starts fn(cancel_event) on a background thread before it is known whether its result will be needed.
+
+    The work runs in a copy of the caller's context (so its spans nest under the caller's), outside any
+    lockstep cohort, and under its own usage scope tagged with usage_tags. commit() waits for the result;
+    discard() sets the cancel event, which fn should pass on so a streaming call stops generating.
+    """
+
+    def __init__(self, fn: Callable[[threading.Event], T], **usage_tags):
+        self.cancel_event = threading.Event()
+        self.records: List[UsageRecord] = []
+        self._tags = usage_tags
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        with _stats_lock:
+            _stats.started += 1
+        context = contextvars.copy_context()
+        self._future = _get_executor().submit(context.run, self._run, fn)
+
+    def _run(self, fn: Callable[[threading.Event], T]) -> Optional[T]:
+        if self.cancel_event.is_set():
+            return None
+        self._started_at = time.monotonic()
+        with lockstep(None), usage_scope(**self._tags) as scope:
+            try:
+                return fn(self.cancel_event)
+            finally:
+                self.records = scope.records
+                self._finished_at = time.monotonic()
+
+    def commit(self) -> T:
+        """Wait for the result and keep it; its usage records are in .records"""
+        result = self._future.result()
+        with _stats_lock:
+            _stats.committed += 1
+        return result
+
+    def discard(self) -> None:
+        """Give up on the result: cancel it if it has not started, otherwise stop it and count the waste"""
+        self.cancel_event.set()
+        if self._future.cancel():
+            with _stats_lock:
+                _stats.discarded += 1
+                _stats.skipped += 1
+            return
+        self._future.add_done_callback(lambda _: self._count_waste())
+
+    def _count_waste(self) -> None:
+        with _stats_lock:
+            _stats.discarded += 1
+            if self._started_at is None:
+                _stats.skipped += 1
+                return
+            _stats.wasted_seconds += (self._finished_at or time.monotonic()) - self._started_at
+            _stats.wasted_tokens += sum(r.prompt_tokens + r.output_tokens for r in self.records)
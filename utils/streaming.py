@@ -0,0 +1,206 @@
+# utils/streaming.py
+
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional, Tuple
+
+from utils.structured_output import object_end
+from utils.token_usage import CHARS_PER_TOKEN, estimate_tokens
+
+# A sentence ends at . ! or ? (plus closing quotes/brackets) followed by whitespace, so "3.5" or a
+# chunk that stops right after a period does not count until the next character arrives
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(?=\s)")
+
+class StopWhenJsonComplete:
+    """Stop as soon as the first JSON object has closed; trailing prose is never generated"""
+
+    marks_completion = True
+
+    def cut(self, text: str) -> Optional[int]:
+        return object_end(text)
+
+    def __repr__(self) -> str:
+        return "StopWhenJsonComplete()"
+
+class StopAfter:
+    """Stop once a reply passes a sentence or token cap, keeping whole sentences/words"""
+
+    marks_completion = False
+
+    def __init__(self, sentences: Optional[int] = None, tokens: Optional[int] = None):
+        self.sentences = sentences
+        self.tokens = tokens
+
+    def cut(self, text: str) -> Optional[int]:
+        if self.sentences:
+            for count, match in enumerate(_SENTENCE_END.finditer(text), start=1):
+                if count == self.sentences:
+                    return match.end()
+        if self.tokens and estimate_tokens(text) > self.tokens:
+            limit = self.tokens * CHARS_PER_TOKEN
+            space = text.rfind(" ", 0, limit)
+            return space if space > 0 else limit
+        return None
+
+    def __repr__(self) -> str:
+        return f"StopAfter(sentences={self.sentences}, tokens={self.tokens})"
+
+class StopOnCancel:
+    """Wraps a stop rule so that setting the event also ends the stream; the reply is then abandoned"""
+
+    marks_completion = False
+
+    def __init__(self, event, inner=None):
+        self.event = event
+        self.inner = inner
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def cut(self, text: str) -> Optional[int]:
+        if self.event.is_set():
+            return 0
+        return self.inner.cut(text) if self.inner is not None else None
+
+    def __repr__(self) -> str:
+        return f"StopOnCancel({self.inner!r})"
+
+def apply_stop(stop, text: str) -> str:
+    """Trim a complete response the way an early stop would have, for calls that could not stream"""
+    if stop is None or text.startswith("ERROR:"):
+        return text
+    cut = stop.cut(text)
+    return text if cut is None else text[:cut].rstrip()
+
+@dataclass
+class StreamStats:
+    """Timing of one streamed call"""
+    ttft: Optional[float]  # Seconds until the first chunk
+    duration: float
+    chunks: int
+    output_tokens: int
+    stopped_early: bool  # The stop rule cut the reply short
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        """Generation speed after the first chunk arrived"""
+        if self.ttft is None or self.duration - self.ttft <= 0:
+            return None
+        return self.output_tokens / (self.duration - self.ttft)
+
+@dataclass
+class StreamTotals:
+    """Process-wide counters over every streamed call"""
+    calls: int = 0
+    stopped_early: int = 0
+    ttft_seconds: float = 0.0
+    output_tokens: int = 0
+    generation_seconds: float = 0.0
+
+    @property
+    def mean_ttft(self) -> float:
+        return self.ttft_seconds / self.calls if self.calls else 0.0
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return self.output_tokens / self.generation_seconds if self.generation_seconds > 0 else 0.0
+
+_totals = StreamTotals()
+_totals_lock = threading.Lock()
+
+def _count_stream(stats: StreamStats) -> None:
+    with _totals_lock:
+        _totals.calls += 1
+        _totals.stopped_early += int(stats.stopped_early)
+        if stats.ttft is not None:
+            _totals.ttft_seconds += stats.ttft
+            _totals.output_tokens += stats.output_tokens
+            _totals.generation_seconds += stats.duration - stats.ttft
+
+def get_stream_totals() -> StreamTotals:
+    with _totals_lock:
+        return StreamTotals(**vars(_totals))
+
+def consume_stream(
+    chunks: Iterator[str],
+    stop=None,
+    on_chunk: Optional[Callable[[str], None]] = None
+) -> Tuple[str, StreamStats]:
+    """
+    Read a chunk stream to the end, or until the stop rule fires; the stream is then closed, which
+    cancels the request in the provider client. on_chunk sees the text as it arrives, never past the cut.
+    """
+    started = time.monotonic()
+    ttft = None
+    text = ""
+    emitted = count = 0
+    stopped = False
+    try:
+        for chunk in chunks:
+            if ttft is None:
+                ttft = time.monotonic() - started
+            count += 1
+            text += chunk
+            cut = None if stop is None or text.startswith("ERROR:") else stop.cut(text)
+            if cut is not None:
+                # A closed JSON object is where the reply should end anyway; it only counts as an
+                # early stop if text after it was thrown away
+                stopped = cut < len(text.rstrip()) or not stop.marks_completion
+                text = text[:cut]
+            if on_chunk and len(text) > emitted:
+                on_chunk(text[emitted:])
+                emitted = len(text)
+            if cut is not None:
+                break
+    finally:
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
+    text = text.strip()
+    stats = StreamStats(ttft, time.monotonic() - started, count, estimate_tokens(text), stopped)
+    _count_stream(stats)
+    return text, stats
+
+class ConsoleStreamWriter:
+    """
+    Prints streamed turns as they arrive, one labelled line per reply.
+    Replies from concurrent dialogues would interleave, so this is meant for --concurrency 1.
+    """
+
+    LABELS = {"student": "🎓 Student", "teacher": "👨‍🏫 Teacher"}
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def start(self, agent: str) -> None:
+        with self._lock:
+            self.stream.write(f"\n{self.LABELS.get(agent, agent)}: ")
+            self.stream.flush()
+
+    def write(self, agent: str, chunk: str) -> None:
+        with self._lock:
+            self.stream.write(chunk)
+            self.stream.flush()
+
+    def end(self, agent: str) -> None:
+        with self._lock:
+            self.stream.write("\n")
+            self.stream.flush()
+
+# Where streamed replies go (None: nowhere) and which agents' replies are shown
+_writer = None
+_writer_agents = frozenset()
+
+def configure_stream_output(writer=None, agents=("student", "teacher")) -> None:
+    """Send streamed replies of the given agents to a writer with start/write/end(agent, ...) methods"""
+    global _writer, _writer_agents
+    _writer = writer
+    _writer_agents = frozenset(agents)
+
+def stream_writer_for(agent: Optional[str]):
+    return _writer if _writer is not None and agent in _writer_agents else None
@@ -0,0 +1,126 @@
+# utils/structured_output.py
+
+import json
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+class StructuredOutputError(ValueError):
+    """Raised when a response cannot be turned into the expected JSON object, even after a re-ask"""
+
+    def __init__(self, message: str, response: str):
+        super().__init__(message)
+        self.response = response
+
+@dataclass
+class JsonStats:
+    """How JSON responses were obtained: parsed as-is, repaired locally, re-asked, or given up on"""
+    direct: int = 0
+    repaired: int = 0
+    reasked: int = 0
+    failed: int = 0
+
+_stats = JsonStats()
+_stats_lock = threading.Lock()
+
+def count_json_outcome(outcome: str) -> None:
+    with _stats_lock:
+        setattr(_stats, outcome, getattr(_stats, outcome) + 1)
+
+def get_json_stats() -> JsonStats:
+    with _stats_lock:
+        return JsonStats(**vars(_stats))
+
+def _scan_object(text: str, start: int):
+    """Walk the object opening at text[start]; returns (end index or None if unclosed, open brackets, in_string)"""
+    stack = []
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return i + 1, stack, in_string
+    return None, stack, in_string
+
+def object_end(text: str) -> Optional[int]:
+    """Index just past the first complete {...} object in text, or None while it is still open"""
+    start = text.find("{")
+    if start < 0:
+        return None
+    return _scan_object(text, start)[0]
+
+def _balanced_object(text: str) -> str:
+    """
+    The first {...} object in text, tracking strings and escapes.
+    If the text ends mid-object, the open string and brackets are closed so truncated output still parses.
+    """
+    start = text.find("{")
+    if start < 0:
+        return ""
+    end, stack, in_string = _scan_object(text, start)
+    if end is not None:
+        return text[start:end]
+
+    # Truncated: drop a dangling key or separator, then close what is still open
+    body = text[start:] + ('"' if in_string else "")
+    body = re.sub(r'(,\s*"[^"]*"\s*:?\s*|[,:]\s*)$', "", body.rstrip())
+    return body + "".join(reversed(stack))
+
+def extract_json(text: str) -> Optional[Dict]:
+    """
+    Parse a JSON object out of a model response.
+    Handles ```json fences, prose before or after the object, trailing commas and truncated output.
+    Returns None when nothing usable is found.
+    """
+    if not text:
+        return None
+    try:
+        parsed = json.loads(text)
+        return parsed if isinstance(parsed, dict) else None
+    except json.JSONDecodeError:
+        pass
+
+    fenced = _FENCE.search(text)
+    candidates = [fenced.group(1), text] if fenced else [text]
+    for candidate in candidates:
+        body = _balanced_object(candidate)
+        if not body:
+            continue
+        for attempt in (body, _TRAILING_COMMA.sub(r"\1", body)):
+            try:
+                parsed = json.loads(attempt)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(parsed, dict):
+                return parsed
+    return None
+
+def missing_fields(result: Optional[Dict], required: Iterable[str]) -> list:
+    if result is None:
+        return list(required)
+    return [field for field in required if field not in result]
+
+def reask_prompt(response: str, required: Iterable[str], max_chars: int = 1500) -> str:
+    """Short follow-up asking only for the JSON object, quoting the unusable reply"""
+    return f"""Your previous reply could not be read as JSON:
+
+{response[:max_chars]}
+
+Return ONLY the JSON object described in your instructions, with no code fences or extra text. It must include the fields: {", ".join(required)}."""
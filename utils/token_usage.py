@@ -0,0 +1,113 @@
+# utils/token_usage.py
+
+import contextvars
+import json
+import math
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Optional, Tuple
+
+# Rough chars-per-token ratio used when the provider does not report usage
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+@dataclass
+class UsageRecord:
+    """One LLM call, tagged with where in the pipeline it happened"""
+    agent: Optional[str]
+    provider: str
+    model: str
+    prompt_chars: int
+    prompt_tokens: int
+    output_tokens: int
+    estimated: bool
+    cached: bool
+    cost: float
+    ttft: Optional[float] = None  # Streamed calls only: seconds to first token
+    tokens_per_sec: Optional[float] = None
+    stopped_early: bool = False
+    iteration: Optional[int] = None
+    persona: Optional[str] = None
+    question: Optional[str] = None
+
+@dataclass
+class UsageScope:
+    """Collects the records made while a graph node runs"""
+    tags: Dict
+    records: List[UsageRecord] = field(default_factory=list)
+
+_current_scope: contextvars.ContextVar[Optional[UsageScope]] = contextvars.ContextVar("usage_scope", default=None)
+
+@contextmanager
+def usage_scope(**tags):
+    """Tag every LLM call made inside the block (iteration, persona, question) and collect its records"""
+    scope = UsageScope(tags=tags)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+# Providers report exact token counts here; chat_with_llm picks them up right after the call
+_provider_usage = threading.local()
+
+def report_provider_usage(prompt_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+    _provider_usage.value = (prompt_tokens, output_tokens)
+
+def peek_provider_usage() -> Optional[Tuple[Optional[int], Optional[int]]]:
+    return getattr(_provider_usage, "value", None)
+
+def take_provider_usage() -> Optional[Tuple[Optional[int], Optional[int]]]:
+    value = getattr(_provider_usage, "value", None)
+    _provider_usage.value = None
+    return value
+
+_log_lock = threading.Lock()
+_log_path: Optional[str] = None
+
+def configure_usage_log(path: Optional[str]) -> None:
+    """Append every usage record to a JSONL file (None disables)"""
+    global _log_path
+    _log_path = path
+
+def record_usage(record: UsageRecord) -> UsageRecord:
+    scope = _current_scope.get()
+    if scope is not None:
+        for key in ("iteration", "persona", "question"):
+            if getattr(record, key) is None:
+                setattr(record, key, scope.tags.get(key))
+        scope.records.append(record)
+    if _log_path:
+        with _log_lock, open(_log_path, "a") as f:
+            f.write(json.dumps(asdict(record)) + "\n")
+    return record
+
+def adopt_usage(records: List[UsageRecord]) -> None:
+    """Add records made under another scope (e.g. on a background thread) to the current one"""
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.records.extend(records)
+
+def merge_usage(summary: Optional[Dict], records: List[UsageRecord]) -> Dict:
+    """Fold call records into a per-agent / per-iteration summary stored in TeachingState"""
+    summary = json.loads(json.dumps(summary)) if summary else {"total": {}, "by_agent": {}, "by_iteration": {}}
+    for r in records:
+        agent = r.agent or "unknown"
+        buckets = [
+            summary["total"],
+            summary["by_agent"].setdefault(agent, {}),
+            summary["by_iteration"].setdefault(str(r.iteration), {}).setdefault(agent, {})
+        ]
+        for bucket in buckets:
+            bucket["calls"] = bucket.get("calls", 0) + 1
+            bucket["cached_calls"] = bucket.get("cached_calls", 0) + int(r.cached)
+            bucket["prompt_chars"] = bucket.get("prompt_chars", 0) + r.prompt_chars
+            bucket["prompt_tokens"] = bucket.get("prompt_tokens", 0) + r.prompt_tokens
+            bucket["output_tokens"] = bucket.get("output_tokens", 0) + r.output_tokens
+            bucket["cost"] = round(bucket.get("cost", 0.0) + r.cost, 8)
+        peak = summary["by_agent"][agent]
+        peak["max_prompt_tokens"] = max(peak.get("max_prompt_tokens", 0), r.prompt_tokens)
+    return summary
@@ -0,0 +1,158 @@
+# utils/tracing.py
+
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Literal, Optional
+
+TraceFormat = Literal["jsonl", "otlp"]
+
+@dataclass
+class Span:
+    """One timed unit of work: a whole dialogue, a graph node, or a single provider call"""
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    kind: str
+    start: float
+    end: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    attributes: Dict = field(default_factory=dict)
+    events: List[Dict] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def set(self, **attributes) -> None:
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def add_event(self, name: str, **attributes) -> None:
+        self.events.append({"name": name, "time": time.time(), **attributes})
+
+class JsonlSpanExporter:
+    """Appends one JSON object per finished span"""
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _encode(self, span: Span) -> Dict:
+        return {**asdict(span), "duration_ms": round(span.duration * 1000, 3)}
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(self._encode(span), default=str)
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+class OtlpFileSpanExporter(JsonlSpanExporter):
+    """Writes each span as an OTLP/JSON ExportTraceServiceRequest line, readable by OpenTelemetry file receivers"""
+
+    SERVICE_NAME = "socratic-dialogues"
+
+    @staticmethod
+    def _value(v) -> Dict:
+        if isinstance(v, bool):
+            return {"boolValue": v}
+        if isinstance(v, int):
+            return {"intValue": str(v)}
+        if isinstance(v, float):
+            return {"doubleValue": v}
+        return {"stringValue": str(v)}
+
+    def _encode(self, span: Span) -> Dict:
+        attributes = [{"key": k, "value": self._value(v)} for k, v in {**span.attributes, "kind": span.kind}.items()]
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(span.start * 1e9)),
+            "endTimeUnixNano": str(int((span.end or time.time()) * 1e9)),
+            "attributes": attributes,
+            "events": [
+                {"name": e["name"], "timeUnixNano": str(int(e["time"] * 1e9)),
+                 "attributes": [{"key": k, "value": self._value(v)} for k, v in e.items() if k not in ("name", "time")]}
+                for e in span.events
+            ],
+            "status": {"code": 2, "message": span.error or ""} if span.status == "error" else {"code": 1}
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "utils.tracing"}, "spans": [otlp_span]}]
+        }]}
+
+_exporter: Optional[JsonlSpanExporter] = None
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+def configure_tracing(path: Optional[str], fmt: TraceFormat = "jsonl") -> None:
+    """Export finished spans to a file; None turns tracing off (spans then cost almost nothing)"""
+    global _exporter
+    if path is None:
+        _exporter = None
+    elif fmt == "otlp":
+        _exporter = OtlpFileSpanExporter(path)
+    else:
+        _exporter = JsonlSpanExporter(path)
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    """
+    Time a block as a child of the current span (or as a new trace when there is none).
+    Exceptions are recorded on the span and re-raised.
+    """
+    if _exporter is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(
+        trace_id=parent.trace_id if parent else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        name=name,
+        kind=kind,
+        start=time.time()
+    )
+    current.set(**attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end = time.time()
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(current)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def annotate_span(**attributes) -> None:
+    """Add attributes to the active span, if any"""
+    active = _current_span.get()
+    if active is not None:
+        active.set(**attributes)
+
+def span_event(name: str, **attributes) -> None:
+    """Record a point-in-time event (e.g. a retry) on the active span, if any"""
+    active = _current_span.get()
+    if active is not None:
+        active.add_event(name, **attributes)